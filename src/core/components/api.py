@@ -33,3 +33,10 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# Конфигурация текстового поиска PostgreSQL для товаров (stores.search); 'simple' - без стемминга,
+# чтобы префиксный поиск работал одинаково для кириллицы и латиницы
+SEARCH_CONFIG = 'simple'
+# Сколько последних подходящих товаров ранжируется по релевантности (stores.search): полное ранжирование
+# частого префикса в большом магазине стоит сотни миллисекунд
+SEARCH_MAX_CANDIDATES = 2000
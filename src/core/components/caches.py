@@ -0,0 +1,50 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Кеш публичного каталога (stores.catalog_cache) и признаков готовности уменьшенных
+# копий (THUMBNAIL_CACHE_ALIAS). CATALOG_CACHE_URL: redis://... для Redis-совместимого
+# сервера или file:///path для файлового кеша, общего для процессов одного хоста.
+# Без него кеш живет в памяти процесса - только для разработки: версию каталога,
+# увеличенную воркером (run_worker), веб-процесс бы не увидел и отдавал бы
+# устаревшие страницы и 304. Поэтому в production CATALOG_CACHE_URL обязателен.
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_URL = os.environ.get('CATALOG_CACHE_URL', '')
+
+if not CATALOG_CACHE_URL and os.environ.get('ENVIRONMENT', 'development') == 'production':
+    raise ImproperlyConfigured(
+        'CATALOG_CACHE_URL must be set in production: the catalog cache is shared by the web service and the worker'
+    )
+
+if CATALOG_CACHE_URL.startswith(('redis://', 'rediss://')):
+    _catalog_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CATALOG_CACHE_URL,
+    }
+elif CATALOG_CACHE_URL.startswith('file://'):
+    _catalog_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CATALOG_CACHE_URL[len('file://'):],
+    }
+else:
+    _catalog_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    CATALOG_CACHE_ALIAS: {
+        **_catalog_cache,
+        'TIMEOUT': 60 * 60,
+    },
+}
+
+# Кеш магазина текущего пользователя (stores.middleware.CurrentStoreMiddleware).
+# Локальный LRU живет в каждом процессе; общий кеш (алиас из CACHES) позволяет
+# процессам делить результаты и сбрасывать их сигналами. None - только локальный кеш.
+CURRENT_STORE_CACHE_ALIAS = None
+CURRENT_STORE_CACHE_TTL = 300
+CURRENT_STORE_CACHE_SIZE = 1024
@@ -0,0 +1,14 @@
+import os
+
+# API МойСклад (stores.services). Адрес переопределяется для тестового стенда.
+MOYSKLAD_API_URL = os.environ.get('MOYSKLAD_API_URL', 'https://api.moysklad.ru/api/remap/1.2')
+# Строк на страницу выборки; 1000 - максимум, который принимает API
+MOYSKLAD_PAGE_SIZE = 1000
+MOYSKLAD_TIMEOUT_SECONDS = 30
+# Одновременных запросов одного клиента: API допускает не больше 5 параллельных запросов пользователя
+MOYSKLAD_MAX_CONNECTIONS = 4
+# Повторов запроса, получившего 429 (пауза - из заголовка X-Lognex-Retry-After)
+MOYSKLAD_MAX_RETRIES = 5
+# Загрузка изображений товаров (stores.image_import): товаров за проход и попыток на товар
+MOYSKLAD_IMAGE_BATCH_SIZE = 100
+MOYSKLAD_IMAGE_MAX_ATTEMPTS = 3
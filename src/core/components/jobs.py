@@ -0,0 +1,11 @@
+# Фоновые задачи (jobs). Воркер запускается командой run_worker.
+# Сколько попыток дается задаче, если обработчик не задал свое значение
+JOB_MAX_ATTEMPTS = 3
+# Пауза перед повтором растет вдвое с каждой попыткой: 30 с, 60 с, 120 с... но не больше часа
+JOB_RETRY_BACKOFF_SECONDS = 30
+JOB_RETRY_BACKOFF_MAX_SECONDS = 3600
+# Задача, воркер которой не сообщал о прогрессе дольше этого времени, считается
+# брошенной (воркер упал) и выдается другому воркеру
+JOB_LOCK_TIMEOUT_MINUTES = 30
+JOB_WORKER_CONCURRENCY = 4
+JOB_POLL_INTERVAL_SECONDS = 2
@@ -0,0 +1,13 @@
+# Сколько минут ожидающий заказ держит товар в резерве (orders.reservations).
+# Просроченные заказы отменяет команда release_expired_reservations.
+STOCK_RESERVATION_TTL_MINUTES = 30
+
+# Сколько часов хранится ответ на POST с заголовком Idempotency-Key (orders.idempotency).
+# Просроченные записи удаляет команда purge_idempotency_keys.
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+# Через сколько секунд незавершенный запрос с Idempotency-Key (например, после
+# падения процесса) перестает блокировать повторы с тем же ключом.
+IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS = 60
+
+# Сколько строк за раз читают потоковые выгрузки продавца (orders.exports).
+EXPORT_CHUNK_SIZE = 2000
@@ -1,6 +1,12 @@
 ALLOWED_HOSTS = ['*']
 
+from corsheaders.defaults import default_headers
+
 CORS_ALLOW_ALL_ORIGINS = True
+# Заголовки ретраев (orders.idempotency) и выбора магазина (stores.middleware)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-store-id')
+# Курсор следующей страницы в режиме legacy (core.pagination)
+CORS_EXPOSE_HEADERS = ['x-next-cursor', 'link']
 
 CSRF_COOKIE_SETTINGS = True
 USE_X_FORWARDED_HOST = True
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 PARENT_DIR = Path(__file__).resolve().parent.parent.parent
@@ -11,3 +12,51 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = 'media/'
 
 STATIC_ROOT = PARENT_DIR / 'static-prod/'
+
+# Хранилища файлов. Веб-сервис и воркер (run_worker) на Render - разные машины без
+# общего диска, поэтому в production файлы должны лежать в S3-совместимом
+# хранилище (django-storages): иначе изображения и уменьшенные копии, созданные
+# воркером при синхронизации МойСклад, и файлы выгрузок не видны веб-сервису.
+# default - загруженные изображения (публичные, /media или бакет);
+# private - выгрузки и другие файлы, которые отдаются только через API с
+# проверкой прав (GET /api/v1/jobs/<id>/file/), а не по публичной ссылке.
+MEDIA_STORAGE_BUCKET = os.environ.get('MEDIA_STORAGE_BUCKET', '')
+PRIVATE_ROOT = PARENT_DIR / 'private'
+
+if MEDIA_STORAGE_BUCKET:
+    _s3_options = {
+        'bucket_name': MEDIA_STORAGE_BUCKET,
+        # Ключи доступа берутся из AWS_ACCESS_KEY_ID и AWS_SECRET_ACCESS_KEY
+        'endpoint_url': os.environ.get('MEDIA_STORAGE_ENDPOINT_URL') or None,
+        'region_name': os.environ.get('MEDIA_STORAGE_REGION') or None,
+        'file_overwrite': False,
+    }
+    STORAGES = {
+        'default': {
+            'BACKEND': 'storages.backends.s3.S3Storage',
+            'OPTIONS': {**_s3_options, 'location': 'media', 'querystring_auth': False},
+        },
+        'private': {
+            'BACKEND': 'storages.backends.s3.S3Storage',
+            'OPTIONS': {**_s3_options, 'location': 'private', 'default_acl': 'private'},
+        },
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+else:
+    # Локально и в docker-compose: каталоги на общем для веба и воркера томе
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'private': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': PRIVATE_ROOT},
+        },
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+
+# Уменьшенные копии изображений товаров (stores.thumbnails): ширины в пикселях, WEBP или JPEG
+THUMBNAIL_WIDTHS = [160, 320, 640]
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_QUALITY = 80
+# Кеш, в котором запоминается, что варианты изображения уже созданы (общий для
+# процессов, если CATALOG_CACHE_URL задан)
+THUMBNAIL_CACHE_ALIAS = 'catalog'
@@ -0,0 +1,153 @@
+"""
+Keyset (cursor) пагинация для APIView, написанных вручную.
+
+Страница выбирается условием WHERE по ключу сортировки (created_at, id) вместо
+OFFSET, поэтому стоимость запроса не зависит от номера страницы. Курсор
+непрозрачен для клиента: это base64 от значений ключа последней строки.
+
+Ответ - {"results": [...], "next_cursor": ...}. Старые клиенты, ожидающие
+голый список, передают ?legacy=1: они получают список той же страницы (по
+умолчанию максимального размера), а курсор следующей - в заголовках
+X-Next-Cursor и Link. Размер страницы ограничен в обоих режимах.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    legacy_query_param = 'legacy'
+
+    def __init__(self, ordering=None, page_size=None):
+        if ordering:
+            self.ordering = tuple(ordering)
+        if page_size:
+            self.page_size = page_size
+        self.next_cursor = None
+        self.legacy = False
+        self.request = None
+
+    @staticmethod
+    def encode_cursor(values) -> str:
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _ordering_field(queryset, name):
+        """Поле модели или аннотации queryset, по которому идет сортировка"""
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def decode_cursor(self, cursor: str, queryset=None) -> list:
+        """
+        Значения ключа из курсора. С queryset каждое значение приводится к типу
+        своего поля сортировки, чтобы подделанный курсор давал 400, а не 500
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError({"detail": "Invalid cursor"})
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValidationError({"detail": "Invalid cursor"})
+        if queryset is None:
+            return values
+
+        coerced = []
+        for field, value in zip(self.ordering, values):
+            if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+                raise ValidationError({"detail": "Invalid cursor"})
+            model_field = self._ordering_field(queryset, field.lstrip('-'))
+            if model_field is not None:
+                try:
+                    value = model_field.to_python(value)
+                except (DjangoValidationError, TypeError, ValueError, OverflowError):
+                    raise ValidationError({"detail": "Invalid cursor"})
+                if value is None:
+                    raise ValidationError({"detail": "Invalid cursor"})
+            coerced.append(value)
+        return coerced
+
+    def get_page_size(self, request) -> int:
+        raw = request.query_params.get(self.page_size_query_param)
+        if not raw:
+            return self.max_page_size if self.legacy else self.page_size
+        try:
+            size = int(raw)
+        except ValueError:
+            raise ValidationError({"detail": f"'{self.page_size_query_param}' must be an integer"})
+        return max(1, min(size, self.max_page_size))
+
+    def is_legacy(self, request) -> bool:
+        return request.query_params.get(self.legacy_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def _after(self, values) -> Q:
+        """
+        Условие "строго после курсора" для составного ключа сортировки:
+        (a > x) OR (a = x AND b > y) OR ... с учетом направления каждого поля.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None) -> list:
+        self.request = request
+        self.legacy = self.is_legacy(request)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor, queryset)))
+
+        # Одна лишняя строка показывает, есть ли следующая страница
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        if len(rows) > page_size:
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(
+                [getattr(last, field.lstrip('-')) for field in self.ordering]
+            )
+        else:
+            self.next_cursor = None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None or self.request is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if self.legacy:
+            response = Response(data)
+            if self.next_cursor is not None:
+                response[NEXT_CURSOR_HEADER] = self.next_cursor
+                response['Link'] = f'<{self.get_next_link()}>; rel="next"'
+            return response
+        return Response({
+            "results": data,
+            "next_cursor": self.next_cursor,
+        })
@@ -18,6 +18,7 @@ urlpatterns = [
       path('stores/', include('stores.urls')),
       path('api/v1/', include('orders.urls')),
       path('api/v1/', include('stores.api_urls')),
+      path('api/v1/', include('jobs.urls')),
       path('', include('django.contrib.auth.urls')),
       path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
       path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='docs'),
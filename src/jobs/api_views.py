@@ -0,0 +1,100 @@
+import os
+
+from django.core.files.storage import storages
+from django.db.models import Q
+from django.http import FileResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from stores.middleware import get_request_store
+from .models import Job
+
+
+def job_file_url(job) -> str:
+    """Ссылка на скачивание файла результата задачи (поле result.file_name, STORAGES['private'])"""
+    return f"/api/v1/jobs/{job.id}/file/"
+
+
+def visible_jobs(request):
+    """Задачи своего магазина и поставленные самим пользователем"""
+    visible = Q(created_by=request.user)
+    user_store = get_request_store(request)
+    if user_store:
+        visible |= Q(store=user_store)
+    return Job.objects.filter(visible)
+
+
+def job_data(job) -> dict:
+    """Состояние задачи для опроса клиентом"""
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "progress": job.progress,
+        "progress_message": job.progress_message,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error or None,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": f"/api/v1/jobs/{job.id}/",
+    }
+
+
+class JobDetailAPIView(APIView):
+    """
+    Background job status for polling
+    GET /api/v1/jobs/{job_id}/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = visible_jobs(request).filter(pk=job_id).first()
+            if job is None:
+                return Response(
+                    {"detail": "Задача не найдена"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(job_data(job))
+        except Exception as e:
+            return Response(
+                {"detail": f"Error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class JobFileAPIView(APIView):
+    """
+    Download the file produced by a background job (exports)
+    GET /api/v1/jobs/{job_id}/file/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = visible_jobs(request).filter(pk=job_id, status='succeeded').first()
+            name = (job.result or {}).get('file_name') if job else None
+            if not name:
+                return Response(
+                    {"detail": "Файл не найден"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            try:
+                file = storages['private'].open(name)
+            except FileNotFoundError:
+                return Response(
+                    {"detail": "Файл не найден"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return FileResponse(file, as_attachment=True, filename=os.path.basename(name))
+        except Exception as e:
+            return Response(
+                {"detail": f"Error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
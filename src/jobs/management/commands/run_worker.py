@@ -0,0 +1,74 @@
+import logging
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from jobs.queue import run_pending
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задачи из очереди пулом потоков до остановки (SIGTERM / Ctrl+C)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 4),
+            help="Сколько задач выполняется одновременно"
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL_SECONDS', 2),
+            help="Пауза в секундах, когда очередь пуста"
+        )
+        parser.add_argument('--burst', action='store_true', help="Завершиться, когда очередь опустеет")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        previous = {sig: signal.signal(sig, lambda *_: stop.set()) for sig in (signal.SIGTERM, signal.SIGINT)}
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        concurrency = max(1, options['concurrency'])
+        try:
+            if concurrency == 1:
+                done = self.work(f'{prefix}:0', stop, options['burst'], options['poll_interval'])
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job-worker') as pool:
+                    futures = [
+                        pool.submit(self.work_in_thread, f'{prefix}:{index}', stop, options['burst'],
+                                    options['poll_interval'])
+                        for index in range(concurrency)
+                    ]
+                    done = sum(future.result() for future in futures)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped, {done} jobs processed"))
+
+    def work(self, worker_id, stop, burst, poll_interval) -> int:
+        done = 0
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                # По одной задаче, чтобы сигнал остановки проверялся между задачами
+                processed = run_pending(worker_id, limit=1)
+            except DatabaseError:
+                logger.exception("Worker %s cannot reach the job queue", worker_id)
+                processed = 0
+            done += processed
+            if not processed:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+        return done
+
+    def work_in_thread(self, *args) -> int:
+        try:
+            return self.work(*args)
+        finally:
+            # У каждого потока свое соединение с БД
+            connection.close()
@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+from stores.models import Store
+from users.models import CustomUser
+
+
+class Job(models.Model):
+    """Фоновая задача: ставится в очередь запросом и выполняется воркером run_worker"""
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('succeeded', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=64)
+    store = models.ForeignKey(to=Store, on_delete=models.CASCADE, null=True, blank=True)
+    created_by = models.ForeignKey(to=CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Не раньше этого времени задача выдается воркеру (пауза перед повтором)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    # Обновляется при каждом отчете о прогрессе; по нему находятся задачи упавших воркеров
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    progress = models.PositiveSmallIntegerField(default=0)
+    progress_message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def report_progress(self, progress=None, message=''):
+        """Сохраняет прогресс (0-100) отдельным UPDATE, чтобы его сразу видел опрос статуса"""
+        now = timezone.now()
+        fields = {'progress_message': message[:255], 'locked_at': now}
+        if progress is not None:
+            fields['progress'] = max(0, min(100, int(progress)))
+        # Воркер, потерявший задачу по таймауту, не продлевает чужую блокировку
+        Job.objects.filter(pk=self.pk, locked_by=self.locked_by).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            # Выборка следующей задачи воркером
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['store', 'created_at'], name='job_store_created_idx'),
+        ]
@@ -0,0 +1,135 @@
+"""
+Очередь фоновых задач в БД.
+
+Запрос ставит задачу (enqueue) и сразу отвечает, а воркер run_worker
+выбирает задачи по одной: кандидат выбирается select_for_update(skip_locked=True)
+и забирается условным UPDATE (compare-and-set по status, locked_at и attempts),
+поэтому несколько воркеров не получают одну задачу и на базах без блокировки
+строк. Результат записывается тоже условно - только воркером, который держит
+задачу, поэтому воркер, потерявший задачу по таймауту, не затирает итог нового
+владельца. Обработчик задачи ищется
+по kind в реестре (jobs.registry). Исключение обработчика возвращает задачу в
+очередь с экспоненциальной паузой, пока не кончатся попытки; JobError
+завершает задачу с ошибкой сразу. Задача упавшего воркера, не сообщавшего о
+прогрессе дольше JOB_LOCK_TIMEOUT_MINUTES, выдается повторно.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_handler
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """Ошибка, которую бессмысленно повторять: задача сразу завершается со статусом failed"""
+
+
+def enqueue(kind, payload=None, store=None, user=None, max_attempts=None) -> Job:
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        store=store,
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+    )
+
+
+def retry_delay(attempts) -> timedelta:
+    base = getattr(settings, 'JOB_RETRY_BACKOFF_SECONDS', 30)
+    limit = getattr(settings, 'JOB_RETRY_BACKOFF_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), limit))
+
+
+def lock_timeout() -> timedelta:
+    return timedelta(minutes=getattr(settings, 'JOB_LOCK_TIMEOUT_MINUTES', 30))
+
+
+def claim_job(worker_id, now=None):
+    """Забирает следующую готовую задачу и помечает ее выполняемой. None - очередь пуста"""
+    now = now or timezone.now()
+    ready = Q(status='queued', run_after__lte=now) | Q(status='running', locked_at__lt=now - lock_timeout())
+    skipped = []
+    while True:
+        with transaction.atomic():
+            job = Job.objects.select_for_update(skip_locked=True).filter(ready).exclude(
+                pk__in=skipped
+            ).order_by('run_after', 'id').first()
+            if job is None:
+                return None
+            # Задачу забирает только тот, кто видел ее в этом же состоянии
+            claimed = Job.objects.filter(
+                pk=job.pk, status=job.status, locked_at=job.locked_at, attempts=job.attempts
+            ).update(
+                status='running', attempts=F('attempts') + 1, locked_by=worker_id, locked_at=now,
+                started_at=job.started_at or now
+            )
+        if claimed:
+            job.status = 'running'
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.started_at = job.started_at or now
+            return job
+        skipped.append(job.pk)
+
+
+def _finish(job, **fields) -> bool:
+    """Записывает итог задачи, если она все еще у этого воркера"""
+    saved = Job.objects.filter(
+        pk=job.pk, status='running', locked_by=job.locked_by, attempts=job.attempts
+    ).update(**fields)
+    if not saved:
+        logger.warning("Job %s (%s) was reclaimed from %s; its result is discarded", job.pk, job.kind, job.locked_by)
+        job.refresh_from_db()
+        return False
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return True
+
+
+def run_job(job) -> Job:
+    """Выполняет взятую задачу и записывает результат, ошибку или следующую попытку"""
+    try:
+        if job.attempts > job.max_attempts:
+            # Воркер упал на последней попытке
+            raise JobError("Worker lost the job on its last attempt")
+        handler = get_handler(job.kind)
+        if handler is None:
+            raise JobError(f"Unknown job kind: {job.kind}")
+        result = handler(job)
+    except Exception as e:
+        now = timezone.now()
+        fields = {'error': f'{type(e).__name__}: {e}', 'locked_by': '', 'locked_at': None}
+        if isinstance(e, JobError) or job.attempts >= job.max_attempts:
+            logger.exception("Job %s (%s) failed", job.pk, job.kind)
+            fields.update(status='failed', finished_at=now)
+        else:
+            logger.warning("Job %s (%s) attempt %s failed: %s", job.pk, job.kind, job.attempts, e)
+            fields.update(status='queued', run_after=now + retry_delay(job.attempts))
+        _finish(job, **fields)
+        return job
+
+    _finish(
+        job, status='succeeded', result=result if result is not None else {}, progress=100, error='',
+        locked_by='', locked_at=None, finished_at=timezone.now()
+    )
+    return job
+
+
+def run_pending(worker_id, limit=None) -> int:
+    """Выполняет готовые задачи, пока очередь не опустеет (или limit задач). Возвращает число задач"""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_job(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
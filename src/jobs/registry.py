@@ -0,0 +1,20 @@
+"""
+Реестр обработчиков фоновых задач.
+
+Обработчик - функция handler(job), возвращающая JSON-совместимый результат;
+регистрируется декоратором @job_handler('<kind>') в модуле <app>.jobs, который
+импортирует JobsConfig.ready(). О ходе работы обработчик сообщает через
+job.report_progress(percent, message).
+"""
+_handlers = {}
+
+
+def job_handler(kind):
+    def register(handler):
+        _handlers[kind] = handler
+        return handler
+    return register
+
+
+def get_handler(kind):
+    return _handlers.get(kind)
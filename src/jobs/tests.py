@@ -0,0 +1,130 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from stores.tests import StoreFixtureMixin
+from .queue import JobError, claim_job, enqueue, run_job, run_pending
+from .registry import job_handler
+
+calls = []
+
+
+@job_handler('test.echo')
+def echo(job):
+    job.report_progress(50, "Половина")
+    calls.append(job.payload)
+    return {"echo": job.payload.get('value')}
+
+
+@job_handler('test.flaky')
+def flaky(job):
+    if job.attempts < 2:
+        raise RuntimeError("Временная ошибка")
+    return {"attempt": job.attempts}
+
+
+@job_handler('test.broken')
+def broken(job):
+    raise JobError("Повторять бессмысленно")
+
+
+@override_settings(JOB_RETRY_BACKOFF_SECONDS=30, JOB_MAX_ATTEMPTS=3)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_job_runs_and_stores_result(self):
+        job = enqueue('test.echo', payload={'value': 7})
+        self.assertEqual(run_pending('worker'), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.progress), ('succeeded', {'echo': 7}, 100))
+        self.assertEqual(job.progress_message, "Половина")
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(run_pending('worker'), 0)
+
+    def test_failed_attempts_are_retried_with_backoff(self):
+        job = enqueue('test.flaky')
+        now = timezone.now()
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_job(claim_job('worker', now=now))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn("Временная ошибка", job.error)
+        self.assertAlmostEqual((job.run_after - now).total_seconds(), 30, delta=5)
+        self.assertIsNone(claim_job('worker', now=now))
+
+        run_job(claim_job('worker', now=now + timedelta(seconds=31)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.error), ('succeeded', {'attempt': 2}, ''))
+
+    def test_attempts_are_limited(self):
+        job = enqueue('test.flaky', max_attempts=1)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            run_pending('worker')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_job_error_and_unknown_kind_fail_immediately(self):
+        broken_job = enqueue('test.broken')
+        unknown = enqueue('test.unknown')
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            run_pending('worker')
+        for job in (broken_job, unknown):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn("Unknown job kind", unknown.error)
+
+    @override_settings(JOB_LOCK_TIMEOUT_MINUTES=30)
+    def test_job_of_lost_worker_is_claimed_again(self):
+        job = enqueue('test.echo')
+        claim_job('crashed-worker')
+        self.assertIsNone(claim_job('worker'))
+
+        later = timezone.now() + timedelta(minutes=31)
+        reclaimed = claim_job('worker', now=later)
+        self.assertEqual((reclaimed.pk, reclaimed.attempts, reclaimed.locked_by), (job.pk, 2, 'worker'))
+
+    @override_settings(JOB_LOCK_TIMEOUT_MINUTES=30)
+    def test_lost_worker_does_not_overwrite_new_owner(self):
+        job = enqueue('test.flaky', max_attempts=3)
+        lost = claim_job('lost-worker')
+        reclaimed = claim_job('worker', now=timezone.now() + timedelta(minutes=31))
+        # Устаревшая копия задачи больше не забирается
+        self.assertIsNone(claim_job('other', now=timezone.now() + timedelta(minutes=31)))
+
+        run_job(reclaimed)
+        with self.assertLogs('jobs.queue', 'WARNING') as logs:
+            run_job(lost)
+        self.assertTrue(any('reclaimed' in line for line in logs.output))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), ('succeeded', {'attempt': 2}, 2))
+
+    def test_run_worker_command_drains_queue(self):
+        enqueue('test.echo', payload={'value': 1})
+        enqueue('test.echo', payload={'value': 2})
+        stdout = StringIO()
+        call_command('run_worker', burst=True, concurrency=1, stdout=stdout)
+        self.assertIn("2 jobs processed", stdout.getvalue())
+        self.assertEqual(calls, [{'value': 1}, {'value': 2}])
+
+
+class JobStatusAPITests(StoreFixtureMixin, TestCase):
+
+    def test_status_is_visible_to_store_only(self):
+        job = enqueue('test.echo', store=self.store)
+        response = self.seller_client().get(f'/api/v1/jobs/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['progress']), ('queued', 0))
+
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.get(f'/api/v1/jobs/{job.id}/').status_code, 404)
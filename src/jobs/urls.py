@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .api_views import JobDetailAPIView, JobFileAPIView
+
+urlpatterns = [
+    path('jobs/<int:job_id>/', JobDetailAPIView.as_view(), name='job-detail'),
+    path('jobs/<int:job_id>/file/', JobFileAPIView.as_view(), name='job-file'),
+]
@@ -0,0 +1,105 @@
+"""
+Оформление заказов из корзины.
+
+Корзина читается одним запросом вместе с товарами, суммы считаются в памяти,
+заказ вставляется один раз уже с итоговой суммой и номером, а позиции - одним
+bulk_create. Товар резервируется на складах (orders.reservations). Число
+запросов не зависит от количества строк корзины.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import CartItem, Order, OrderItem
+from .reservations import reserve_orders
+from .rollups import record_order_created
+
+
+def load_cart_lines(user, store=None) -> list:
+    """Строки корзины пользователя с товарами (опционально - только товары магазина)"""
+    lines = CartItem.objects.filter(cart__user=user).select_related('item')
+    if store is not None:
+        lines = lines.filter(item__store=store)
+    return list(lines.order_by('id'))
+
+
+def build_order_items(cart_lines) -> tuple:
+    """Позиции заказа по строкам корзины и итоговая сумма, без обращений к БД"""
+    order_items = []
+    total_price = Decimal('0')
+    for line in cart_lines:
+        price = line.item.default_price
+        line_total = price * line.amount
+        order_items.append(OrderItem(
+            item=line.item,
+            amount=line.amount,
+            price_per_item=price,
+            total_price=line_total
+        ))
+        total_price += line_total
+    return order_items, total_price
+
+
+def place_order(user, store, cart_lines, comment='', delivery_address='') -> Order:
+    """Создает заказ магазина из строк корзины и учитывает его в сводках продаж"""
+    order_items, total_price = build_order_items(cart_lines)
+
+    with transaction.atomic():
+        # Номер заказа формируется в Order.save до вставки, сумма уже известна
+        order = Order.objects.create(
+            user=user,
+            store=store,
+            comment=comment,
+            delivery_address=delivery_address,
+            status='pending',
+            total_price=total_price
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+        # Товар списывается со складов в резерв; при нехватке транзакция откатывается
+        reserve_orders([(order, order_items)])
+        record_order_created(order, order_items)
+
+    return order
+
+
+def place_orders(user, cart_lines, comment='', delivery_address='') -> list:
+    """
+    Разбивает корзину по магазинам и создает все заказы одной транзакцией:
+    заказы и позиции вставляются двумя bulk_create, резервы - одной пачкой.
+    """
+    lines_by_store = defaultdict(list)
+    for line in cart_lines:
+        lines_by_store[line.item.store_id].append(line)
+
+    orders_with_items = []
+    for store_id, lines in sorted(lines_by_store.items()):
+        order_items, total_price = build_order_items(lines)
+        order = Order(
+            user=user,
+            store_id=store_id,
+            comment=comment,
+            delivery_address=delivery_address,
+            status='pending',
+            total_price=total_price,
+            order_number=Order.generate_order_number()
+        )
+        orders_with_items.append((order, order_items))
+
+    with transaction.atomic():
+        orders = Order.objects.bulk_create([order for order, _ in orders_with_items])
+        for order, order_items in orders_with_items:
+            for order_item in order_items:
+                order_item.order = order
+        OrderItem.objects.bulk_create([
+            order_item for _, order_items in orders_with_items for order_item in order_items
+        ])
+
+        reserve_orders(orders_with_items)
+        for order, order_items in orders_with_items:
+            record_order_created(order, order_items)
+
+    return orders
@@ -2,12 +2,22 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum
+from datetime import date
 
-from stores.models import Store, Item, Group, Uom, Enter, WriteOff, InventoryCheck, InventoryCheckItem, Stock, Storage
-from orders.models import Order, Task, Counterparty
+from core.pagination import KeysetPagination
+from jobs.api_views import job_data
+from jobs.models import Job
+from jobs.queue import enqueue
+from stores.middleware import get_request_store
+from stores.models import Item, Group, Uom, Enter, WriteOff, InventoryCheck, InventoryCheckNotReady, Stock, Storage
+from orders.models import Order, OrderItem, Task, Counterparty
+from orders.idempotency import idempotent
+from orders.services import get_store_order_stats, get_store_product_stats, get_recent_order_activity
 from decimal import Decimal
 
 
@@ -20,49 +30,18 @@ class DashboardStatsAPIView(APIView):
     
     def get(self, request):
         try:
-            # Get user's store (middleware ensures this exists)
-            user_store = getattr(request, 'user_store', None)
+            # Get user's store (resolved once per request by CurrentStoreMiddleware)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
-            # Calculate real statistics for user's store
-            today = timezone.now().date()
-            
-            # Orders statistics
-            total_orders = Order.objects.filter(store=user_store).count()
-            pending_orders = Order.objects.filter(store=user_store, status='pending').count()
-            completed_orders = Order.objects.filter(store=user_store, status='delivered').count()
-            today_orders = Order.objects.filter(store=user_store, created_at__date=today).count()
-            
-            # Revenue statistics
-            total_revenue = Order.objects.filter(store=user_store).aggregate(
-                total=Sum('total_price')
-            )['total'] or Decimal('0.00')
-            
-            today_revenue = Order.objects.filter(
-                store=user_store, 
-                created_at__date=today
-            ).aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
-            
-            # Products statistics
-            total_products = Item.objects.filter(store=user_store).count()
-            
-            # Recent activity
-            recent_orders = Order.objects.filter(store=user_store).order_by('-created_at')[:3]
-            recent_activity = []
-            
-            for order in recent_orders:
-                recent_activity.append({
-                    "type": "order",
-                    "message": f"Заказ #{order.order_number} от {order.user.first_name} {order.user.last_name}",
-                    "timestamp": order.created_at.isoformat()
-                })
+            # All order counters and revenues in one aggregate pass
+            order_stats = get_store_order_stats(user_store)
+            product_stats = get_store_product_stats(user_store)
+            recent_activity = get_recent_order_activity(user_store, limit=3)
             
             # Top products (mock for now - can be implemented with OrderItem aggregation)
             top_products = [
@@ -72,13 +51,13 @@ class DashboardStatsAPIView(APIView):
             ]
             
             stats = {
-                "totalOrders": total_orders,
-                "totalProducts": total_products,
-                "totalRevenue": float(total_revenue),
-                "pendingOrders": pending_orders,
-                "completedOrders": completed_orders,
-                "todayOrders": today_orders,
-                "todayRevenue": float(today_revenue),
+                "totalOrders": order_stats['total_orders'],
+                "totalProducts": product_stats['total_products'],
+                "totalRevenue": float(order_stats['gross_revenue']),
+                "pendingOrders": order_stats['pending_orders'],
+                "completedOrders": order_stats['completed_orders'],
+                "todayOrders": order_stats['today_orders'],
+                "todayRevenue": float(order_stats['today_gross_revenue']),
                 "topProducts": top_products,
                 "recentActivity": recent_activity,
                 "storeInfo": {
@@ -98,28 +77,47 @@ class DashboardStatsAPIView(APIView):
 class OrdersListAPIView(APIView):
     """
     Get orders list for seller
-    GET /api/v1/orders/
+    GET /api/v1/seller/orders/?status=pending,confirmed&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&limit=50&cursor=...
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         try:
             # Get user's store
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
-            # Get orders for user's store only
-            orders_queryset = Order.objects.filter(store=user_store).order_by('-created_at')
+            # Get orders for user's store only, customer and items are loaded in two extra queries per page
+            orders_queryset = Order.objects.filter(store=user_store).select_related('user').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('item'))
+            )
+            
+            # Filters
+            statuses = request.query_params.get('status')
+            if statuses:
+                orders_queryset = orders_queryset.filter(status__in=statuses.split(','))
+            try:
+                date_from = request.query_params.get('date_from')
+                if date_from:
+                    orders_queryset = orders_queryset.filter(created_at__date__gte=date.fromisoformat(date_from))
+                date_to = request.query_params.get('date_to')
+                if date_to:
+                    orders_queryset = orders_queryset.filter(created_at__date__lte=date.fromisoformat(date_to))
+            except ValueError:
+                return Response(
+                    {"detail": "Dates must be in YYYY-MM-DD format"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(orders_queryset, request, view=self)
             
             orders = []
-            for order in orders_queryset:
+            for order in page:
                 order_items = []
                 for item in order.items.all():
                     order_items.append({
@@ -141,7 +139,9 @@ class OrdersListAPIView(APIView):
                     "items": order_items
                 })
             
-            return Response(orders)
+            return paginator.get_paginated_response(orders)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -160,34 +160,26 @@ class ProductsListAPIView(APIView):
     def get(self, request):
         try:
             # Get user's store
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             # Get products for user's store only
-            products_queryset = Item.objects.filter(store=user_store).order_by('-created_at')
+            # Stock totals, category and UOM come with the same query
+            products_queryset = Item.objects.with_stock().filter(store=user_store)
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(products_queryset, request, view=self)
             
             products = []
-            for product in products_queryset:
-                # Calculate total stock from all storages
-                total_stock = 0
-                try:
-                    stocks = Stock.objects.filter(item=product)
-                    total_stock = sum(stock.amount for stock in stocks)
-                except:
-                    total_stock = 0
-                
+            for product in page:
                 products.append({
                     "id": product.id,
                     "name": product.name,
                     "price": float(product.default_price),
-                    "stock": total_stock,
+                    "stock": product.total_stock,
                     "category": product.group.name if product.group else "Нет категории",
                     "status": "active" if product.status else "inactive",
                     "created_at": product.created_at.isoformat(),
@@ -195,7 +187,9 @@ class ProductsListAPIView(APIView):
                     "uom": product.uom.name if product.uom else "шт."
                 })
             
-            return Response(products)
+            return paginator.get_paginated_response(products)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -206,15 +200,12 @@ class ProductsListAPIView(APIView):
         """Create new product for user's store"""
         try:
             # Get user's store
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             data = request.data
             
@@ -282,15 +273,12 @@ class StockRegistrationAPIView(APIView):
     def get(self, request):
         """Get list of stock registrations for user's store"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             # Get all storages for user's store
             storages = Storage.objects.filter(store=user_store)
@@ -298,10 +286,12 @@ class StockRegistrationAPIView(APIView):
             # Get stock registrations for user's storages
             registrations = Enter.objects.filter(
                 storage__in=storages
-            ).select_related('item', 'storage').order_by('-created_at')
+            ).select_related('item', 'storage')
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(registrations, request, view=self)
             
             data = []
-            for reg in registrations:
+            for reg in page:
                 data.append({
                     "id": reg.id,
                     "document_number": reg.document_number or f"REG-{reg.id:03d}",
@@ -314,25 +304,25 @@ class StockRegistrationAPIView(APIView):
                     "status": "Исполнен"
                 })
             
-            return Response(data)
+            return paginator.get_paginated_response(data)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @idempotent
     def post(self, request):
         """Create new stock registration"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             data = request.data
             
@@ -394,15 +384,12 @@ class WriteOffAPIView(APIView):
     def get(self, request):
         """Get list of write-offs for user's store"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             # Get all storages for user's store
             storages = Storage.objects.filter(store=user_store)
@@ -410,10 +397,12 @@ class WriteOffAPIView(APIView):
             # Get write-offs for user's storages
             write_offs = WriteOff.objects.filter(
                 storage__in=storages
-            ).select_related('item', 'storage').order_by('-created_at')
+            ).select_related('item', 'storage')
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(write_offs, request, view=self)
             
             data = []
-            for wo in write_offs:
+            for wo in page:
                 data.append({
                     "id": wo.id,
                     "document_number": wo.document_number or f"WO-{wo.id:03d}",
@@ -426,25 +415,25 @@ class WriteOffAPIView(APIView):
                     "status": "Исполнен"
                 })
             
-            return Response(data)
+            return paginator.get_paginated_response(data)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @idempotent
     def post(self, request):
         """Create new write-off"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             data = request.data
             
@@ -525,40 +514,39 @@ class InventoryCheckAPIView(APIView):
     def get(self, request):
         """Get list of inventory checks for user's store"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             # Get all storages for user's store
             storages = Storage.objects.filter(store=user_store)
             
             # Get inventory checks for user's storages
+            # Количество позиций считается в том же запросе
             checks = InventoryCheck.objects.filter(
                 storage__in=storages
-            ).select_related('storage').order_by('-created_at')
+            ).select_related('storage').annotate(items_count=Count('items'))
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(checks, request, view=self)
             
             data = []
-            for check in checks:
-                # Count items in this check
-                items_count = InventoryCheckItem.objects.filter(inventory_check=check).count()
-                
+            for check in page:
                 data.append({
                     "id": check.id,
                     "document_number": check.document_number or f"INV-{check.id:03d}",
                     "storage_name": check.storage.name,
-                    "items_count": items_count,
+                    "items_count": check.items_count,
                     "status": check.get_status_display(),
                     "created_at": check.created_at.strftime("%d.%m.%Y"),
                     "notes": check.notes or ""
                 })
             
-            return Response(data)
+            return paginator.get_paginated_response(data)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -568,15 +556,12 @@ class InventoryCheckAPIView(APIView):
     def post(self, request):
         """Create new inventory check"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             data = request.data
             
@@ -603,15 +588,9 @@ class InventoryCheckAPIView(APIView):
                 notes=data.get('notes')
             )
             
-            # Auto-create items for all products in this storage
-            stocks = Stock.objects.filter(storage=storage)
-            for stock in stocks:
-                InventoryCheckItem.objects.create(
-                    inventory_check=check,
-                    item=stock.item,
-                    expected_amount=stock.amount,
-                    actual_amount=0  # To be filled during inventory
-                )
+            # Позиции по всем остаткам склада создает фоновая задача (orders.jobs);
+            # до ее завершения инвентаризация остается черновиком
+            job = enqueue('inventory.generate', payload={'check_id': check.id}, store=user_store, user=request.user)
             
             return Response({
                 "id": check.id,
@@ -619,7 +598,8 @@ class InventoryCheckAPIView(APIView):
                 "storage_name": check.storage.name,
                 "status": check.get_status_display(),
                 "created_at": check.created_at.strftime("%d.%m.%Y"),
-                "message": "Inventory check created successfully"
+                "job": job_data(job),
+                "message": "Inventory check created, items are being generated"
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
@@ -629,6 +609,105 @@ class InventoryCheckAPIView(APIView):
             )
 
 
+class InventoryCheckCompleteAPIView(APIView):
+    """
+    Complete inventory check and apply differences to stock
+    POST /api/v1/seller/inventory/checks/{check_id}/complete/
+    Body: {"items": [{"item_id": 1, "actual_amount": 10}, ...]} - optional counted amounts
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, check_id):
+        try:
+            user_store = get_request_store(request)
+            if not user_store:
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            
+            try:
+                check = InventoryCheck.objects.select_related('storage').get(id=check_id, storage__store=user_store)
+            except InventoryCheck.DoesNotExist:
+                return Response(
+                    {"detail": "Инвентаризация не найдена"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Items are still being generated by the inventory.generate job
+            generating = Job.objects.filter(
+                kind='inventory.generate', payload__check_id=check.id, status__in=('queued', 'running')
+            ).exists()
+            if check.status == 'draft' or generating:
+                return Response(
+                    {"detail": "Позиции инвентаризации еще создаются"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            
+            # Validate all counted amounts before saving any of them
+            counted_items = request.data.get('items', [])
+            if not isinstance(counted_items, list):
+                return Response(
+                    {"detail": "items must be a list"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            counted_amounts = {}
+            for counted in counted_items:
+                try:
+                    item_id = int(counted['item_id'])
+                    actual_amount = int(counted['actual_amount'])
+                except (KeyError, TypeError, ValueError):
+                    return Response(
+                        {"detail": "Each item must have integer item_id and actual_amount"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if actual_amount < 0:
+                    return Response(
+                        {"detail": f"Количество товара {item_id} не может быть отрицательным"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                counted_amounts[item_id] = actual_amount
+
+            lines = {line.item_id: line for line in check.items.all()}
+            missing = [item_id for item_id in counted_amounts if item_id not in lines]
+            if missing:
+                return Response(
+                    {"detail": f"Товар {missing[0]} отсутствует в инвентаризации"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Counted amounts are saved and applied together
+            with transaction.atomic():
+                for item_id, actual_amount in counted_amounts.items():
+                    line = lines[item_id]
+                    line.actual_amount = actual_amount
+                    line.save()
+                check.complete()
+            
+            return Response({
+                "id": check.id,
+                "document_number": check.document_number or f"INV-{check.id:03d}",
+                "status": check.get_status_display(),
+                "message": "Inventory check completed successfully"
+            })
+            
+        except InventoryCheckNotReady as e:
+            return Response(
+                {"detail": str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        except ValueError as e:
+            return Response(
+                {"detail": str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            return Response(
+                {"detail": f"Error completing inventory check: {str(e)}"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class ItemsListAPIView(APIView):
     """
     Get items list for inventory operations
@@ -639,15 +718,12 @@ class ItemsListAPIView(APIView):
     def get(self, request):
         """Get list of items for user's store"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             items = Item.objects.filter(store=user_store, status=True)
             
@@ -677,15 +753,12 @@ class StoragesListAPIView(APIView):
     def get(self, request):
         """Get list of storages for user's store"""
         try:
-            user_store = getattr(request, 'user_store', None)
+            user_store = get_request_store(request)
             if not user_store:
-                try:
-                    user_store = Store.objects.get(owner=request.user)
-                except Store.DoesNotExist:
-                    return Response(
-                        {"detail": "У пользователя нет магазина"}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+                return Response(
+                    {"detail": "У пользователя нет магазина"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             storages = Storage.objects.filter(store=user_store)
             
@@ -0,0 +1,134 @@
+from datetime import date
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from jobs.api_views import job_data
+from jobs.queue import enqueue
+from stores.middleware import get_request_store
+from .idempotency import idempotent
+from .exports import EXPORT_COLUMNS, EXPORT_FORMATS, export_records, export_response
+
+
+def _parse_export_params(params, export):
+    """Формат и даты выгрузки из параметров запроса; ошибка - готовый ответ 400"""
+    output = params.get('output', 'ndjson')
+    if output not in EXPORT_FORMATS:
+        return None, Response(
+            {"detail": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if export not in EXPORT_COLUMNS:
+        return None, Response(
+            {"detail": f"export must be one of: {', '.join(EXPORT_COLUMNS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        date_from = params.get('date_from')
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = params.get('date_to')
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except (TypeError, ValueError):
+        return None, Response(
+            {"detail": "Dates must be in YYYY-MM-DD format"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return (output, date_from, date_to), None
+
+
+class ExportAPIView(APIView):
+    """
+    Общая часть потоковых выгрузок продавца.
+    ?output=ndjson (по умолчанию) или ?output=csv; date_from / date_to - YYYY-MM-DD
+    """
+    permission_classes = [IsAuthenticated]
+    export_name = None
+
+    def get(self, request):
+        try:
+            user_store = get_request_store(request)
+            if not user_store:
+                return Response(
+                    {"detail": "У пользователя нет магазина"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            params, error = _parse_export_params(request.query_params, self.export_name)
+            if error:
+                return error
+            output, date_from, date_to = params
+
+            records = export_records(self.export_name, user_store, output, date_from, date_to)
+            return export_response(
+                records, EXPORT_COLUMNS[self.export_name], output, f'{self.export_name}-{user_store.id}'
+            )
+        except Exception as e:
+            return Response(
+                {"detail": f"Error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class OrdersExportAPIView(ExportAPIView):
+    """
+    Export store orders with their items
+    GET /api/v1/seller/exports/orders/
+    """
+    export_name = 'orders'
+
+
+class StockExportAPIView(ExportAPIView):
+    """
+    Export stock per storage
+    GET /api/v1/seller/exports/stock/
+    """
+    export_name = 'stock'
+
+
+class MovementsExportAPIView(ExportAPIView):
+    """
+    Export the stock registration and write-off journal
+    GET /api/v1/seller/exports/movements/
+    """
+    export_name = 'movements'
+
+
+class ExportJobAPIView(APIView):
+    """
+    Build an export file in the background (orders.jobs)
+    POST /api/v1/seller/exports/
+    Body: {"export": "orders" | "stock" | "movements", "output": "csv", "date_from": ..., "date_to": ...}
+    The file URL appears in the job result: GET /api/v1/jobs/{job_id}/
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request):
+        try:
+            user_store = get_request_store(request)
+            if not user_store:
+                return Response(
+                    {"detail": "У пользователя нет магазина"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            export = request.data.get('export')
+            params, error = _parse_export_params(request.data, export)
+            if error:
+                return error
+            output, date_from, date_to = params
+
+            job = enqueue('orders.export', payload={
+                'export': export,
+                'output': output,
+                'date_from': date_from.isoformat() if date_from else None,
+                'date_to': date_to.isoformat() if date_to else None,
+            }, store=user_store, user=request.user)
+            return Response(job_data(job), status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response(
+                {"detail": f"Error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
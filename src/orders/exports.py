@@ -0,0 +1,174 @@
+"""
+Потоковые выгрузки данных магазина: заказы с позициями, остатки по складам,
+журнал оприходований и списаний.
+
+Строки читаются через QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE) и сразу
+кодируются в NDJSON (одна JSON-запись на строку) или CSV, а ответ отдается
+StreamingHttpResponse. В памяти воркера одновременно находится не больше
+одной пачки строк, сколько бы данных ни было у магазина.
+"""
+import csv
+import heapq
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import CharField, F, Prefetch, Value
+from django.http import StreamingHttpResponse
+
+from stores.models import Enter, Stock, WriteOff
+from .models import Order, OrderItem
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+ORDER_COLUMNS = (
+    'order_id', 'order_number', 'created_at', 'status', 'customer_email', 'total_price', 'delivery_address',
+    'item_id', 'item_name', 'amount', 'price_per_item', 'line_total',
+)
+STOCK_COLUMNS = ('storage_id', 'storage_name', 'item_id', 'item_name', 'amount')
+MOVEMENT_COLUMNS = (
+    'type', 'id', 'document_number', 'created_at', 'storage_id', 'storage_name',
+    'item_id', 'item_name', 'amount', 'supplier', 'reason', 'notes',
+)
+
+
+def export_chunk_size() -> int:
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _filter_dates(queryset, date_from=None, date_to=None):
+    if date_from:
+        queryset = queryset.filter(created_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__date__lte=date_to)
+    return queryset
+
+
+def order_records(store, date_from=None, date_to=None):
+    """Заказы магазина со вложенными позициями, от старых к новым"""
+    orders = _filter_dates(Order.objects.filter(store=store), date_from, date_to)
+    orders = orders.select_related('user').prefetch_related(
+        # С chunk_size позиции подгружаются одним запросом на пачку заказов
+        Prefetch('items', queryset=OrderItem.objects.select_related('item').order_by('id'))
+    ).order_by('created_at', 'id')
+
+    for order in orders.iterator(chunk_size=export_chunk_size()):
+        yield {
+            "order_id": order.id,
+            "order_number": order.order_number,
+            "created_at": order.created_at,
+            "status": order.status,
+            "customer_email": order.user.email,
+            "total_price": order.total_price,
+            "delivery_address": order.delivery_address,
+            "items": [{
+                "item_id": line.item_id,
+                "item_name": line.item.name,
+                "amount": line.amount,
+                "price_per_item": line.price_per_item,
+                "line_total": line.total_price,
+            } for line in order.items.all()],
+        }
+
+
+def flatten_order_records(records):
+    """Для CSV: строка на каждую позицию заказа, заказ без позиций - одной строкой"""
+    for record in records:
+        lines = record.pop('items')
+        for line in lines or [{}]:
+            yield {**record, **line}
+
+
+def stock_records(store):
+    """Остатки магазина по складам"""
+    stocks = Stock.objects.filter(storage__store=store).values(
+        'storage_id', 'item_id', 'amount', storage_name=F('storage__name'), item_name=F('item__name')
+    ).order_by('storage_id', 'item_id')
+    return stocks.iterator(chunk_size=export_chunk_size())
+
+
+def movement_records(store, date_from=None, date_to=None):
+    """
+    Журнал движения товара: оприходования и списания, слитые в один поток по
+    (created_at, id). Каждая таблица читается своим курсором по порядку.
+    """
+    fields = ('id', 'document_number', 'created_at', 'storage_id', 'item_id', 'amount', 'notes')
+    names = {'storage_name': F('storage__name'), 'item_name': F('item__name')}
+
+    enters = _filter_dates(Enter.objects.filter(storage__store=store), date_from, date_to).annotate(
+        type=Value('enter'), reason=Value(None, output_field=CharField())
+    ).values(*fields, 'type', 'supplier', 'reason', **names).order_by('created_at', 'id')
+    write_offs = _filter_dates(WriteOff.objects.filter(storage__store=store), date_from, date_to).annotate(
+        type=Value('write_off'), supplier=Value(None, output_field=CharField())
+    ).values(*fields, 'type', 'supplier', 'reason', **names).order_by('created_at', 'id')
+
+    chunk_size = export_chunk_size()
+    return heapq.merge(
+        enters.iterator(chunk_size=chunk_size),
+        write_offs.iterator(chunk_size=chunk_size),
+        key=lambda record: (record['created_at'], record['type'], record['id'])
+    )
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: writerow возвращает готовую строку вместо записи в буфер"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_ndjson(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for record in records:
+        yield encoder.encode(record) + '\n'
+
+
+def encode_csv(records, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for record in records:
+        yield writer.writerow([_csv_value(record.get(column)) for column in columns])
+
+
+EXPORT_COLUMNS = {
+    'orders': ORDER_COLUMNS,
+    'stock': STOCK_COLUMNS,
+    'movements': MOVEMENT_COLUMNS,
+}
+
+
+def export_records(export, store, output, date_from=None, date_to=None):
+    """Записи выгрузки export (ключ EXPORT_COLUMNS) в виде, нужном формату output"""
+    if export == 'orders':
+        records = order_records(store, date_from, date_to)
+        return flatten_order_records(records) if output == 'csv' else records
+    if export == 'stock':
+        return stock_records(store)
+    if export == 'movements':
+        return movement_records(store, date_from, date_to)
+    raise ValueError(f"Unknown export: {export}")
+
+
+def encode_export(records, columns, output):
+    """Строки файла выгрузки; output - ключ EXPORT_FORMATS"""
+    if output == 'csv':
+        return encode_csv(records, columns)
+    return encode_ndjson(records)
+
+
+def export_response(records, columns, output, filename) -> StreamingHttpResponse:
+    """Ответ, кодирующий записи по мере чтения"""
+    response = StreamingHttpResponse(encode_export(records, columns, output), content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
@@ -0,0 +1,141 @@
+"""
+Идемпотентность POST-запросов по заголовку Idempotency-Key.
+
+Первый запрос с ключом занимает запись IdempotencyKey, выполняется и
+сохраняет ответ. Повторы с тем же ключом (ретраи мобильных клиентов)
+получают сохраненный ответ: сначала из кеша Django без обращения к БД, затем
+из таблицы. Ключ, повторно использованный с другим телом запроса, отклоняется
+с 422, а повтор, пришедший во время выполнения первого запроса, - с 409.
+Незавершенная запись старше IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS
+(процесс упал посреди запроса) освобождается, как просроченная. Ответы 5xx не
+сохраняются, чтобы клиент мог повторить запрос. Ключ принимается только от
+аутентифицированных пользователей: у анонимных нет своей области ключей.
+Просроченные записи удаляет команда purge_idempotency_keys.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def idempotency_ttl() -> timedelta:
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def in_progress_timeout() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS', 60))
+
+
+def _scope(request):
+    return f'user:{request.user.pk}'
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _cache_key(scope, key):
+    digest = hashlib.sha256(f'{scope}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def _replay(fingerprint, stored_fingerprint, status_code, body):
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {"detail": "Idempotency-Key was already used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(body, status=status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """Декоратор метода post APIView: без заголовка Idempotency-Key запрос выполняется как обычно"""
+
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(view, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be at most 255 characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not request.user.is_authenticated:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} requires an authenticated user"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = _scope(request)
+        fingerprint = _fingerprint(request)
+        cache_key = _cache_key(scope, key)
+
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _replay(fingerprint, *cached)
+
+        now = timezone.now()
+        ttl = idempotency_ttl()
+        try:
+            with transaction.atomic():
+                # Просроченный или зависший незавершенным ключ освобождается, даже если сборщик еще не прошел
+                IdempotencyKey.objects.filter(scope=scope, key=key).filter(
+                    Q(expires_at__lte=now) | Q(status_code__isnull=True, created_at__lte=now - in_progress_timeout())
+                ).delete()
+                record = IdempotencyKey.objects.create(
+                    scope=scope, key=key, method=request.method, path=request.path[:255],
+                    fingerprint=fingerprint, expires_at=now + ttl
+                )
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if existing is None or existing.status_code is None:
+                return Response(
+                    {"detail": "A request with this Idempotency-Key is already in progress"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return _replay(fingerprint, existing.fingerprint, existing.status_code, existing.response_body)
+
+        try:
+            response = view_method(view, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+            return response
+
+        saved = IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=response.status_code, response_body=response.data
+        )
+        if not saved:
+            # Запрос выполнялся дольше срока незавершенной записи, и ее освободил повтор
+            return response
+        # Кешируется уже сериализованное тело, как его вернет таблица
+        body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+        cache.set(cache_key, (fingerprint, response.status_code, body), int(ttl.total_seconds()))
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(now=None) -> int:
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
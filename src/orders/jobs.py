@@ -0,0 +1,55 @@
+"""Фоновые задачи заказов и склада (реестр jobs.registry)"""
+import tempfile
+from datetime import date
+
+from django.core.files import File
+from django.core.files.storage import storages
+
+from jobs.api_views import job_file_url
+from jobs.queue import JobError
+from jobs.registry import job_handler
+from stores.models import InventoryCheck
+from .exports import EXPORT_COLUMNS, EXPORT_FORMATS, encode_export, export_chunk_size, export_records
+
+
+@job_handler('orders.export')
+def build_export_file(job):
+    """
+    Пишет выгрузку в закрытое хранилище (STORAGES['private']) через временный
+    файл, не держа ее в памяти. Файл отдается только через JobFileAPIView
+    """
+    payload = job.payload
+    export, output = payload.get('export'), payload.get('output', 'ndjson')
+    if export not in EXPORT_COLUMNS or output not in EXPORT_FORMATS:
+        raise JobError(f"Unsupported export {export!r} in {output!r}")
+    date_from = date.fromisoformat(payload['date_from']) if payload.get('date_from') else None
+    date_to = date.fromisoformat(payload['date_to']) if payload.get('date_to') else None
+
+    rows = 0
+
+    def counted(records):
+        nonlocal rows
+        for record in records:
+            rows += 1
+            if rows % export_chunk_size() == 0:
+                job.report_progress(message=f"Выгружено строк: {rows}")
+            yield record
+
+    records = counted(export_records(export, job.store, output, date_from, date_to))
+    with tempfile.TemporaryFile() as buffer:
+        for line in encode_export(records, EXPORT_COLUMNS[export], output):
+            buffer.write(line.encode())
+        buffer.seek(0)
+        name = storages['private'].save(f'exports/{job.store_id}/{export}-{job.pk}.{output}', File(buffer))
+
+    return {"file": job_file_url(job), "file_name": name, "rows": rows}
+
+
+@job_handler('inventory.generate')
+def generate_inventory_items(job):
+    check = InventoryCheck.objects.filter(pk=job.payload.get('check_id'), storage__store_id=job.store_id).first()
+    if check is None:
+        raise JobError("Инвентаризация не найдена")
+
+    created = check.generate_items(progress=job.report_progress)
+    return {"check_id": check.id, "items_created": created}
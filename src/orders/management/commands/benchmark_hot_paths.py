@@ -0,0 +1,178 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from orders.dashboard_api_views import DashboardStatsAPIView, OrdersListAPIView, ProductsListAPIView
+from orders.models import Counterparty, Order, OrderItem, Task
+from orders.rollups import rebuild_store_rollups
+from stores.models import City, Country, Item, Stock, Storage, Store
+from users.models import CustomUser
+
+BENCH_PREFIX = 'bench'
+
+# Индексы горячих путей, которые снимаются в режиме --compare
+HOT_INDEXES = {
+    Order: ('order_store_created_idx', 'order_store_status_idx'),
+    Item: ('item_store_status_created_idx',),
+    Task: ('task_store_created_idx',),
+    Counterparty: ('counterparty_store_created_idx',),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет БД синтетическими заказами и выводит планы (EXPLAIN) и время "
+        "горячих запросов и API. Запускать только на отдельной БД для замеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help="Сколько заказов создать")
+        parser.add_argument('--stores', type=int, default=20, help="Между сколькими магазинами распределить заказы")
+        parser.add_argument('--batch', type=int, default=5000, help="Размер пачки bulk_create")
+        parser.add_argument('--repeat', type=int, default=5, help="Повторов каждого замера")
+        parser.add_argument('--skip-seed', action='store_true', help="Не создавать данные, замерить существующие")
+        parser.add_argument('--compare', action='store_true',
+                            help="Дополнительно замерить без индексов горячих путей (индексы возвращаются откатом)")
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.seed(options['orders'], options['stores'], options['batch'])
+
+        store = Store.objects.filter(name__startswith=f'{BENCH_PREFIX}-').order_by('id').first()
+        if store is None:
+            self.stderr.write("No benchmark stores found, run without --skip-seed first")
+            return
+
+        if options['compare']:
+            try:
+                with transaction.atomic():
+                    self.drop_hot_indexes()
+                    self.stdout.write(self.style.MIGRATE_HEADING("Without hot path indexes"))
+                    self.measure(store, options['repeat'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        self.stdout.write(self.style.MIGRATE_HEADING("With hot path indexes"))
+        self.measure(store, options['repeat'])
+
+    def seed(self, total_orders, store_count, batch_size):
+        country, _ = Country.objects.get_or_create(name='Benchmark')
+        city, _ = City.objects.get_or_create(name='Benchmark', country=country)
+
+        stores = []
+        for index in range(store_count):
+            owner, _ = CustomUser.objects.get_or_create(
+                username=f'{BENCH_PREFIX}_owner_{index}', defaults={'email': f'{BENCH_PREFIX}{index}@example.com'}
+            )
+            # Магазин создается сигналом при регистрации пользователя
+            store = Store.objects.filter(owner=owner).first()
+            store.name = f'{BENCH_PREFIX}-{index}'
+            store.save(update_fields=['name'])
+            storage, _ = Storage.objects.get_or_create(name=f'{BENCH_PREFIX}-{index}', city=city, store=store)
+            if not Item.objects.filter(store=store).exists():
+                Item.objects.bulk_create([
+                    Item(store=store, name=f'Товар {n}', default_price=Decimal(100 + n),
+                         default_storage=storage, status=n % 5 != 0)
+                    for n in range(50)
+                ])
+            stores.append((owner, store, list(Item.objects.filter(store=store).values_list('id', 'default_price'))))
+
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        offset = Order.objects.filter(order_number__startswith='BENCH-').count()
+        now = timezone.now()
+        created = 0
+        while created < total_orders:
+            size = min(batch_size, total_orders - created)
+            orders, lines = [], []
+            for n in range(created, created + size):
+                owner, store, items = stores[n % len(stores)]
+                item_id, price = items[n % len(items)]
+                orders.append(Order(
+                    user=owner, store=store, status=statuses[n % len(statuses)],
+                    total_price=price, order_number=f'BENCH-{offset + n:09d}'
+                ))
+                lines.append((item_id, price))
+
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, item_id=item_id, amount=1, price_per_item=price, total_price=price)
+                    for order, (item_id, price) in zip(orders, lines)
+                ])
+                # auto_now_add перезаписывает дату при вставке, поэтому пачка сдвигается в прошлое отдельно
+                Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+                    created_at=now - timedelta(hours=(offset + created) // batch_size * 6)
+                )
+
+            created += size
+            self.stdout.write(f"Seeded {created}/{total_orders} orders")
+
+        for _, store, _ in stores:
+            rebuild_store_rollups(store)
+        self.stdout.write(self.style.SUCCESS("Seeding finished"))
+
+    def drop_hot_indexes(self):
+        # Без входа в контекст schema_editor: SQLite не дает открыть его внутри atomic
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, names in HOT_INDEXES.items():
+                for index in model._meta.indexes:
+                    if index.name in names:
+                        cursor.execute(str(index.remove_sql(model, editor)))
+
+    def measure(self, store, repeat):
+        querysets = {
+            'orders by store': Order.objects.filter(store=store).order_by('-created_at', '-id')[:50],
+            'orders by store and status': Order.objects.filter(
+                store=store, status='pending'
+            ).order_by('-created_at', '-id')[:50],
+            'order items for page': OrderItem.objects.filter(
+                order__in=Order.objects.filter(store=store).order_by('-created_at', '-id').values('id')[:50]
+            ),
+            'active items': Item.objects.filter(store=store, status=True).order_by('-created_at'),
+            'stock lookup': Stock.objects.filter(item__store=store, storage=store.storage_set.first()),
+            'tasks': Task.objects.filter(store=store).order_by('-created_at'),
+            'counterparties': Counterparty.objects.filter(store=store).order_by('-created_at'),
+        }
+        for name, queryset in querysets.items():
+            self.stdout.write(self.style.HTTP_INFO(f"-- {name}"))
+            self.stdout.write(queryset.explain())
+            self.report(name, repeat, lambda: list(queryset.all()))
+
+        factory = APIRequestFactory()
+        views = [
+            ('GET /api/v1/seller/orders/', OrdersListAPIView, '/api/v1/seller/orders/'),
+            ('GET /api/v1/seller/orders/?status=pending', OrdersListAPIView, '/api/v1/seller/orders/?status=pending'),
+            ('GET /api/v1/dashboard/stats/', DashboardStatsAPIView, '/api/v1/dashboard/stats/'),
+            ('GET /api/v1/seller/products/', ProductsListAPIView, '/api/v1/seller/products/'),
+        ]
+        for name, view_class, path in views:
+            view = view_class.as_view()
+
+            def call():
+                request = factory.get(path)
+                force_authenticate(request, user=store.owner)
+                view(request)
+
+            self.report(name, repeat, call)
+
+    def report(self, name, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"{name}: median {statistics.median(timings):.2f} ms, min {min(timings):.2f} ms ({repeat} runs)"
+        )
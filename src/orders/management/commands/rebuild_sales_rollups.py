@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stores.models import Store
+from orders.rollups import rebuild_store_rollups
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает дневные сводки продаж (StoreDailySales, StoreItemDailySales) по истории заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='store_ids',
+                            help="ID магазина; можно указать несколько раз. По умолчанию - все магазины")
+
+    def handle(self, *args, **options):
+        stores = Store.objects.order_by('id')
+        if options['store_ids']:
+            stores = stores.filter(id__in=options['store_ids'])
+            missing = set(options['store_ids']) - set(stores.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Stores not found: {sorted(missing)}")
+
+        for store in stores.iterator():
+            rebuild_store_rollups(store)
+            self.stdout.write(f"{store.id} {store.name}: rebuilt")
+
+        self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Отменяет ожидающие заказы с истекшим резервом и возвращает товар на склады (запускать по расписанию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help="Сколько заказов обрабатывать в одной транзакции")
+
+    def handle(self, *args, **options):
+        cancelled = release_expired_reservations(batch_size=options['batch'])
+        self.stdout.write(self.style.SUCCESS(f"Cancelled {cancelled} expired orders"))
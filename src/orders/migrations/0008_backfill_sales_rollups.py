@@ -0,0 +1,64 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:05
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+# Копии orders.services.REVENUE_STATUSES и статусов Order на момент миграции
+REVENUE_STATUSES = ('delivered', 'processing', 'shipped')
+STATUSES = ('pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled', 'returned')
+
+
+def fill_sales_rollups(apps, schema_editor):
+    """Заполняет дневные сводки продаж по истории заказов (как команда rebuild_sales_rollups)"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    StoreDailySales = apps.get_model('orders', 'StoreDailySales')
+    StoreItemDailySales = apps.get_model('orders', 'StoreItemDailySales')
+
+    StoreDailySales.objects.all().delete()
+    StoreItemDailySales.objects.all().delete()
+
+    status_counts = {f'{status}_count': Count('id', filter=Q(status=status)) for status in STATUSES}
+    # Заказы без магазина (старый OrderCreationAPIView) в сводки не попадают, как в record_order_created
+    daily = Order.objects.filter(store__isnull=False).annotate(day=TruncDate('created_at')).values('store_id', 'day').annotate(
+        orders_count=Count('id'),
+        gross_revenue=Sum('total_price'),
+        revenue=Sum('total_price', filter=Q(status__in=REVENUE_STATUSES)),
+        **status_counts
+    ).order_by('store_id', 'day')
+    order_lines = OrderItem.objects.filter(order__store__isnull=False).annotate(day=TruncDate('order__created_at'))
+    units = {
+        (row['order__store_id'], row['day']): row['units']
+        for row in order_lines.values('order__store_id', 'day').annotate(units=Sum('amount')).order_by()
+    }
+    items_daily = order_lines.values('order__store_id', 'day', 'item_id').annotate(
+        units=Sum('amount'),
+        revenue=Sum('total_price')
+    ).order_by('order__store_id', 'day', 'item_id')
+
+    StoreDailySales.objects.bulk_create([
+        StoreDailySales(
+            units=units.get((row['store_id'], row['day'])) or 0,
+            **{**row, 'revenue': row['revenue'] or 0}
+        )
+        for row in daily
+    ], batch_size=1000)
+    StoreItemDailySales.objects.bulk_create([
+        StoreItemDailySales(
+            store_id=row['order__store_id'], item_id=row['item_id'], day=row['day'],
+            units=row['units'] or 0, revenue=row['revenue'] or 0
+        )
+        for row in items_daily
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_sales_rollups, migrations.RunPython.noop),
+    ]
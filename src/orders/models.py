@@ -1,8 +1,11 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
 from users.models import CustomUser
-from stores.models import Item, SelfPickupPoint, Store
+from stores.models import Item, SelfPickupPoint, Storage, Store
 
 
 class Cart(models.Model):
@@ -59,11 +62,15 @@ class Order(models.Model):
     delivery_address = models.TextField(blank=True)
     delivery_date = models.DateTimeField(null=True, blank=True)
     
+    @staticmethod
+    def generate_order_number():
+        """Уникальный номер заказа; вызывается и при bulk_create, где save не выполняется"""
+        return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
     def save(self, *args, **kwargs):
         if not self.order_number:
             # Генерируем уникальный номер заказа
-            import uuid
-            self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+            self.order_number = self.generate_order_number()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -73,6 +80,11 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['-created_at']
+        indexes = [
+            # Ленты заказов магазина: keyset по (created_at, id) и фильтр по статусу
+            models.Index(fields=['store', 'created_at', 'id'], name='order_store_created_idx'),
+            models.Index(fields=['store', 'status', 'created_at'], name='order_store_status_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -96,6 +108,83 @@ class OrderItem(models.Model):
         verbose_name_plural = "Товары заказа"
 
 
+
+class StockReservation(models.Model):
+    """
+    Резерв товара под заказ. Зарезервированное количество сразу списывается
+    с остатка склада; при отмене заказа или истечении срока оно возвращается.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Активен'),
+        ('committed', 'Подтвержден заказом'),
+        ('released', 'Снят'),
+    ]
+
+    order = models.ForeignKey(to=Order, on_delete=models.CASCADE, related_name='reservations')
+    item = models.ForeignKey(to=Item, on_delete=models.CASCADE)
+    storage = models.ForeignKey(to=Storage, on_delete=models.CASCADE)
+    amount = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Резерв {self.item_id} x{self.amount} ({self.status}) - заказ {self.order_id}"
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        indexes = [
+            # Поиск просроченных активных резервов сборщиком
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expiry_idx'),
+        ]
+
+
+class StoreDailySales(models.Model):
+    """Дневная сводка продаж магазина, обновляется инкрементально при создании и смене статуса заказа"""
+    store = models.ForeignKey(to=Store, on_delete=models.CASCADE)
+    day = models.DateField()
+    orders_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    # Сумма всех заказов дня и сумма заказов в статусах, учитываемых в выручке
+    gross_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # Количество заказов дня в каждом статусе
+    pending_count = models.IntegerField(default=0)
+    confirmed_count = models.IntegerField(default=0)
+    processing_count = models.IntegerField(default=0)
+    shipped_count = models.IntegerField(default=0)
+    delivered_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    returned_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.store.name}: {self.day} - {self.orders_count} заказов"
+
+    class Meta:
+        verbose_name = "Продажи магазина за день"
+        verbose_name_plural = "Продажи магазинов по дням"
+        unique_together = ('store', 'day')
+
+
+class StoreItemDailySales(models.Model):
+    """Дневная сводка продаж товара магазина"""
+    store = models.ForeignKey(to=Store, on_delete=models.CASCADE)
+    item = models.ForeignKey(to=Item, on_delete=models.CASCADE)
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.item.name}: {self.day} - {self.units}"
+
+    class Meta:
+        verbose_name = "Продажи товара за день"
+        verbose_name_plural = "Продажи товаров по дням"
+        unique_together = ('store', 'item', 'day')
+
+
 # Task Models
 class TaskCategory(models.Model):
     """Категории задач"""
@@ -162,6 +251,9 @@ class Task(models.Model):
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['store', 'created_at'], name='task_store_created_idx'),
+        ]
 
 
 class TaskComment(models.Model):
@@ -249,3 +341,33 @@ class Counterparty(models.Model):
         verbose_name = "Контрагент"
         verbose_name_plural = "Контрагенты"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['store', 'created_at'], name='counterparty_store_created_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Сохраненный ответ на POST с заголовком Idempotency-Key. Повтор запроса с
+    тем же ключом получает сохраненный ответ вместо повторного выполнения.
+    """
+    scope = models.CharField(max_length=64, help_text="Пользователь, отправивший запрос")
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 метода, пути и тела запроса")
+    # Пусто, пока первый запрос еще выполняется
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} [{self.key}]"
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_scope_key'),
+        ]
@@ -5,7 +5,13 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 
-from .models import Order, OrderItem, Cart, CartItem
+from .checkout import load_cart_lines, place_order, place_orders
+from .idempotency import idempotent
+from .models import Order, Cart, CartItem
+from .reservations import apply_order_status
+from .rollups import record_order_status_change
+from .services import get_cart_summary
+from stores.ledger import InsufficientStock
 from stores.models import Store, Item
 from users.models import CustomUser
 
@@ -17,6 +23,7 @@ class CreateOrderAPIView(APIView):
     """
     permission_classes = [AllowAny]  # Temporarily allow any for testing
     
+    @idempotent
     def post(self, request):
         try:
             user = request.user
@@ -32,56 +39,29 @@ class CreateOrderAPIView(APIView):
             
             store = get_object_or_404(Store, id=store_id)
             
-            # Получаем корзину пользователя
-            try:
-                cart = Cart.objects.get(user=user)
-                cart_items = CartItem.objects.filter(cart=cart, item__store=store)
-                
-                if not cart_items.exists():
+            # Получаем строки корзины для этого магазина вместе с товарами
+            cart_lines = load_cart_lines(user, store=store)
+            if not cart_lines:
+                if not Cart.objects.filter(user=user).exists():
                     return Response(
-                        {"detail": "Cart is empty for this store"}, 
-                        status=status.HTTP_400_BAD_REQUEST
+                        {"detail": "Cart not found"}, 
+                        status=status.HTTP_404_NOT_FOUND
                     )
-            except Cart.DoesNotExist:
                 return Response(
-                    {"detail": "Cart not found"}, 
-                    status=status.HTTP_404_NOT_FOUND
+                    {"detail": "Cart is empty for this store"}, 
+                    status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Создаем заказ в транзакции
+            # Создаем заказ и очищаем корзину для этого магазина в одной транзакции
             with transaction.atomic():
-                # Создаем заказ
-                order = Order.objects.create(
-                    user=user,
-                    store=store,
+                order = place_order(
+                    user,
+                    store,
+                    cart_lines,
                     comment=data.get('comment', ''),
-                    delivery_address=data.get('delivery_address', ''),
-                    status='pending'
+                    delivery_address=data.get('delivery_address', '')
                 )
-                
-                total_price = 0
-                
-                # Создаем позиции заказа из корзины
-                for cart_item in cart_items:
-                    item_price = cart_item.item.default_price
-                    item_total = item_price * cart_item.amount
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        item=cart_item.item,
-                        amount=cart_item.amount,
-                        price_per_item=item_price,
-                        total_price=item_total
-                    )
-                    
-                    total_price += item_total
-                
-                # Обновляем общую стоимость заказа
-                order.total_price = total_price
-                order.save()
-                
-                # Очищаем корзину для этого магазина
-                cart_items.delete()
+                CartItem.objects.filter(pk__in=[line.pk for line in cart_lines]).delete()
                 
                 return Response({
                     "order_id": order.id,
@@ -92,6 +72,11 @@ class CreateOrderAPIView(APIView):
                     "message": "Order created successfully"
                 }, status=status.HTTP_201_CREATED)
                 
+        except InsufficientStock as e:
+            return Response(
+                {"detail": str(e), "item_id": e.item_id, "requested": e.requested}, 
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response(
                 {"detail": f"Error creating order: {str(e)}"}, 
@@ -99,6 +84,63 @@ class CreateOrderAPIView(APIView):
             )
 
 
+
+class CheckoutAllAPIView(APIView):
+    """
+    Create orders for every store in the cart at once
+    POST /api/v1/orders/checkout-all/
+    """
+    
+    @idempotent
+    def post(self, request):
+        try:
+            user = request.user
+            data = request.data
+            
+            # Вся корзина одним запросом, заказы разбиваются по магазинам товаров
+            cart_lines = load_cart_lines(user)
+            if not cart_lines:
+                return Response(
+                    {"detail": "Cart is empty"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            with transaction.atomic():
+                orders = place_orders(
+                    user,
+                    cart_lines,
+                    comment=data.get('comment', ''),
+                    delivery_address=data.get('delivery_address', '')
+                )
+                CartItem.objects.filter(pk__in=[line.pk for line in cart_lines]).delete()
+            
+            return Response({
+                "orders": [
+                    {
+                        "order_id": order.id,
+                        "order_number": order.order_number,
+                        "store_id": order.store_id,
+                        "total_price": float(order.total_price),
+                        "status": order.status
+                    }
+                    for order in orders
+                ],
+                "total_price": float(sum(order.total_price for order in orders)),
+                "message": "Orders created successfully"
+            }, status=status.HTTP_201_CREATED)
+            
+        except InsufficientStock as e:
+            return Response(
+                {"detail": str(e), "item_id": e.item_id, "requested": e.requested}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        except Exception as e:
+            return Response(
+                {"detail": f"Error creating orders: {str(e)}"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class UpdateOrderStatusAPIView(APIView):
     """
     Update order status
@@ -140,8 +182,13 @@ class UpdateOrderStatusAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            order.status = new_status
-            order.save()
+            with transaction.atomic():
+                # Блокируем заказ, чтобы параллельные смены статуса не исказили сводки
+                old_status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+                order.status = new_status
+                order.save()
+                record_order_status_change(order, old_status)
+                apply_order_status(order, old_status)
             
             return Response({
                 "order_id": order.id,
@@ -152,6 +199,11 @@ class UpdateOrderStatusAPIView(APIView):
                 "message": "Order status updated successfully"
             })
             
+        except InsufficientStock as e:
+            return Response(
+                {"detail": str(e), "item_id": e.item_id, "requested": e.requested}, 
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response(
                 {"detail": f"Error updating order: {str(e)}"}, 
@@ -166,6 +218,7 @@ class AddToCartAPIView(APIView):
     """
     permission_classes = [AllowAny]  # Temporarily allow any for testing
     
+    @idempotent
     def post(self, request):
         try:
             user = request.user
@@ -231,33 +284,8 @@ class RealCartAPIView(APIView):
         try:
             user = request.user
             
-            try:
-                cart = Cart.objects.get(user=user)
-                cart_items = CartItem.objects.filter(cart=cart).select_related('item', 'item__store', 'item__uom')
-            except Cart.DoesNotExist:
-                return Response({"items": []})
-            
-            items_data = []
-            for cart_item in cart_items:
-                items_data.append({
-                    "id": cart_item.id,
-                    "amount": cart_item.amount,
-                    "item": {
-                        "id": cart_item.item.id,
-                        "name": cart_item.item.name,
-                        "preview": cart_item.item.preview.url if cart_item.item.preview else None,
-                        "price": float(cart_item.item.default_price),
-                        "store": {
-                            "id": cart_item.item.store.id,
-                            "name": cart_item.item.store.name
-                        },
-                        "uom": {
-                            "name": cart_item.item.uom.name if cart_item.item.uom else "шт"
-                        }
-                    }
-                })
-            
-            return Response({"items": items_data})
+            # Вся корзина с остатками, изображениями и итогами по магазинам одним запросом
+            return Response(get_cart_summary(user))
             
         except Exception as e:
             return Response(
@@ -282,6 +310,7 @@ class RealCartAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @idempotent
     def post(self, request):
         """
         Add item to cart
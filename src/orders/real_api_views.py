@@ -2,12 +2,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+from core.pagination import KeysetPagination
 from .models import Order, OrderItem, Task, TaskCategory, Counterparty
+from .services import get_store_order_stats, get_store_product_stats, get_recent_order_activity, get_top_products
+from .timeseries import GRANULARITIES, MAX_SPAN_DAYS, sales_timeseries, status_distribution
 from stores.models import Store, Item, CounterpartyGroup, CounterpartyMember
 from users.models import CustomUser
 
@@ -35,52 +39,15 @@ class RealDashboardStatsAPIView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Базовые статистики заказов
-            total_orders = Order.objects.filter(store=store).count()
-            pending_orders = Order.objects.filter(store=store, status='pending').count()
-            completed_orders = Order.objects.filter(store=store, status='delivered').count()
-            
-            # Общая выручка
-            total_revenue = Order.objects.filter(
-                store=store, 
-                status__in=['delivered', 'processing', 'shipped']
-            ).aggregate(total=Sum('total_price'))['total'] or 0
-            
-            # Статистики за сегодня
-            today = timezone.now().date()
-            today_orders = Order.objects.filter(
-                store=store, 
-                created_at__date=today
-            ).count()
-            
-            today_revenue = Order.objects.filter(
-                store=store, 
-                created_at__date=today,
-                status__in=['delivered', 'processing', 'shipped']
-            ).aggregate(total=Sum('total_price'))['total'] or 0
-            
-            # Количество товаров
-            total_products = Item.objects.filter(store=store, status=True).count()
-            
-            # Топ товары (по количеству заказов)
-            top_products = OrderItem.objects.filter(
-                order__store=store
-            ).values(
-                'item__name'
-            ).annotate(
-                sales=Sum('amount')
-            ).order_by('-sales')[:3]
+            # Счетчики и выручка заказов одним агрегирующим запросом
+            order_stats = get_store_order_stats(store)
+            product_stats = get_store_product_stats(store)
             
-            # Последняя активность
-            recent_orders = Order.objects.filter(store=store).order_by('-created_at')[:3]
-            recent_activity = []
+            # Топ товары (по количеству проданных единиц)
+            top_products = get_top_products(store, limit=3, ordering='-total_sold')
             
-            for order in recent_orders:
-                recent_activity.append({
-                    "type": "order",
-                    "message": f"Новый заказ #{order.order_number}",
-                    "timestamp": order.created_at.isoformat()
-                })
+            # Последняя активность
+            recent_activity = get_recent_order_activity(store, limit=3, with_customer=False)
             
             # Добавляем недавно добавленные товары
             recent_products = Item.objects.filter(store=store).order_by('-created_at')[:2]
@@ -95,15 +62,15 @@ class RealDashboardStatsAPIView(APIView):
             recent_activity = sorted(recent_activity, key=lambda x: x['timestamp'], reverse=True)[:5]
             
             stats = {
-                "totalOrders": total_orders,
-                "totalProducts": total_products,
-                "totalRevenue": float(total_revenue),
-                "pendingOrders": pending_orders,
-                "completedOrders": completed_orders,
-                "todayOrders": today_orders,
-                "todayRevenue": float(today_revenue),
+                "totalOrders": order_stats['total_orders'],
+                "totalProducts": product_stats['active_products'],
+                "totalRevenue": float(order_stats['revenue']),
+                "pendingOrders": order_stats['pending_orders'],
+                "completedOrders": order_stats['completed_orders'],
+                "todayOrders": order_stats['today_orders'],
+                "todayRevenue": float(order_stats['today_revenue']),
                 "topProducts": [
-                    {"name": item['item__name'], "sales": item['sales']} 
+                    {"name": item['item__name'], "sales": item['total_sold']} 
                     for item in top_products
                 ],
                 "recentActivity": recent_activity
@@ -201,15 +168,12 @@ class RealProductsListAPIView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            products = Item.objects.filter(store=store)
+            # Остатки, категория и единица измерения приходят одним запросом
+            products = Item.objects.with_stock().filter(store=store)
             products_data = []
             
             for product in products:
-                # Получаем остатки на складе
-                from stores.models import Stock
-                stock_total = Stock.objects.filter(item=product).aggregate(
-                    total=Sum('amount')
-                )['total'] or 0
+                stock_total = product.total_stock
                 
                 # Получаем категорию
                 category_name = product.group.name if product.group else "Без категории"
@@ -262,9 +226,11 @@ class TasksAPIView(APIView):
                 )
             
             tasks = Task.objects.filter(store=store).select_related('category', 'assigned_to', 'created_by')
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(tasks, request, view=self)
             tasks_data = []
             
-            for task in tasks:
+            for task in page:
                 tasks_data.append({
                     "id": task.id,
                     "title": task.title,
@@ -296,8 +262,10 @@ class TasksAPIView(APIView):
                     "actual_hours": float(task.actual_hours) if task.actual_hours else None
                 })
             
-            return Response(tasks_data)
+            return paginator.get_paginated_response(tasks_data)
             
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -384,9 +352,11 @@ class ContractorsAPIView(APIView):
             
             # Получаем контрагентов для данного магазина
             contractors = Counterparty.objects.filter(store=store)
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(contractors, request, view=self)
             contractors_data = []
             
-            for contractor in contractors:
+            for contractor in page:
                 contractors_data.append({
                     "id": contractor.id,
                     "name": contractor.name,
@@ -403,8 +373,10 @@ class ContractorsAPIView(APIView):
                     "last_order_date": contractor.last_order_date.isoformat() if contractor.last_order_date else None
                 })
             
-            return Response(contractors_data)
+            return paginator.get_paginated_response(contractors_data)
             
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -458,7 +430,7 @@ class ContractorsAPIView(APIView):
 class AnalyticsAPIView(APIView):
     """
     Real analytics data from database
-    GET /api/v1/seller/analytics/
+    GET /api/v1/seller/analytics/?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month
     """
     permission_classes = [AllowAny]  # Temporarily allow any for testing
     
@@ -478,57 +450,53 @@ class AnalyticsAPIView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Период для анализа (последние 30 дней)
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=30)
-            
-            # Продажи по дням
-            daily_sales = []
-            current_date = start_date
-            while current_date <= end_date:
-                day_orders = Order.objects.filter(
-                    store=store,
-                    created_at__date=current_date,
-                    status__in=['delivered', 'processing', 'shipped']
+            # Период для анализа: ?from=&to=&granularity=, по умолчанию последние 30 дней по дням
+            try:
+                end_date = date.fromisoformat(request.query_params['to']) \
+                    if request.query_params.get('to') else timezone.now().date()
+                start_date = date.fromisoformat(request.query_params['from']) \
+                    if request.query_params.get('from') else end_date - timedelta(days=30)
+            except (ValueError, OverflowError):
+                return Response(
+                    {"detail": "Dates must be in YYYY-MM-DD format"}, 
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                
-                day_revenue = day_orders.aggregate(total=Sum('total_price'))['total'] or 0
-                day_count = day_orders.count()
-                
-                daily_sales.append({
-                    "date": current_date.isoformat(),
-                    "revenue": float(day_revenue),
-                    "orders_count": day_count
-                })
-                
-                current_date += timedelta(days=1)
-            
-            # Топ товары за период
-            top_products = OrderItem.objects.filter(
-                order__store=store,
-                order__created_at__date__gte=start_date
-            ).values(
-                'item__name', 'item__id'
-            ).annotate(
-                total_sold=Sum('amount'),
-                total_revenue=Sum('total_price')
-            ).order_by('-total_revenue')[:10]
-            
-            # Статистика по статусам заказов
-            order_status_stats = Order.objects.filter(
-                store=store,
-                created_at__date__gte=start_date
-            ).values('status').annotate(count=Count('id'))
+            
+            granularity = request.query_params.get('granularity', 'day')
+            if granularity not in GRANULARITIES:
+                return Response(
+                    {"detail": f"Invalid granularity. Valid options: {list(GRANULARITIES)}"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if start_date > end_date:
+                return Response(
+                    {"detail": "'from' must not be later than 'to'"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            max_days = MAX_SPAN_DAYS[granularity]
+            if (end_date - start_date).days >= max_days:
+                return Response(
+                    {"detail": f"Period for granularity '{granularity}' must not exceed {max_days} days"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Продажи по интервалам одним GROUP BY запросом
+            daily_sales = sales_timeseries(store, start_date, end_date, granularity)
+            
+            # Топ товары и статусы заказов за период по дневным сводкам
+            top_products = get_top_products(store, limit=10, start=start_date, end=end_date)
+            order_status_stats = status_distribution(store, start_date, end_date)
             
             analytics_data = {
                 "period": {
                     "start_date": start_date.isoformat(),
-                    "end_date": end_date.isoformat()
+                    "end_date": end_date.isoformat(),
+                    "granularity": granularity
                 },
                 "daily_sales": daily_sales,
                 "top_products": [
                     {
-                        "id": item['item__id'],
+                        "id": item['item_id'],
                         "name": item['item__name'],
                         "total_sold": item['total_sold'],
                         "total_revenue": float(item['total_revenue'])
@@ -0,0 +1,164 @@
+"""
+Резервирование остатков под заказы.
+
+При оформлении заказа строки Stock всех товаров корзины блокируются одним
+select_for_update в порядке (item_id, storage_id): параллельные оформления
+одного и того же товара выстраиваются в очередь на блокировке, а единый
+порядок исключает взаимоблокировки. Количество распределяется сначала со
+склада по умолчанию товара, затем с остальных складов, и списывается через
+StockLedger. Резервы неподтвержденных заказов истекают и снимаются командой
+release_expired_reservations.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from stores.ledger import InsufficientStock, StockLedger
+from stores.models import Stock
+from .models import Order, StockReservation
+from .rollups import record_order_status_change
+
+
+def reservation_ttl() -> timedelta:
+    return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 30))
+
+
+def reserve_orders(orders_with_items, now=None) -> list:
+    """
+    Резервирует товары для пар (заказ, позиции заказа) одной пачкой.
+
+    Бросает InsufficientStock, если какой-либо позиции не хватает: в этом
+    случае ничего не резервируется. Число запросов не зависит от числа позиций.
+    """
+    expires_at = (now or timezone.now()) + reservation_ttl()
+    item_ids = {line.item_id for _, lines in orders_with_items for line in lines}
+    if not item_ids:
+        return []
+
+    with transaction.atomic():
+        available = defaultdict(dict)
+        for item_id, storage_id, amount in Stock.objects.select_for_update().filter(
+            item_id__in=item_ids, amount__gt=0
+        ).order_by('item_id', 'storage_id').values_list('item_id', 'storage_id', 'amount'):
+            available[item_id][storage_id] = amount
+
+        reservations = []
+        deltas = defaultdict(int)
+        for order, lines in orders_with_items:
+            for line in lines:
+                storages = available[line.item_id]
+                default_storage_id = line.item.default_storage_id
+                # Сначала склад по умолчанию, затем остальные по порядку
+                candidates = sorted(storages, key=lambda storage_id: (storage_id != default_storage_id, storage_id))
+
+                remaining = line.amount
+                for storage_id in candidates:
+                    taken = min(storages[storage_id], remaining)
+                    if not taken:
+                        continue
+                    storages[storage_id] -= taken
+                    remaining -= taken
+                    deltas[(line.item_id, storage_id)] -= taken
+                    reservations.append(StockReservation(
+                        order=order, item_id=line.item_id, storage_id=storage_id,
+                        amount=taken, expires_at=expires_at
+                    ))
+                    if not remaining:
+                        break
+
+                if remaining:
+                    raise InsufficientStock(line.item_id, default_storage_id, line.amount)
+
+        StockLedger.apply_many(dict(deltas))
+        StockReservation.objects.bulk_create(reservations)
+
+    return reservations
+
+
+def release_reservations(order_ids) -> int:
+    """Возвращает на склады резервы заказов (в том числе подтвержденные). Возвращает число снятых резервов"""
+    with transaction.atomic():
+        reservations = list(StockReservation.objects.select_for_update().filter(
+            order_id__in=list(order_ids), status__in=('active', 'committed')
+        ).order_by('item_id', 'storage_id'))
+        if not reservations:
+            return 0
+
+        deltas = defaultdict(int)
+        for reservation in reservations:
+            deltas[(reservation.item_id, reservation.storage_id)] += reservation.amount
+        StockLedger.apply_many(dict(deltas))
+        StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(
+            status='released'
+        )
+    return len(reservations)
+
+
+def commit_reservations(order_ids) -> int:
+    """Закрепляет резервы подтвержденных заказов: они больше не истекают"""
+    return StockReservation.objects.filter(order_id__in=list(order_ids), status='active').update(status='committed')
+
+
+# Статусы, в которых товар заказа возвращен на склад
+RELEASED_STATUSES = ('cancelled', 'returned')
+
+
+def apply_order_status(order, old_status):
+    """
+    Приводит резервы заказа в соответствие со сменой статуса:
+    - отмена или возврат снимает резервы;
+    - выход из отмены или возврата резервирует товар заново (InsufficientStock,
+      если его уже нет), в рабочем статусе резерв сразу закрепляется;
+    - переход из 'pending' в рабочий статус закрепляет резервы.
+    """
+    if order.status == old_status:
+        return
+    if order.status in RELEASED_STATUSES:
+        if old_status not in RELEASED_STATUSES:
+            release_reservations([order.pk])
+        return
+    if old_status in RELEASED_STATUSES:
+        reserve_orders([(order, list(order.items.select_related('item')))])
+        if order.status != 'pending':
+            commit_reservations([order.pk])
+    elif old_status == 'pending':
+        commit_reservations([order.pk])
+
+
+def release_expired_reservations(now=None, batch_size=500) -> int:
+    """
+    Отменяет ожидающие заказы с истекшими резервами и возвращает товар на склады.
+    Возвращает число отмененных заказов.
+    """
+    now = now or timezone.now()
+    cancelled = 0
+    while True:
+        with transaction.atomic():
+            order_ids = list(StockReservation.objects.filter(
+                status='active', expires_at__lte=now
+            ).values_list('order_id', flat=True).distinct()[:batch_size])
+            if not order_ids:
+                return cancelled
+
+            orders = list(Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk'))
+            expired = []
+            released = []
+            working = []
+            for order in orders:
+                if order.status == 'pending':
+                    order.status = 'cancelled'
+                    order.save(update_fields=['status', 'updated_at'])
+                    record_order_status_change(order, 'pending')
+                    expired.append(order.pk)
+                elif order.status in RELEASED_STATUSES:
+                    released.append(order.pk)
+                else:
+                    working.append(order.pk)
+            # Статус заказов, измененный в обход apply_order_status, определяет судьбу резерва:
+            # отмененные и возвращенные отдают товар, рабочие сохраняют его
+            release_reservations(expired + released)
+            commit_reservations(working)
+            cancelled += len(expired)
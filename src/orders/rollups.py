@@ -0,0 +1,137 @@
+"""
+Инкрементальное ведение дневных сводок продаж (StoreDailySales, StoreItemDailySales).
+
+Сводки обновляются при создании заказа и смене его статуса, поэтому аналитика
+и дашборд читают десятки строк за период вместо всей истории заказов.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, StoreDailySales, StoreItemDailySales
+from .services import REVENUE_STATUSES
+
+STATUS_FIELDS = {status: f'{status}_count' for status, _ in Order.STATUS_CHOICES}
+
+
+def _apply_increments(model, lookup: dict, key_field: str, increments: dict):
+    """
+    Прибавляет дельты к строкам сводки, создавая недостающие строки.
+
+    increments: {значение key_field: {поле: дельта}}. Дельты применяются
+    через F(), поэтому параллельные заказы не затирают друг друга.
+    Количество запросов не зависит от числа строк.
+    """
+    if not increments:
+        return
+
+    model.objects.bulk_create(
+        [model(**lookup, **{key_field: key}) for key in increments],
+        ignore_conflicts=True
+    )
+    rows = list(model.objects.filter(**lookup, **{f'{key_field}__in': list(increments)}))
+    fields = {field for deltas in increments.values() for field in deltas}
+    for row in rows:
+        deltas = increments[getattr(row, key_field)]
+        for field in fields:
+            setattr(row, field, F(field) + deltas.get(field, 0))
+    model.objects.bulk_update(rows, fields)
+
+
+def order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def record_order_created(order, order_items):
+    """Учитывает новый заказ и его позиции в сводках за день создания заказа"""
+    if not order.store_id:
+        return
+
+    day = order_day(order)
+    deltas = {
+        'orders_count': 1,
+        'gross_revenue': order.total_price,
+        'units': sum(line.amount for line in order_items),
+    }
+    if order.status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[order.status]] = 1
+    if order.status in REVENUE_STATUSES:
+        deltas['revenue'] = order.total_price
+
+    item_deltas = defaultdict(lambda: {'units': 0, 'revenue': Decimal('0')})
+    for line in order_items:
+        item_deltas[line.item_id]['units'] += line.amount
+        item_deltas[line.item_id]['revenue'] += line.total_price
+
+    with transaction.atomic():
+        _apply_increments(StoreDailySales, {'store_id': order.store_id}, 'day', {day: deltas})
+        _apply_increments(
+            StoreItemDailySales, {'store_id': order.store_id, 'day': day}, 'item_id', dict(item_deltas)
+        )
+
+
+def record_order_status_change(order, old_status):
+    """Переносит заказ между счетчиками статусов и корректирует выручку дня"""
+    new_status = order.status
+    if not order.store_id or old_status == new_status:
+        return
+
+    deltas = {}
+    if old_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[old_status]] = -1
+    if new_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[new_status]] = 1
+
+    was_revenue = old_status in REVENUE_STATUSES
+    is_revenue = new_status in REVENUE_STATUSES
+    if was_revenue and not is_revenue:
+        deltas['revenue'] = -order.total_price
+    elif is_revenue and not was_revenue:
+        deltas['revenue'] = order.total_price
+
+    _apply_increments(StoreDailySales, {'store_id': order.store_id}, 'day', {order_day(order): deltas})
+
+
+def rebuild_store_rollups(store):
+    """Полностью пересчитывает сводки магазина по истории заказов"""
+    orders = Order.objects.filter(store=store)
+    order_lines = OrderItem.objects.filter(order__store=store)
+
+    status_counts = {
+        field: Count('id', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()
+    }
+    daily = orders.annotate(day=TruncDate('created_at')).values('day').annotate(
+        orders_count=Count('id'),
+        gross_revenue=Sum('total_price'),
+        revenue=Sum('total_price', filter=Q(status__in=REVENUE_STATUSES)),
+        **status_counts
+    ).order_by('day')
+    units = dict(
+        order_lines.annotate(day=TruncDate('order__created_at')).values('day').annotate(
+            units=Sum('amount')
+        ).order_by('day').values_list('day', 'units')
+    )
+    items_daily = order_lines.annotate(day=TruncDate('order__created_at')).values('day', 'item_id').annotate(
+        units=Sum('amount'),
+        revenue=Sum('total_price')
+    ).order_by('day', 'item_id')
+
+    with transaction.atomic():
+        StoreDailySales.objects.filter(store=store).delete()
+        StoreItemDailySales.objects.filter(store=store).delete()
+
+        StoreDailySales.objects.bulk_create([
+            StoreDailySales(
+                store=store,
+                units=units.get(row['day']) or 0,
+                **{**row, 'revenue': row['revenue'] or 0}
+            )
+            for row in daily
+        ], batch_size=1000)
+        StoreItemDailySales.objects.bulk_create([
+            StoreItemDailySales(store=store, **row) for row in items_daily
+        ], batch_size=1000)
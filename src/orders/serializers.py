@@ -1,9 +1,10 @@
-from django.db.models import Sum
+from django.db.models import Prefetch
 
 from rest_framework import serializers
 
 from .models import Cart, CartItem, Order, OrderItem
 from stores.models import *
+from stores.thumbnails import thumbnail_fields
 
 
 class UomSerializer(serializers.ModelSerializer):
@@ -18,22 +19,44 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
         fields = ['name', 'icon']
 
 
+def payment_methods_prefetch(lookup='storepaymentmethod_set'):
+    """Способы оплаты магазина вместе с самими методами - для StoreSerializer"""
+    return Prefetch(lookup, queryset=StorePaymentMethod.objects.select_related('payment_method').order_by('id'))
+
+
 class StoreSerializer(serializers.ModelSerializer):
     payment_methods = serializers.SerializerMethodField('get_payment_methods')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related(payment_methods_prefetch())
+
     def get_payment_methods(self, obj):
-        q = StorePaymentMethod.objects.filter(store_id=obj.id).values('payment_method')
-        res = PaymentMethod.objects.filter(pk__in=q)
-        return PaymentMethodSerializer(res, many=True, context=self.context).data
+        # Читает prefetch из setup_eager_loading; без него - один запрос на магазин
+        methods = {}
+        for store_method in obj.storepaymentmethod_set.all():
+            methods.setdefault(store_method.payment_method_id, store_method.payment_method)
+        return PaymentMethodSerializer(list(methods.values()), many=True, context=self.context).data
 
     class Meta:
         model = Store
         fields = "__all__"
 
 
+def _thumbnail_fields(field, context, prefix):
+    # Абсолютные URL вариантов, как у ImageField(use_url=True) при наличии request
+    request = context.get('request')
+    return thumbnail_fields(field, prefix, build_url=request.build_absolute_uri if request else None)
+
+
 class ItemImageSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(use_url=True)
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(_thumbnail_fields(instance.image, self.context, 'image'))
+        return data
+
     class Meta:
         model = ItemImage
         fields = ('description', 'image')
@@ -45,17 +68,25 @@ class ItemSerializer(serializers.ModelSerializer):
     preview = serializers.ImageField(use_url=True)
     images = serializers.SerializerMethodField('get_images')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('uom').prefetch_related('itemimage_set')
+
     def get_amount(self, obj):
-        res = Stock.objects.filter(item_id=obj.id).aggregate(Sum("amount"))
-        return res
+        # Формат прежнего aggregate(Sum("amount")); сумма остатков хранится в товаре
+        return {"amount__sum": obj.total_stock}
 
     def get_images(self, obj):
-        res = ItemImage.objects.filter(item__id=obj.id)
-        return ItemImageSerializer(res, many=True, context=self.context).data
+        return ItemImageSerializer(obj.itemimage_set.all(), many=True, context=self.context).data
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(_thumbnail_fields(instance.preview, self.context, 'preview'))
+        return data
 
     class Meta:
         model = Item
-        fields = '__all__'
+        exclude = ('search_vector',)
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -65,6 +96,10 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ('item', 'amount')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('item__uom').prefetch_related('item__itemimage_set')
+
 
 class SelfPickupPointSerializer(serializers.ModelSerializer):
     class Meta:
@@ -89,7 +124,14 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    order_items = OrderItemSerializer(many=True, source='orderitem_set')
+    order_items = OrderItemSerializer(many=True, source='items')
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related(Prefetch(
+            'items',
+            queryset=OrderItem.objects.select_related('item__uom').prefetch_related('item__itemimage_set')
+        ))
 
     class Meta:
         model = Order
@@ -114,6 +156,12 @@ class StorageSerializer(serializers.ModelSerializer):
 class StockSerializer(serializers.ModelSerializer):
     storage = StorageSerializer()
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('storage__city', 'storage__store').prefetch_related(
+            payment_methods_prefetch('storage__store__storepaymentmethod_set')
+        )
+
     class Meta:
         model = Stock
         fields = "__all__"
@@ -0,0 +1,150 @@
+from decimal import Decimal
+
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from stores.models import Item, ItemImage
+from stores.thumbnails import thumbnail_fields
+from .models import CartItem, Order, StoreDailySales, StoreItemDailySales
+
+# Статусы заказа, которые учитываются в выручке
+REVENUE_STATUSES = ('delivered', 'processing', 'shipped')
+
+
+def get_store_order_stats(store, today=None) -> dict:
+    """
+    Все счетчики и суммы заказов магазина за один проход условной агрегации.
+
+    Читает дневные сводки StoreDailySales, поэтому стоимость не растет с историей заказов.
+    gross_revenue считает все заказы, revenue - только заказы в REVENUE_STATUSES.
+    """
+    today = today or timezone.localdate()
+    is_today = Q(day=today)
+
+    stats = StoreDailySales.objects.filter(store=store).aggregate(
+        total_orders=Sum('orders_count'),
+        pending_orders=Sum('pending_count'),
+        completed_orders=Sum('delivered_count'),
+        today_orders=Sum('orders_count', filter=is_today),
+        total_gross_revenue=Sum('gross_revenue'),
+        today_gross_revenue=Sum('gross_revenue', filter=is_today),
+        total_revenue=Sum('revenue'),
+        today_revenue=Sum('revenue', filter=is_today),
+    )
+    # Псевдонимы агрегатов не могут совпадать с именами полей модели
+    stats['gross_revenue'] = stats.pop('total_gross_revenue')
+    stats['revenue'] = stats.pop('total_revenue')
+    for key in ('total_orders', 'pending_orders', 'completed_orders', 'today_orders'):
+        stats[key] = stats[key] or 0
+    for key in ('gross_revenue', 'today_gross_revenue', 'revenue', 'today_revenue'):
+        stats[key] = stats[key] or Decimal('0.00')
+    return stats
+
+
+def get_top_products(store, limit, start=None, end=None, ordering='-total_revenue') -> list:
+    """Самые продаваемые товары магазина по дневным сводкам (total_sold, total_revenue)"""
+    rows = StoreItemDailySales.objects.filter(store=store)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    return list(
+        rows.values('item_id', 'item__name').annotate(
+            total_sold=Sum('units'),
+            total_revenue=Sum('revenue')
+        ).order_by(ordering, 'item_id')[:limit]
+    )
+
+
+def get_store_product_stats(store) -> dict:
+    """Количество всех и активных товаров магазина одним запросом"""
+    return Item.objects.filter(store=store).aggregate(
+        total_products=Count('id'),
+        active_products=Count('id', filter=Q(status=True)),
+    )
+
+
+def _order_activity_message(order, with_customer) -> str:
+    if with_customer:
+        return f"Заказ #{order.order_number} от {order.user.first_name} {order.user.last_name}"
+    return f"Новый заказ #{order.order_number}"
+
+
+def get_recent_order_activity(store, limit=3, with_customer=True) -> list:
+    """
+    Лента последних заказов магазина, покупатель подгружается тем же запросом.
+    with_customer=False - сообщение без имени покупателя ("Новый заказ #N")
+    """
+    recent_orders = Order.objects.filter(store=store).select_related('user').order_by('-created_at')[:limit]
+    return [
+        {
+            "type": "order",
+            "message": _order_activity_message(order, with_customer),
+            "timestamp": order.created_at.isoformat()
+        }
+        for order in recent_orders
+    ]
+
+
+def get_cart_summary(user) -> dict:
+    """
+    Корзина пользователя одним запросом: строки с товаром, магазином, единицей
+    измерения, остатком (Item.total_stock) и первым изображением товара, а также
+    итоги по каждому магазину и по всей корзине.
+    """
+    primary_image = ItemImage.objects.filter(item=OuterRef('item_id')).order_by('id').values('image')[:1]
+    lines = CartItem.objects.filter(cart__user=user).select_related(
+        'item__store', 'item__uom'
+    ).annotate(primary_image=Subquery(primary_image)).order_by('id')
+    if not user.is_authenticated:
+        lines = lines.none()
+
+    image_storage = ItemImage._meta.get_field('image').storage
+    items = []
+    stores = {}
+    for line in lines:
+        item = line.item
+        line_total = item.default_price * line.amount
+        items.append({
+            "id": line.id,
+            "amount": line.amount,
+            "total_price": float(line_total),
+            "item": {
+                "id": item.id,
+                "name": item.name,
+                "preview": item.preview.url if item.preview else None,
+                **thumbnail_fields(item.preview),
+                "image": image_storage.url(line.primary_image) if line.primary_image else None,
+                "price": float(item.default_price),
+                "stock": item.total_stock,
+                "store": {
+                    "id": item.store.id,
+                    "name": item.store.name
+                },
+                "uom": {
+                    "name": item.uom.name if item.uom else "шт"
+                }
+            }
+        })
+
+        totals = stores.setdefault(item.store_id, {
+            "store": {"id": item.store.id, "name": item.store.name},
+            "items_count": 0,
+            "total_amount": 0,
+            "total_price": Decimal('0')
+        })
+        totals["items_count"] += 1
+        totals["total_amount"] += line.amount
+        totals["total_price"] += line_total
+
+    store_totals = list(stores.values())
+    total_price = sum((totals["total_price"] for totals in store_totals), Decimal('0'))
+    for totals in store_totals:
+        totals["total_price"] = float(totals["total_price"])
+
+    return {
+        "items": items,
+        "stores": store_totals,
+        "total_amount": sum(totals["total_amount"] for totals in store_totals),
+        "total_price": float(total_price)
+    }
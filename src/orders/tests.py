@@ -1,3 +1,863 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+from datetime import date, timedelta
+from importlib import import_module
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+import stores.tests
+from core.pagination import KeysetPagination
+from jobs.models import Job
+from jobs.queue import run_pending
+from stores.models import (
+    Enter, Group, InventoryCheck, InventoryCheckNotReady, Item, ItemImage, PaymentMethod, Stock, Storage, Store,
+    StorePaymentMethod, Uom, WriteOff
+)
+from users.models import CustomUser
+from .models import Cart, CartItem, IdempotencyKey, Order, OrderItem, StockReservation, StoreDailySales, StoreItemDailySales
+from .real_api_views import AnalyticsAPIView, RealProductsListAPIView
+from .views import CartAPIView
+from .reservations import release_expired_reservations
+from .rollups import rebuild_store_rollups, record_order_created
+from .services import get_recent_order_activity, get_store_order_stats
+from .timeseries import sales_timeseries
+
+
+class StoreFixtureMixin(stores.tests.StoreFixtureMixin):
+    """Фикстура магазина с созданием заказов, учтенных в сводках продаж"""
+
+    @classmethod
+    def create_orders(cls, count, status='pending', total=Decimal('100.00')):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(user=cls.customer, store=cls.store, status=status, total_price=total)
+            record_order_created(order, [])
+            orders.append(order)
+        return orders
+
+
+
+class DashboardStatsTests(StoreFixtureMixin, TestCase):
+
+    def test_order_stats_single_query(self):
+        self.create_orders(3, status='pending')
+        self.create_orders(2, status='delivered', total=Decimal('50.00'))
+        self.create_orders(1, status='cancelled')
+
+        with self.assertNumQueries(1):
+            stats = get_store_order_stats(self.store)
+
+        self.assertEqual(stats['total_orders'], 6)
+        self.assertEqual(stats['pending_orders'], 3)
+        self.assertEqual(stats['completed_orders'], 2)
+        self.assertEqual(stats['today_orders'], 6)
+        self.assertEqual(stats['gross_revenue'], Decimal('500.00'))
+        self.assertEqual(stats['revenue'], Decimal('100.00'))
+
+    def test_recent_activity_single_query(self):
+        self.create_orders(5)
+        with self.assertNumQueries(1):
+            activity = get_recent_order_activity(self.store, limit=3)
+        self.assertEqual(len(activity), 3)
+        self.assertTrue(activity[0]['message'].startswith('Заказ #'))
+        plain = get_recent_order_activity(self.store, limit=1, with_customer=False)
+        self.assertRegex(plain[0]['message'], r'^Новый заказ #\S+$')
+
+    def test_dashboard_query_count_independent_of_orders(self):
+        client = self.seller_client()
+        self.create_orders(2)
+        with CaptureQueriesContext(connection) as few:
+            response = client.get('/api/v1/dashboard/stats/')
+        self.assertEqual(response.status_code, 200)
+
+        self.create_orders(20)
+        with CaptureQueriesContext(connection) as many:
+            response = client.get('/api/v1/dashboard/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totalOrders'], 22)
+        self.assertEqual(len(few), len(many))
+
+
+class SalesTimeseriesTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        for days_ago, total in ((0, '10.00'), (0, '5.00'), (3, '7.00'), (40, '100.00')):
+            order = self.create_orders(1, status='delivered', total=Decimal(total))[0]
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        # Отмененные заказы не попадают в выручку
+        self.create_orders(1, status='cancelled')
+        rebuild_store_rollups(self.store)
+
+    def test_daily_series_is_one_query_with_filled_gaps(self):
+        start = self.today - timedelta(days=89)
+        with self.assertNumQueries(1):
+            series = sales_timeseries(self.store, start, self.today)
+
+        self.assertEqual(len(series), 90)
+        self.assertEqual(series[-1], {"date": self.today.isoformat(), "revenue": 15.0, "orders_count": 2})
+        self.assertEqual(series[-4]["orders_count"], 1)
+        self.assertEqual(series[-2], {"date": (self.today - timedelta(days=1)).isoformat(), "revenue": 0.0, "orders_count": 0})
+        self.assertEqual(sum(point["orders_count"] for point in series), 4)
+
+    def test_monthly_buckets_start_on_first_day(self):
+        series = sales_timeseries(self.store, date(2024, 11, 15), date(2025, 2, 3), granularity='month')
+        self.assertEqual([point["date"] for point in series], ['2024-11-01', '2024-12-01', '2025-01-01', '2025-02-01'])
+
+    def test_weekly_buckets_start_on_monday(self):
+        series = sales_timeseries(self.store, date(2025, 1, 1), date(2025, 1, 14), granularity='week')
+        self.assertEqual([point["date"] for point in series], ['2024-12-30', '2025-01-06', '2025-01-13'])
+
+    def test_analytics_view_window_params(self):
+        view = AnalyticsAPIView.as_view()
+        start = (self.today - timedelta(days=364)).isoformat()
+        request = APIRequestFactory().get('/api/v1/seller/analytics/', {
+            'from': start, 'to': self.today.isoformat(), 'granularity': 'week'
+        })
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['period']['granularity'], 'week')
+        self.assertEqual(response.data['summary']['total_orders'], 4)
+
+        bad = APIRequestFactory().get('/api/v1/seller/analytics/', {'granularity': 'hour'})
+        self.assertEqual(view(bad).status_code, 400)
+
+    def test_analytics_view_limits_window(self):
+        view = AnalyticsAPIView.as_view()
+
+        def fetch(start, end, granularity):
+            request = APIRequestFactory().get('/api/v1/seller/analytics/', {
+                'from': start, 'to': end, 'granularity': granularity
+            })
+            return view(request).status_code
+
+        self.assertEqual(fetch('0001-01-01', '9999-12-30', 'day'), 400)
+        self.assertEqual(fetch('2024-01-01', '2024-12-31', 'day'), 200)
+        self.assertEqual(fetch('2024-01-01', '2025-01-01', 'day'), 400)
+        self.assertEqual(fetch('2020-01-01', '2024-12-31', 'month'), 200)
+        self.assertEqual(fetch('2019-01-01', '2024-12-31', 'week'), 400)
+        # Последний интервал упирается в date.max
+        self.assertEqual(fetch('9999-11-15', '9999-12-31', 'month'), 200)
+        self.assertEqual(fetch('9999-12-01', '9999-12-31', 'week'), 200)
+        self.assertEqual(fetch('0001-01-01', '0001-01-02', 'week'), 200)
+
+
+class SalesRollupTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=100)
+
+    def checkout(self, amount):
+        cart, _ = Cart.objects.get_or_create(user=self.customer)
+        CartItem.objects.create(cart=cart, item=self.item, amount=amount)
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.post('/api/v1/orders/create/', {'store_id': self.store.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def rollup_snapshot(self):
+        daily = list(StoreDailySales.objects.filter(store=self.store).order_by('day').values(
+            'day', 'orders_count', 'units', 'gross_revenue', 'revenue', 'pending_count', 'delivered_count',
+            'cancelled_count'
+        ))
+        items = list(StoreItemDailySales.objects.filter(store=self.store).order_by('day', 'item_id').values(
+            'day', 'item_id', 'units', 'revenue'
+        ))
+        return daily, items
+
+    def test_incremental_rollups_match_rebuild(self):
+        first = self.checkout(2)
+        self.checkout(3)
+
+        client = self.seller_client()
+        response = client.put(f'/api/v1/orders/{first.id}/status/', {'status': 'delivered'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        day = StoreDailySales.objects.get(store=self.store)
+        self.assertEqual(day.orders_count, 2)
+        self.assertEqual(day.units, 5)
+        self.assertEqual(day.gross_revenue, Decimal('500.00'))
+        self.assertEqual(day.revenue, Decimal('200.00'))
+        self.assertEqual((day.pending_count, day.delivered_count), (1, 1))
+
+        incremental = self.rollup_snapshot()
+        call_command('rebuild_sales_rollups', store_ids=[self.store.id], stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.rollup_snapshot(), incremental)
+
+    def test_backfill_migration_matches_rebuild(self):
+        order = self.checkout(2)
+        self.checkout(1)
+        self.seller_client().put(f'/api/v1/orders/{order.id}/status/', {'status': 'delivered'}, format='json')
+        incremental = self.rollup_snapshot()
+
+        StoreDailySales.objects.all().delete()
+        StoreItemDailySales.objects.all().delete()
+        migration = import_module('orders.migrations.0008_backfill_sales_rollups')
+        migration.fill_sales_rollups(django_apps, None)
+        self.assertEqual(self.rollup_snapshot(), incremental)
+
+    def test_backfill_migration_skips_orders_without_store(self):
+        self.checkout(1)
+        incremental = self.rollup_snapshot()
+        orphan = Order.objects.create(user=self.customer, total_price=Decimal('50.00'))
+        OrderItem.objects.create(order=orphan, item=self.item, amount=1, price_per_item=Decimal('50.00'))
+
+        migration = import_module('orders.migrations.0008_backfill_sales_rollups')
+        migration.fill_sales_rollups(django_apps, None)
+        self.assertEqual(self.rollup_snapshot(), incremental)
+        self.assertEqual(StoreDailySales.objects.count(), 1)
+
+    def test_leaving_revenue_status_removes_revenue(self):
+        order = self.checkout(1)
+        client = self.seller_client()
+        client.put(f'/api/v1/orders/{order.id}/status/', {'status': 'shipped'}, format='json')
+        client.put(f'/api/v1/orders/{order.id}/status/', {'status': 'returned'}, format='json')
+
+        day = StoreDailySales.objects.get(store=self.store)
+        self.assertEqual(day.revenue, Decimal('0.00'))
+        self.assertEqual((day.pending_count, day.shipped_count, day.returned_count), (0, 0, 1))
+
+
+
+class CheckoutTests(StoreFixtureMixin, TestCase):
+
+    def fill_cart(self, lines):
+        cart, _ = Cart.objects.get_or_create(user=self.customer)
+        for index in range(lines):
+            item = self.create_item(f'Позиция {index}', price=Decimal('10.00') + index)
+            Enter.objects.create(item=item, storage=self.storage, amount=2)
+            CartItem.objects.create(cart=cart, item=item, amount=2)
+
+    def checkout(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/v1/orders/create/', {'store_id': self.store.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id']), len(queries)
+
+    def test_checkout_queries_do_not_grow_with_cart(self):
+        self.fill_cart(3)
+        small_order, small = self.checkout()
+        self.fill_cart(30)
+        large_order, large = self.checkout()
+
+        self.assertEqual(small, large)
+        self.assertEqual(large_order.items.count(), 30)
+        # 2 * (10 + 11 + ... + 39)
+        self.assertEqual(large_order.total_price, Decimal('1470.00'))
+        self.assertTrue(large_order.order_number.startswith('ORD-'))
+        self.assertFalse(CartItem.objects.filter(cart__user=self.customer).exists())
+        self.assertEqual(StoreDailySales.objects.get(store=self.store).units, 66)
+
+
+
+class StockReservationTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.second = Storage.objects.create(name='Второй склад', city=self.city, store=self.store)
+        Enter.objects.create(item=self.item, storage=self.second, amount=5)
+        Enter.objects.create(item=self.item, storage=self.storage, amount=3)
+
+    def checkout(self, amount):
+        cart, _ = Cart.objects.get_or_create(user=self.customer)
+        CartItem.objects.create(cart=cart, item=self.item, amount=amount)
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        return client.post('/api/v1/orders/create/', {'store_id': self.store.id}, format='json')
+
+    def stock(self):
+        return dict(Stock.objects.filter(item=self.item).values_list('storage_id', 'amount'))
+
+    def test_default_storage_is_allocated_first(self):
+        response = self.checkout(4)
+        self.assertEqual(response.status_code, 201)
+
+        reservations = StockReservation.objects.filter(order_id=response.data['order_id']).order_by('storage_id')
+        self.assertEqual(
+            [(r.storage_id, r.amount, r.status) for r in reservations],
+            [(self.storage.id, 3, 'active'), (self.second.id, 1, 'active')]
+        )
+        self.assertEqual(self.stock(), {self.storage.id: 0, self.second.id: 4})
+        self.assertEqual(Item.objects.get(pk=self.item.pk).total_stock, 4)
+
+    def test_oversell_is_rejected(self):
+        response = self.checkout(9)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['item_id'], self.item.id)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), {self.storage.id: 3, self.second.id: 5})
+        self.assertTrue(CartItem.objects.filter(cart__user=self.customer).exists())
+
+    def test_cancel_releases_and_confirm_commits(self):
+        first = self.checkout(2).data['order_id']
+        second = self.checkout(2).data['order_id']
+        client = self.seller_client()
+
+        client.put(f'/api/v1/orders/{first}/status/', {'status': 'confirmed'}, format='json')
+        self.assertEqual(set(StockReservation.objects.filter(order_id=first).values_list('status', flat=True)),
+                         {'committed'})
+
+        client.put(f'/api/v1/orders/{second}/status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(set(StockReservation.objects.filter(order_id=second).values_list('status', flat=True)),
+                         {'released'})
+        self.assertEqual(sum(self.stock().values()), 6)
+
+    def test_sweeper_cancels_expired_pending_orders(self):
+        expired = self.checkout(2).data['order_id']
+        confirmed = self.checkout(1).data['order_id']
+        self.seller_client().put(f'/api/v1/orders/{confirmed}/status/', {'status': 'confirmed'}, format='json')
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        call_command('release_expired_reservations', stdout=StringIO())
+
+        self.assertEqual(Order.objects.get(pk=expired).status, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=confirmed).status, 'confirmed')
+        self.assertEqual(sum(self.stock().values()), 7)
+        self.assertEqual(StoreDailySales.objects.get(store=self.store).cancelled_count, 1)
+
+    def reservation_statuses(self, order_id):
+        return set(StockReservation.objects.filter(order_id=order_id).values_list('status', flat=True))
+
+    def test_return_releases_and_reopening_reserves_again(self):
+        order_id = self.checkout(2).data['order_id']
+        client = self.seller_client()
+        url = f'/api/v1/orders/{order_id}/status/'
+
+        client.put(url, {'status': 'delivered'}, format='json')
+        client.put(url, {'status': 'returned'}, format='json')
+        self.assertEqual(self.reservation_statuses(order_id), {'released'})
+        self.assertEqual(sum(self.stock().values()), 8)
+
+        response = client.put(url, {'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('committed', self.reservation_statuses(order_id))
+        self.assertEqual(sum(self.stock().values()), 6)
+
+        client.put(url, {'status': 'cancelled'}, format='json')
+        self.assertEqual(sum(self.stock().values()), 8)
+        WriteOff.objects.create(item=self.item, storage=self.second, amount=5)
+        WriteOff.objects.create(item=self.item, storage=self.storage, amount=2)
+        response = client.put(url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(pk=order_id).status, 'cancelled')
+
+    def test_sweeper_releases_orders_cancelled_without_signal(self):
+        cancelled = self.checkout(2).data['order_id']
+        shipped = self.checkout(1).data['order_id']
+        Order.objects.filter(pk=cancelled).update(status='cancelled')
+        Order.objects.filter(pk=shipped).update(status='shipped')
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        release_expired_reservations()
+
+        self.assertEqual(self.reservation_statuses(cancelled), {'released'})
+        self.assertEqual(self.reservation_statuses(shipped), {'committed'})
+        self.assertEqual(sum(self.stock().values()), 7)
+
+
+
+class CheckoutAllTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        other_owner = CustomUser.objects.create_user(username='seller2', password='pass', email='s2@example.com')
+        self.other_store = Store.objects.get(owner=other_owner)
+        other_storage = Storage.objects.create(name='Склад 2', city=self.city, store=self.other_store)
+        self.other_item = Item.objects.create(
+            store=self.other_store, name='Товар 2', default_price=Decimal('30.00'), default_storage=other_storage
+        )
+        Enter.objects.create(item=self.item, storage=self.storage, amount=10)
+        Enter.objects.create(item=self.other_item, storage=other_storage, amount=1)
+
+        cart = Cart.objects.create(user=self.customer)
+        CartItem.objects.create(cart=cart, item=self.item, amount=2)
+        self.other_line = CartItem.objects.create(cart=cart, item=self.other_item, amount=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_cart_split_into_store_orders(self):
+        response = self.client.post('/api/v1/orders/checkout-all/', {'comment': 'Позвонить'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        orders = {order['store_id']: order for order in response.data['orders']}
+        self.assertEqual(set(orders), {self.store.id, self.other_store.id})
+        self.assertEqual(orders[self.store.id]['total_price'], 200.0)
+        self.assertEqual(orders[self.other_store.id]['total_price'], 30.0)
+        self.assertEqual(response.data['total_price'], 230.0)
+
+        for store_id, data in orders.items():
+            order = Order.objects.get(order_number=data['order_number'])
+            self.assertEqual((order.store_id, order.comment), (store_id, 'Позвонить'))
+            self.assertEqual(order.items.count(), 1)
+            self.assertEqual(order.reservations.count(), 1)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.customer).exists())
+        self.assertEqual(StoreDailySales.objects.get(store=self.other_store).orders_count, 1)
+
+    def test_shortage_in_one_store_creates_nothing(self):
+        self.other_line.amount = 2
+        self.other_line.save()
+
+        response = self.client.post('/api/v1/orders/checkout-all/', {}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Stock.objects.get(item=self.item).amount, 10)
+        self.assertEqual(CartItem.objects.filter(cart__user=self.customer).count(), 2)
+
+
+
+class IdempotencyTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Enter.objects.create(item=self.item, storage=self.storage, amount=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def add_to_cart(self, key, amount=2):
+        return self.client.post(
+            '/api/v1/cart/add/', {'item_id': self.item.id, 'amount': amount}, format='json',
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retried_cart_add_is_replayed(self):
+        first = self.add_to_cart('cart-1')
+        with self.assertNumQueries(0):
+            retry = self.add_to_cart('cart-1')
+
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(CartItem.objects.get(cart__user=self.customer).amount, 2)
+
+        self.add_to_cart('cart-2')
+        self.assertEqual(CartItem.objects.get(cart__user=self.customer).amount, 4)
+
+    def test_retried_order_creates_one_order(self):
+        self.add_to_cart('cart-1')
+        responses = []
+        for _ in range(2):
+            responses.append(self.client.post(
+                '/api/v1/orders/create/', {'store_id': self.store.id}, format='json', HTTP_IDEMPOTENCY_KEY='order-1'
+            ))
+            # Повтор после потери кеша берет ответ из таблицы
+            cache.clear()
+
+        self.assertEqual(responses[0].status_code, 201)
+        self.assertEqual(responses[1].data['order_number'], responses[0].data['order_number'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reuse_with_other_body_is_rejected(self):
+        self.add_to_cart('cart-1', amount=1)
+        response = self.add_to_cart('cart-1', amount=5)
+        self.assertEqual(response.status_code, 422)
+
+    def test_stale_in_progress_key_is_reclaimed(self):
+        first = self.add_to_cart('cart-1')
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+        cache.clear()
+        self.assertEqual(self.add_to_cart('cart-1').status_code, 409)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.add_to_cart('cart-1')
+        self.assertEqual(response.status_code, first.status_code)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertIsNotNone(IdempotencyKey.objects.get().status_code)
+
+    def test_anonymous_key_is_rejected(self):
+        response = APIClient().post(
+            '/api/v1/cart/add/', {'item_id': self.item.id, 'amount': 1}, format='json', HTTP_IDEMPOTENCY_KEY='k'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_expired_keys_are_purged(self):
+        self.add_to_cart('cart-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+
+class CartSummaryTests(StoreFixtureMixin, TestCase):
+
+    def test_cart_read_is_single_query(self):
+        other_owner = CustomUser.objects.create_user(username='seller2', password='pass', email='s2@example.com')
+        other_store = Store.objects.get(owner=other_owner)
+        other_storage = Storage.objects.create(name='Склад 2', city=self.city, store=other_store)
+        other_item = Item.objects.create(
+            store=other_store, name='Товар 2', default_price=Decimal('30.00'), default_storage=other_storage
+        )
+        Enter.objects.create(item=self.item, storage=self.storage, amount=4)
+        ItemImage.objects.create(item=self.item, image='images/first.png', description='')
+        ItemImage.objects.create(item=self.item, image='images/second.png', description='')
+
+        cart = Cart.objects.create(user=self.customer)
+        CartItem.objects.create(cart=cart, item=self.item, amount=2)
+        CartItem.objects.create(cart=cart, item=other_item, amount=3)
+
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/carts/')
+
+        first, second = response.data['items']
+        self.assertEqual(first['item']['stock'], 4)
+        self.assertTrue(first['item']['image'].endswith('images/first.png'))
+        self.assertIsNone(second['item']['image'])
+        self.assertEqual(
+            [(totals['store']['id'], totals['total_amount'], totals['total_price'])
+             for totals in response.data['stores']],
+            [(self.store.id, 2, 200.0), (other_store.id, 3, 90.0)]
+        )
+        self.assertEqual(response.data['total_price'], 290.0)
+
+
+
+    def test_legacy_cart_view_keeps_serializer_shape(self):
+        Item.objects.filter(pk=self.item.pk).update(preview='images/legacy.png')
+        request = APIRequestFactory().get('/cart/')
+        force_authenticate(request, self.customer)
+        response = CartAPIView.as_view()(request)
+        self.assertEqual(response.data, {"items": []})
+        self.assertTrue(Cart.objects.filter(user=self.customer).exists())
+
+        CartItem.objects.create(cart=Cart.objects.get(user=self.customer), item=self.item, amount=2)
+        request = APIRequestFactory().get('/cart/')
+        force_authenticate(request, self.customer)
+        with self.assertNumQueries(2):
+            response = CartAPIView.as_view()(request)
+        line, = response.data['items']
+        self.assertEqual((line['amount'], line['item']['id']), (2, self.item.id))
+        self.assertEqual(line['item']['amount'], {"amount__sum": 0})
+        self.assertTrue(line['item']['preview'].startswith('http://testserver/'))
+
+
+class SerializerQueryCountTests(StoreFixtureMixin, TestCase):
+    """Публичные эндпоинты на сериализаторах не делают запросов на каждый объект"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.uom = Uom.objects.create(name='шт')
+
+    def add_items(self, count):
+        for index in range(count):
+            item = self.create_item(f'Товар {index}', uom=self.uom)
+            Enter.objects.create(item=item, storage=self.storage, amount=index + 1)
+            ItemImage.objects.create(item=item, image=f'images/{index}.png', description='')
+
+    def add_stores(self, count):
+        method, created = PaymentMethod.objects.get_or_create(
+            name='Карта', defaults={'icon': 'images/card.png', 'description': ''}
+        )
+        if created:
+            StorePaymentMethod.objects.create(store=self.store, payment_method=method)
+        for index in range(count):
+            owner = CustomUser.objects.create_user(username=f'owner{index}{Store.objects.count()}', password='pass')
+            StorePaymentMethod.objects.create(store=Store.objects.get(owner=owner), payment_method=method)
+
+    def assertConstantQueries(self, path, grow):
+        grow(1)
+        caches['catalog'].clear()
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        grow(5)
+        caches['catalog'].clear()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(small), len(large))
+        return response
+
+    def test_store_items(self):
+        response = self.assertConstantQueries(f'/api/v1/stores/{self.store.id}/items/', self.add_items)
+        by_name = {item['name']: item for item in response.data}
+        self.assertEqual(by_name['Товар 0']['amount'], {'amount__sum': 1})
+        self.assertEqual(len(by_name['Товар 0']['images']), 1)
+
+    def test_user_orders(self):
+        def grow(count):
+            self.add_items(count)
+            for order in self.create_orders(count):
+                for item in Item.objects.filter(store=self.store)[:3]:
+                    OrderItem.objects.create(order=order, item=item, amount=1)
+
+        response = self.assertConstantQueries('/api/v1/users/orders/', grow)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(len(response.data[0]['order_items']), 3)
+
+    def test_stores(self):
+        response = self.assertConstantQueries('/api/v1/stores/', self.add_stores)
+        store = next(store for store in response.data if store['id'] == self.store.id)
+        self.assertEqual([method['name'] for method in store['payment_methods']], ['Карта'])
+
+    def test_item_stock(self):
+        def grow(count):
+            for index in range(count):
+                storage = Storage.objects.create(name=f'Склад {Storage.objects.count()}', city=self.city, store=self.store)
+                Enter.objects.create(item=self.item, storage=storage, amount=1)
+
+        response = self.assertConstantQueries(f'/api/v1/stock/{self.item.id}/', grow)
+        self.assertEqual(len(response.data['stocks']), 6)
+
+
+class SellerOrdersListTests(StoreFixtureMixin, TestCase):
+
+    def create_order_with_items(self, lines=2, status='pending'):
+        order = self.create_orders(1, status=status)[0]
+        for _ in range(lines):
+            OrderItem.objects.create(order=order, item=self.item, amount=1, price_per_item=Decimal('100.00'))
+        return order
+
+    def test_cursor_walks_all_orders_once(self):
+        created = [self.create_order_with_items() for _ in range(7)]
+        client = self.seller_client()
+
+        seen = []
+        url = '/api/v1/seller/orders/?limit=3'
+        while True:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(order['id'] for order in response.data['results'])
+            if not response.data['next_cursor']:
+                break
+            url = f"/api/v1/seller/orders/?limit=3&cursor={response.data['next_cursor']}"
+
+        self.assertEqual(seen, [order.id for order in reversed(created)])
+
+    def test_page_query_count_independent_of_items(self):
+        client = self.seller_client()
+        self.create_order_with_items(lines=1)
+        with CaptureQueriesContext(connection) as few:
+            client.get('/api/v1/seller/orders/')
+        for _ in range(5):
+            self.create_order_with_items(lines=4)
+        with CaptureQueriesContext(connection) as many:
+            response = client.get('/api/v1/seller/orders/')
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(few), len(many))
+
+    def test_status_and_date_filters(self):
+        self.create_order_with_items(status='pending')
+        delivered = self.create_order_with_items(status='delivered')
+        client = self.seller_client()
+
+        response = client.get('/api/v1/seller/orders/?status=delivered,shipped')
+        self.assertEqual([order['id'] for order in response.data['results']], [delivered.id])
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        response = client.get(f'/api/v1/seller/orders/?date_from={tomorrow}')
+        self.assertEqual(response.data['results'], [])
+
+        self.assertEqual(client.get('/api/v1/seller/orders/?date_to=yesterday').status_code, 400)
+        self.assertEqual(client.get('/api/v1/seller/orders/?cursor=broken').status_code, 400)
+        # Курсор правильной формы, но с значениями не того типа
+        for values in (['not-a-date', 1], ['2026-10-18T10:00:00+00:00', 'x'], [None, 1], [[1], {}]):
+            cursor = KeysetPagination.encode_cursor(values)
+            self.assertEqual(client.get(f'/api/v1/seller/orders/?cursor={cursor}').status_code, 400)
+
+
+class SellerProductsListTests(StoreFixtureMixin, TestCase):
+
+    def add_catalog(self, count):
+        group = Group.objects.create(store=self.store, name='Группа')
+        uom = Uom.objects.create(name='шт')
+        for index in range(count):
+            item = self.create_item(f'Товар {index}', group=group, uom=uom)
+            Enter.objects.create(item=item, storage=self.storage, amount=index)
+
+    def test_products_list_constant_queries(self):
+        client = self.seller_client()
+        self.add_catalog(1)
+        with CaptureQueriesContext(connection) as small:
+            client.get('/api/v1/seller/products/')
+        self.add_catalog(10)
+        with CaptureQueriesContext(connection) as large:
+            response = client.get('/api/v1/seller/products/')
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(sum(product['stock'] for product in response.data['results']), 45)
+        self.assertEqual(len(small), len(large))
+
+    def test_real_products_list_constant_queries(self):
+        view = RealProductsListAPIView.as_view()
+        self.add_catalog(1)
+        with CaptureQueriesContext(connection) as small:
+            view(APIRequestFactory().get('/'))
+        self.add_catalog(10)
+        with CaptureQueriesContext(connection) as large:
+            response = view(APIRequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(StoreFixtureMixin, TestCase):
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_orders_ndjson_streams_orders_with_items(self):
+        orders = self.create_orders(5)
+        for order in orders:
+            OrderItem.objects.create(order=order, item=self.item, amount=2, price_per_item=Decimal('100.00'))
+        client = self.seller_client()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/v1/seller/exports/orders/')
+            records = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([record['order_id'] for record in records], [order.id for order in orders])
+        self.assertEqual(records[0]['items'], [{
+            'item_id': self.item.id, 'item_name': 'Товар', 'amount': 2,
+            'price_per_item': '100.00', 'line_total': '200.00'
+        }])
+        # Заказы читаются одним курсором, позиции - запросом на каждую пачку из EXPORT_CHUNK_SIZE заказов
+        self.assertEqual(len(queries), 1 + 3)
+
+    def test_orders_csv_has_row_per_item(self):
+        order = self.create_orders(1)[0]
+        OrderItem.objects.create(order=order, item=self.item, amount=1)
+        OrderItem.objects.create(order=order, item=self.item, amount=3)
+        self.create_orders(1)
+
+        response = self.seller_client().get('/api/v1/seller/exports/orders/?output=csv')
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual([row['amount'] for row in rows], ['1', '3', ''])
+        self.assertEqual(rows[0]['order_number'], order.order_number)
+
+    def test_stock_and_movements(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=5, supplier='Поставщик')
+        WriteOff.objects.create(item=self.item, storage=self.storage, amount=2, reason='Брак')
+        Enter.objects.create(item=self.item, storage=self.storage, amount=1)
+        client = self.seller_client()
+
+        response = client.get('/api/v1/seller/exports/stock/?output=csv')
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(rows, [{
+            'storage_id': str(self.storage.id), 'storage_name': 'Основной склад',
+            'item_id': str(self.item.id), 'item_name': 'Товар', 'amount': '4'
+        }])
+
+        response = client.get('/api/v1/seller/exports/movements/')
+        records = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([(record['type'], record['amount']) for record in records], [
+            ('enter', 5), ('write_off', 2), ('enter', 1)
+        ])
+        self.assertEqual((records[0]['supplier'], records[1]['reason']), ('Поставщик', 'Брак'))
+
+    def test_export_job_writes_file(self):
+        order = self.create_orders(1)[0]
+        OrderItem.objects.create(order=order, item=self.item, amount=2)
+        client = self.seller_client()
+
+        response = client.post('/api/v1/seller/exports/', {'export': 'orders', 'output': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(client.post('/api/v1/seller/exports/', {'export': 'users'}, format='json').status_code, 400)
+
+        with tempfile.TemporaryDirectory() as private_root, override_settings(STORAGES={
+            **settings.STORAGES,
+            'private': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': private_root}},
+        }):
+            self.assertEqual(run_pending('worker'), 1)
+            job = client.get(response.data['status_url']).data
+            self.assertEqual((job['status'], job['result']['rows']), ('succeeded', 1))
+            self.assertEqual(job['result']['file'], f"/api/v1/jobs/{job['id']}/file/")
+            # Файл не лежит в публичном хранилище
+            self.assertFalse(default_storage.exists(job['result']['file_name']))
+
+            download = client.get(job['result']['file'])
+            self.assertEqual(download.status_code, 200)
+            rows = list(csv.DictReader(StringIO(b''.join(download.streaming_content).decode())))
+
+            stranger = APIClient()
+            stranger.force_authenticate(self.customer)
+            self.assertEqual(stranger.get(job['result']['file']).status_code, 404)
+        self.assertEqual([row['order_number'] for row in rows], [order.order_number])
+
+    def test_invalid_parameters(self):
+        client = self.seller_client()
+        self.assertEqual(client.get('/api/v1/seller/exports/stock/?output=xml').status_code, 400)
+        self.assertEqual(client.get('/api/v1/seller/exports/orders/?date_from=today').status_code, 400)
+
+
+class InventoryCheckJobTests(StoreFixtureMixin, TestCase):
+
+    def test_items_are_generated_in_background(self):
+        second = self.create_item('Второй товар')
+        Enter.objects.create(item=self.item, storage=self.storage, amount=4)
+        Enter.objects.create(item=second, storage=self.storage, amount=1)
+        client = self.seller_client()
+
+        response = client.post('/api/v1/seller/inventory/checks/', {'storage_id': self.storage.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        check = InventoryCheck.objects.get(pk=response.data['id'])
+        self.assertEqual((check.status, check.items.count()), ('draft', 0))
+
+        run_pending('worker')
+        check.refresh_from_db()
+        self.assertEqual(check.status, 'in_progress')
+        self.assertEqual(
+            sorted(check.items.values_list('item_id', 'expected_amount', 'difference')),
+            [(self.item.id, 4, -4), (second.id, 1, -1)]
+        )
+        job = client.get(response.data['job']['status_url']).data
+        self.assertEqual(job['result'], {'check_id': check.id, 'items_created': 2})
+
+        # Повторный запуск не дублирует позиции
+        self.assertEqual(check.generate_items(), 0)
+
+    def test_check_cannot_be_completed_while_items_are_generated(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=4)
+        client = self.seller_client()
+        response = client.post('/api/v1/seller/inventory/checks/', {'storage_id': self.storage.id}, format='json')
+        check = InventoryCheck.objects.get(pk=response.data['id'])
+        url = f'/api/v1/seller/inventory/checks/{check.id}/complete/'
+
+        self.assertEqual(client.post(url, {}, format='json').status_code, 409)
+        with self.assertRaises(InventoryCheckNotReady):
+            check.complete()
+        # Позиции уже созданы, но задача еще числится выполняемой
+        check.generate_items()
+        Job.objects.filter(pk=response.data['job']['id']).update(status='running')
+        self.assertEqual(client.post(url, {}, format='json').status_code, 409)
+        self.assertEqual(Stock.objects.get(item=self.item, storage=self.storage).amount, 4)
+
+        Job.objects.filter(pk=response.data['job']['id']).update(status='succeeded')
+        self.assertEqual(client.post(url, {}, format='json').status_code, 200)
+        self.assertEqual(Stock.objects.get(item=self.item, storage=self.storage).amount, 0)
+        # Задача, выполненная после завершения, позиций не добавляет
+        self.create_item('Новый товар')
+        self.assertEqual(check.generate_items(), 0)
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_seeds_and_measures_with_and_without_indexes(self):
+        out = StringIO()
+        call_command('benchmark_hot_paths', orders=30, stores=2, batch=10, repeat=1, compare=True, stdout=out)
+
+        self.assertEqual(Order.objects.filter(order_number__startswith='BENCH-').count(), 30)
+        self.assertEqual(OrderItem.objects.filter(order__order_number__startswith='BENCH-').count(), 30)
+        self.assertEqual(StoreDailySales.objects.aggregate(total=Sum('orders_count'))['total'], 30)
+        output = out.getvalue()
+        self.assertIn("Without hot path indexes", output)
+        self.assertIn("GET /api/v1/seller/orders/: median", output)
+        # Индексы после замера без них возвращены откатом
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+        self.assertIn('order_store_created_idx', indexes)
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+from django.db.models import DateField, F, Sum, Value
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .models import StoreDailySales
+from .rollups import STATUS_FIELDS
+from .services import REVENUE_STATUSES
+
+# Поддерживаемые шаги временного ряда и соответствующие функции усечения даты
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+# Наибольшая длина периода в днях для каждого шага: ряд строится в памяти,
+# а аналитика доступна без авторизации
+MAX_SPAN_DAYS = {
+    'day': 366,
+    'week': 5 * 366,
+    'month': 5 * 366,
+}
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Начало интервала (дня, недели с понедельника или месяца), в который попадает дата"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day: date, granularity: str) -> date:
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def iter_buckets(start: date, end: date, granularity: str):
+    """Начала всех интервалов, пересекающихся с периодом [start, end]"""
+    current = bucket_start(start, granularity)
+    while current <= end:
+        yield current
+        try:
+            current = next_bucket(current, granularity)
+        except (OverflowError, ValueError):
+            # Следующий интервал начинается после date.max
+            return
+
+
+def sales_timeseries(store, start: date, end: date, granularity='day', statuses=REVENUE_STATUSES) -> list:
+    """
+    Выручка и количество заказов магазина по интервалам за период [start, end].
+
+    Все интервалы считаются одним GROUP BY запросом по дневным сводкам
+    StoreDailySales, пустые интервалы дополняются нулями на стороне Python.
+    Выручка берется по REVENUE_STATUSES, statuses задает только счетчик заказов.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    trunc = GRANULARITIES[granularity]
+    orders_count = sum((F(STATUS_FIELDS[status]) for status in statuses), Value(0))
+    rows = StoreDailySales.objects.filter(
+        store=store,
+        day__gte=start,
+        day__lte=end
+    ).annotate(
+        bucket=trunc('day', output_field=DateField())
+    ).values('bucket').annotate(
+        revenue=Sum('revenue'),
+        orders_count=Sum(orders_count)
+    ).order_by('bucket')
+
+    totals = {row['bucket']: row for row in rows}
+    series = []
+    for bucket in iter_buckets(start, end, granularity):
+        row = totals.get(bucket)
+        series.append({
+            "date": bucket.isoformat(),
+            "revenue": float(row['revenue'] or 0) if row else 0.0,
+            "orders_count": (row['orders_count'] or 0) if row else 0
+        })
+    return series
+
+
+def status_distribution(store, start: date, end: date) -> list:
+    """Количество заказов по статусам за период по дневным сводкам"""
+    totals = StoreDailySales.objects.filter(store=store, day__gte=start, day__lte=end).aggregate(
+        **{status: Sum(field) for status, field in STATUS_FIELDS.items()}
+    )
+    return [
+        {"status": status, "count": count}
+        for status, count in totals.items()
+        if count
+    ]
@@ -1,19 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from stores.api_views import StoreItemSearchAPIView
 from .views import *
 from .mock_api_views import MockCartAPIView
 from .dashboard_api_views import (
     DashboardStatsAPIView, OrdersListAPIView, ProductsListAPIView,
     StockRegistrationAPIView, WriteOffAPIView, InventoryCheckAPIView,
-    ItemsListAPIView, StoragesListAPIView
+    InventoryCheckCompleteAPIView, ItemsListAPIView, StoragesListAPIView
 )
 from .real_api_views import (
     RealDashboardStatsAPIView, RealOrdersListAPIView, RealProductsListAPIView,
     TasksAPIView, ContractorsAPIView, AnalyticsAPIView
 )
+from .export_api_views import OrdersExportAPIView, StockExportAPIView, MovementsExportAPIView, ExportJobAPIView
 from .order_creation_api import (
-    CreateOrderAPIView, UpdateOrderStatusAPIView, AddToCartAPIView, RealCartAPIView
+    CreateOrderAPIView, CheckoutAllAPIView, UpdateOrderStatusAPIView, AddToCartAPIView, RealCartAPIView
 )
 
 router = DefaultRouter()
@@ -31,6 +33,7 @@ urlpatterns = [
     
     # Order management - REAL APIs
     path('orders/create/', CreateOrderAPIView.as_view()),
+    path('orders/checkout-all/', CheckoutAllAPIView.as_view()),
     path('orders/<int:order_id>/status/', UpdateOrderStatusAPIView.as_view()),
     
     # Cart management - REAL APIs (main endpoint used by frontend)
@@ -47,6 +50,13 @@ urlpatterns = [
     path('seller/inventory/registration/', StockRegistrationAPIView.as_view()),
     path('seller/inventory/write-offs/', WriteOffAPIView.as_view()),
     path('seller/inventory/checks/', InventoryCheckAPIView.as_view()),
+    path('seller/inventory/checks/<int:check_id>/complete/', InventoryCheckCompleteAPIView.as_view()),
+    
+    # Streaming exports (NDJSON / CSV) and background export files
+    path('seller/exports/', ExportJobAPIView.as_view()),
+    path('seller/exports/orders/', OrdersExportAPIView.as_view()),
+    path('seller/exports/stock/', StockExportAPIView.as_view()),
+    path('seller/exports/movements/', MovementsExportAPIView.as_view()),
     
     # Helper APIs for inventory forms
     path('seller/items/', ItemsListAPIView.as_view()),
@@ -58,7 +68,8 @@ urlpatterns = [
     path('mock/seller/orders/', OrdersListAPIView.as_view()),
     path('mock/seller/products/', ProductsListAPIView.as_view()),
     
-    # Router-based URLs
+    # Router-based URLs; search stays above the router, where items/<pk>/ would capture "search"
+    path('stores/<int:store_id>/items/search/', StoreItemSearchAPIView.as_view(), name='store-item-search'),
     path('', include(router.urls)),
     path('stores/<int:store_id>/', include(store_based_router.urls)),
     path('test/protected/', ProtectedView.as_view()),
@@ -5,8 +5,8 @@ from rest_framework.authentication import SessionAuthentication, BasicAuthentica
 from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema_view, extend_schema
 
+from stores.catalog_cache import catalog_cache
 from stores.models import Item, SelfPickupPoint, Store, Stock
-from users.models import CustomUser
 from .models import Cart, CartItem, Order, OrderItem
 from .serializers import *
 from orders import schemas
@@ -29,7 +29,7 @@ class ProtectedView(APIView):
 @extend_schema_view(**schemas.stock_schemas)
 class StockAPIView(APIView):
     def get(self, request, *args, **kwargs):
-        stocks = Stock.objects.filter(item_id=kwargs.get("item_id"))
+        stocks = StockSerializer.setup_eager_loading(Stock.objects.filter(item_id=kwargs.get("item_id")))
         return Response(
             {
                 "stocks": StockSerializer(stocks, many=True).data
@@ -80,13 +80,12 @@ class OrderAPIView(viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderSerializer
 
     def list(self, request):
-        request.jwt_user = CustomUser.objects.get(id=request.user.id)
-        queryset = Order.objects.filter(user=request.user)
+        queryset = OrderSerializer.setup_eager_loading(Order.objects.filter(user=request.user))
         serializer = OrderSerializer(queryset, many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
-        queryset = Order.objects.get(id=pk)
+        queryset = OrderSerializer.setup_eager_loading(Order.objects.all()).get(id=pk)
         serializer = OrderSerializer(queryset)
         return Response(serializer.data)
 
@@ -97,12 +96,12 @@ class CartAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            user_cart = Cart.objects.get(user_id=request.user.id)
-            cart_items = CartItem.objects.filter(cart=user_cart)
-        except Cart.DoesNotExist:
-            new_cart = Cart.objects.create(user_id=request.user.id)
-            cart_items = CartItem.objects.filter(cart__user_id=request.user.id)
+        cart_items = list(CartItemSerializer.setup_eager_loading(
+            CartItem.objects.filter(cart__user_id=request.user.id)
+        ))
+        if not cart_items:
+            # Корзина создается при первом обращении, как и раньше
+            Cart.objects.get_or_create(user_id=request.user.id)
         return Response({"items": CartItemSerializer(cart_items, many=True, context={"request": request}).data})
 
     def post(self, request):
@@ -153,7 +152,7 @@ class CartAPIView(APIView):
 
 @extend_schema_view(**schemas.stores_schemas)
 class StoreAPIView(viewsets.ReadOnlyModelViewSet):
-    queryset = Store.objects.all()
+    queryset = StoreSerializer.setup_eager_loading(Store.objects.all())
     serializer_class = StoreSerializer
 
 
@@ -162,7 +161,11 @@ class ItemAPIView(viewsets.ReadOnlyModelViewSet):
     serializer_class = ItemSerializer
 
     def get_queryset(self):
-        return Item.objects.filter(store__id=self.kwargs['store_id'])
+        return ItemSerializer.setup_eager_loading(Item.objects.filter(store__id=self.kwargs['store_id']))
+
+    @catalog_cache
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 
 @extend_schema_view(**schemas.self_pickup_points_schemas)
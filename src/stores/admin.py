@@ -13,6 +13,7 @@ admin.site.register(Stock)
 admin.site.register(Enter)
 admin.site.register(SelfPickupPoint)
 admin.site.register(ItemImage)
+admin.site.register(ItemImageImport)
 admin.site.register(PaymentMethod)
 admin.site.register(StorePaymentMethod)
 admin.site.register(MoyskladIntegration)
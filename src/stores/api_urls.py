@@ -1,7 +1,7 @@
 from django.urls import path
 from .api_views import StoreDetailAPIView, StoreItemsAPIView, StoreSubcategoriesAPIView
 from .warehouse_api_views import WarehouseStockAPIView, WarehouseStatsAPIView
-from .seller_api_views import SellerProductsAPIView, WarehousesAPIView, WarehouseDetailAPIView
+from .seller_api_views import SellerProductsAPIView, WarehousesAPIView, WarehouseDetailAPIView, MoyskladSyncAPIView
 
 urlpatterns = [
     path('stores/<int:store_id>/', StoreDetailAPIView.as_view(), name='store-detail'),
@@ -16,4 +16,5 @@ urlpatterns = [
     path('seller/products/', SellerProductsAPIView.as_view(), name='seller-products'),
     path('warehouses/', WarehousesAPIView.as_view(), name='warehouses'),
     path('warehouses/<int:warehouse_id>/', WarehouseDetailAPIView.as_view(), name='warehouse-detail'),
+    path('seller/moysklad/sync/', MoyskladSyncAPIView.as_view(), name='moysklad-sync'),
 ]
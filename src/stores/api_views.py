@@ -1,8 +1,39 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
+
+from core.pagination import KeysetPagination
+from .catalog_cache import catalog_cache
 from .models import Store, Item, Group, Stock
+from .search import search_items
+from .thumbnails import thumbnail_fields
+
+
+def catalog_item_data(item, store_id) -> dict:
+    """Товар в формате каталога магазина (список и поиск)"""
+    return {
+        "id": item.id,
+        "name": item.name,
+        "preview": item.preview.url if item.preview else None,
+        **thumbnail_fields(item.preview),
+        "amount": float(item.default_price),  # Price field (keeping for frontend compatibility)
+        "price": float(item.default_price),  # Add explicit price field
+        "stock": item.total_stock,  # Stock quantity
+        "methods": ["card", "cash"],  # Default payment methods
+        "description": item.description,
+        "subcategory": {
+            "name": item.group.name if item.group else "Без категории",
+            "store": store_id,
+            "category": {
+                "name": item.group.name if item.group else "Без категории"
+            }
+        },
+        "uom": {
+            "name": item.uom.name if item.uom else "шт"
+        }
+    }
 
 
 class StoreDetailAPIView(APIView):
@@ -30,6 +61,7 @@ class StoreItemsAPIView(APIView):
     Get store items
     GET /api/v1/stores/{store_id}/items/
     """
+    @catalog_cache
     def get(self, request, store_id):
         try:
             # Get the store
@@ -41,42 +73,15 @@ class StoreItemsAPIView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Get all items for this store
-            items = Item.objects.filter(store=store, status=True)
+            # Get all items for this store with stock totals, group and uom in one query
+            items = Item.objects.with_stock().filter(store=store, status=True)
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(items, request, view=self)
             
-            items_data = []
-            for item in items:
-                # Calculate total stock from all storages
-                total_stock = 0
-                try:
-                    stocks = Stock.objects.filter(item=item)
-                    total_stock = sum(stock.amount for stock in stocks)
-                except:
-                    total_stock = 0
-                
-                item_data = {
-                    "id": item.id,
-                    "name": item.name,
-                    "preview": item.preview.url if item.preview else None,
-                    "amount": float(item.default_price),  # Price field (keeping for frontend compatibility)
-                    "price": float(item.default_price),  # Add explicit price field
-                    "stock": total_stock,  # Stock quantity
-                    "methods": ["card", "cash"],  # Default payment methods
-                    "description": item.description,
-                    "subcategory": {
-                        "name": item.group.name if item.group else "Без категории",
-                        "store": store_id,
-                        "category": {
-                            "name": item.group.name if item.group else "Без категории"
-                        }
-                    },
-                    "uom": {
-                        "name": item.uom.name if item.uom else "шт"
-                    }
-                }
-                items_data.append(item_data)
-            
-            return Response(items_data)
+            items_data = [catalog_item_data(item, store_id) for item in page]
+            return paginator.get_paginated_response(items_data)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -84,6 +89,43 @@ class StoreItemsAPIView(APIView):
             )
 
 
+class StoreItemSearchAPIView(APIView):
+    """
+    Full-text search over store items (name, description, group name)
+    GET /api/v1/stores/{store_id}/items/search/?q=мол&limit=20&cursor=...
+    Every word is matched as a prefix; results are ordered by relevance
+    """
+    @catalog_cache
+    def get(self, request, store_id):
+        try:
+            if not Store.objects.filter(id=store_id).exists():
+                return Response(
+                    {"detail": "Store not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            items = search_items(
+                Item.objects.with_stock().filter(store_id=store_id, status=True), request.query_params.get('q'),
+                store_id=store_id
+            )
+            if items is None:
+                return Response(
+                    {"detail": "Query parameter 'q' must contain at least one word"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            paginator = KeysetPagination(ordering=('-rank', 'id'))
+            page = paginator.paginate_queryset(items, request, view=self)
+            return paginator.get_paginated_response([catalog_item_data(item, store_id) for item in page])
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {"detail": f"Error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class StoreSubcategoriesAPIView(APIView):
     """
     Get store subcategories
@@ -0,0 +1,109 @@
+"""
+Кеш ответов публичного каталога магазина.
+
+Для каждого магазина в кеше хранится номер версии каталога. Любое изменение
+товаров, остатков, групп, цен и изображений магазина увеличивает версию, а
+ключ закешированного ответа и ETag строятся из версии, поэтому сбрасывать
+отдельные ответы не нужно: устаревшие просто перестают запрашиваться и
+вытесняются бэкендом кеша.
+
+Вместе с телом кешируются заголовки пагинации (курсор следующей страницы
+в режиме legacy). Повторный запрос с If-None-Match получает 304 по одной версии из кеша, без
+запросов к каталогу в БД. Бэкенд задается алиасом CATALOG_CACHE_ALIAS в CACHES.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.pagination import NEXT_CURSOR_HEADER
+
+CACHED_HEADERS = (NEXT_CURSOR_HEADER, 'Link')
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'catalog')]
+
+
+def _version_key(store_id):
+    return f'catalog_version:{store_id}'
+
+
+def _new_version():
+    # Версия от времени: после вытеснения ключа версии из кеша новая
+    # не совпадет ни с одной из выданных ранее
+    return int(time.time() * 1000)
+
+
+def get_catalog_version(store_id) -> int:
+    cache = _cache()
+    version = cache.get(_version_key(store_id))
+    if version is None:
+        cache.add(_version_key(store_id), _new_version(), None)
+        version = cache.get(_version_key(store_id))
+    return version
+
+
+def bump_catalog_version(*store_ids):
+    """Делает закешированные ответы каталога магазинов неактуальными"""
+    cache = _cache()
+    for store_id in set(store_ids):
+        if store_id is None:
+            continue
+        try:
+            cache.incr(_version_key(store_id))
+        except ValueError:
+            cache.add(_version_key(store_id), _new_version(), None)
+
+
+def bump_catalog_version_on_commit(*store_ids):
+    """
+    Увеличивает версию после фиксации транзакции, чтобы параллельный запрос
+    не закешировал под новой версией еще не зафиксированные данные
+    """
+    transaction.on_commit(lambda: bump_catalog_version(*store_ids))
+
+
+def catalog_cache(view_method):
+    """
+    Кеширует ответ метода view каталога (аргумент store_id из URL) и
+    поддерживает ETag / If-None-Match. Кешируются только ответы 200.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        store_id = kwargs['store_id']
+        version = get_catalog_version(store_id)
+        # Адрес хоста влияет на абсолютные ссылки на изображения в ответе
+        variant = hashlib.md5(
+            f'{request.get_host()}?{request.META.get("QUERY_STRING", "")}'.encode()
+        ).hexdigest()[:12]
+        etag = f'"{store_id}-{version}-{variant}"'
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        cache = _cache()
+        cache_key = f'catalog_page:{view.__class__.__name__}:{store_id}:{version}:{variant}'
+        cached = cache.get(cache_key)
+        if cached is None:
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+            cache.set(cache_key, (response.data, headers))
+        else:
+            data, headers = cached
+            response = Response(data, headers=headers)
+
+        response['ETag'] = etag
+        return response
+
+    return wrapper
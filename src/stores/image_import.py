@@ -0,0 +1,163 @@
+"""
+Загрузка изображений товаров из МойСклад.
+
+sync_items ставит в очередь (ItemImageImport) товары, пришедшие с
+изображениями, а import_item_images разбирает очередь порциями: пул потоков
+клиента скачивает изображения потоком во временные файлы, и файл сохраняется
+в хранилище под именем sha256 содержимого - одинаковые изображения разных
+товаров хранятся один раз. Первое изображение товара становится
+Item.preview, остальные - ItemImage; уменьшенные копии (stores.thumbnails)
+создаются сразу после сохранения. Очередь лежит в БД, поэтому после
+перезапуска загрузка продолжается с необработанных товаров.
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from .catalog_cache import bump_catalog_version_on_commit
+from .models import Item, ItemImage, ItemImageImport
+from .thumbnails import ensure_thumbnails
+
+
+class _HashingWriter:
+    """Пишет поток в файл и одновременно считает sha256"""
+
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.sha256()
+
+    def write(self, chunk):
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+
+def _images_href(row):
+    meta = (row.get('images') or {}).get('meta') or {}
+    return meta.get('href') if meta.get('size') != 0 else None
+
+
+def queue_item_images(store_id, rows) -> int:
+    """Ставит в очередь товары магазина из строк МойСклад, у которых есть изображения"""
+    hrefs = {row['id']: _images_href(row) for row in rows if _images_href(row)}
+    if not hrefs:
+        return 0
+    item_ids = dict(
+        Item.objects.filter(store_id=store_id, external_id__in=hrefs).values_list('external_id', 'id')
+    )
+    entries = [
+        ItemImageImport(item_id=item_ids[external_id], images_href=href)
+        for external_id, href in hrefs.items() if external_id in item_ids
+    ]
+    # Измененный товар загружается заново, в том числе после исчерпанных попыток
+    ItemImageImport.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['item'],
+        update_fields=['images_href', 'status', 'attempts', 'error', 'updated_at']
+    )
+    return len(entries)
+
+
+def image_name(digest, filename=None) -> str:
+    extension = os.path.splitext(filename or '')[1].lower() or '.jpg'
+    return f'images/moysklad/{digest[:2]}/{digest}{extension}'
+
+
+def store_image(client, download_href, filename=None) -> str:
+    """Скачивает изображение и возвращает его имя в хранилище; уже сохраненное содержимое не пишется повторно"""
+    with tempfile.TemporaryFile() as buffer:
+        writer = _HashingWriter(buffer)
+        client.download(download_href, writer)
+        name = image_name(writer.digest.hexdigest(), filename)
+        if not default_storage.exists(name):
+            buffer.seek(0)
+            saved = default_storage.save(name, File(buffer))
+            if saved != name:
+                # То же изображение успел сохранить другой поток
+                default_storage.delete(saved)
+    # update() в attach_images не вызывает сигналы, поэтому варианты создаются здесь, в потоке пула
+    ensure_thumbnails(name)
+    return name
+
+
+def fetch_item_images(client, images_href) -> list:
+    """Изображения товара в порядке МойСклад: [(имя в хранилище, имя файла), ...]"""
+    entity = images_href.split('/entity/', 1)[1]
+    rows = client.get_entity(entity, {'limit': 100}).get('rows', [])
+    return [
+        (store_image(client, row['meta']['downloadHref'], row.get('filename')), row.get('filename') or '')
+        for row in rows if (row.get('meta') or {}).get('downloadHref')
+    ]
+
+
+def attach_images(item_id, images):
+    """Первое изображение - превью товара, остальные добавляются в ItemImage без повторов"""
+    if not images:
+        return
+    Item.objects.filter(pk=item_id).update(preview=images[0][0])
+    extra = {name: filename for name, filename in images[1:]}
+    existing = set(ItemImage.objects.filter(item_id=item_id, image__in=extra).values_list('image', flat=True))
+    ItemImage.objects.bulk_create([
+        ItemImage(item_id=item_id, image=name, description=filename[:220])
+        for name, filename in extra.items() if name not in existing
+    ])
+
+
+def import_item_images(client, store_id=None, batch_size=None, progress=None) -> int:
+    """
+    Загружает изображения товаров из очереди (только магазина store_id, если
+    он задан). Ошибка товара не останавливает загрузку: товар остается в
+    очереди до MOYSKLAD_IMAGE_MAX_ATTEMPTS попыток. Возвращает число товаров
+    с загруженными изображениями.
+    """
+    batch_size = batch_size or getattr(settings, 'MOYSKLAD_IMAGE_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'MOYSKLAD_IMAGE_MAX_ATTEMPTS', 3)
+    pending = ItemImageImport.objects.filter(status='pending').annotate(store_id=F('item__store_id'))
+    if store_id is not None:
+        pending = pending.filter(item__store_id=store_id)
+
+    done = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=client.max_workers, thread_name_prefix='moysklad-images') as pool:
+        while True:
+            # Keyset по id: неудачные в этом проходе товары не выбираются повторно
+            batch = list(pending.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            futures = [(entry, pool.submit(fetch_item_images, client, entry.images_href)) for entry in batch]
+            stores = set()
+            for entry, future in futures:
+                entry.attempts += 1
+                try:
+                    images = future.result()
+                except Exception as e:
+                    entry.error = f'{type(e).__name__}: {e}'
+                    if entry.attempts >= max_attempts:
+                        entry.status = 'failed'
+                    entry.save(update_fields=['status', 'attempts', 'error', 'updated_at'])
+                    continue
+
+                with transaction.atomic():
+                    attach_images(entry.item_id, images)
+                    entry.status = 'done'
+                    entry.images_count = len(images)
+                    entry.error = ''
+                    entry.save(update_fields=['status', 'attempts', 'images_count', 'error', 'updated_at'])
+                stores.add(entry.store_id)
+                done += 1
+
+            if stores:
+                # update() не вызывает сигналы, поэтому версия каталога увеличивается явно
+                bump_catalog_version_on_commit(*stores)
+            if progress:
+                progress(None, f"Загружены изображения товаров: {done}")
+    return done
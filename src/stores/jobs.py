@@ -0,0 +1,16 @@
+"""Фоновые задачи магазина (реестр jobs.registry)"""
+from jobs.queue import JobError
+from jobs.registry import job_handler
+from .models import MoyskladIntegration
+from .services import MoyskladSyncError, sync_store
+
+
+@job_handler('moysklad.sync')
+def sync_moysklad(job):
+    integration = MoyskladIntegration.objects.filter(store_id=job.store_id).first()
+    if integration is None:
+        raise JobError("Магазин не подключен к МойСклад")
+    try:
+        return sync_store(integration, full=job.payload.get('full', False), progress=job.report_progress)
+    except MoyskladSyncError as e:
+        raise JobError(str(e))
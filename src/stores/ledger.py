@@ -0,0 +1,114 @@
+"""
+Единая точка изменения складских остатков.
+
+Все движения товара (оприходование, списание, инвентаризация) применяются
+как атомарные UPDATE ... SET amount = amount + delta без чтения строки в
+Python, поэтому параллельные документы по одному товару не теряют изменения.
+Списание выполняется условным UPDATE (amount >= количество), а ограничение
+amount >= 0 в БД страхует от ухода остатка в минус при любом другом пути записи.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .catalog_cache import bump_catalog_version_on_commit
+
+
+class InsufficientStock(ValueError):
+    """Недостаточно товара на складе для списания"""
+
+    def __init__(self, item_id, storage_id, requested):
+        self.item_id = item_id
+        self.storage_id = storage_id
+        self.requested = requested
+        super().__init__("Недостаточно товара на складе для списания")
+
+
+class StockLedger:
+
+    @classmethod
+    def apply(cls, item_id, storage_id, delta: int) -> None:
+        """Изменяет остаток товара на складе на delta (отрицательное значение - списание)"""
+        from .models import Item, Stock
+
+        with transaction.atomic():
+            rows = Stock.objects.filter(item_id=item_id, storage_id=storage_id)
+            if delta < 0:
+                rows = rows.filter(amount__gte=-delta)
+            updated = rows.update(amount=F('amount') + delta)
+
+            if not updated:
+                if delta < 0:
+                    raise InsufficientStock(item_id, storage_id, -delta)
+                cls._create_stock(item_id, storage_id, delta)
+
+            if delta:
+                Item.add_total_stock(item_id, delta)
+                cls._bump_catalog([item_id])
+
+    @classmethod
+    def apply_many(cls, deltas: dict) -> None:
+        """
+        Применяет пачку изменений {(item_id, storage_id): delta} за постоянное число запросов.
+
+        Существующие строки блокируются select_for_update в порядке (item_id, storage_id),
+        что исключает взаимоблокировки между параллельными пачками. Если хотя бы
+        одного товара не хватает, не применяется ничего.
+        """
+        from .models import Item, Stock
+
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        with transaction.atomic():
+            # Недостающие строки остатков создаются нулевыми, дубликаты отбрасывает уникальность
+            Stock.objects.bulk_create(
+                [Stock(item_id=item_id, storage_id=storage_id, amount=0) for item_id, storage_id in deltas],
+                ignore_conflicts=True
+            )
+            rows = list(Stock.objects.select_for_update().filter(
+                item_id__in={item_id for item_id, _ in deltas},
+                storage_id__in={storage_id for _, storage_id in deltas}
+            ).order_by('item_id', 'storage_id'))
+
+            changed = []
+            for stock in rows:
+                delta = deltas.get((stock.item_id, stock.storage_id))
+                if delta is None:
+                    continue
+                if stock.amount + delta < 0:
+                    raise InsufficientStock(stock.item_id, stock.storage_id, -delta)
+                stock.amount = F('amount') + delta
+                changed.append(stock)
+            Stock.objects.bulk_update(changed, ['amount'])
+
+            item_deltas = defaultdict(int)
+            for (item_id, _), delta in deltas.items():
+                item_deltas[item_id] += delta
+            Item.objects.filter(pk__in=item_deltas).update(total_stock=F('total_stock') + Case(
+                *[When(pk=item_id, then=Value(delta)) for item_id, delta in item_deltas.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            ))
+            cls._bump_catalog(item_deltas)
+
+    @staticmethod
+    def _bump_catalog(item_ids):
+        from .models import Item
+
+        store_ids = Item.objects.filter(pk__in=list(item_ids)).values_list('store_id', flat=True).distinct()
+        bump_catalog_version_on_commit(*store_ids)
+
+    @staticmethod
+    def _create_stock(item_id, storage_id, amount):
+        from .models import Stock
+
+        try:
+            # Точка сохранения: при гонке двух первых поступлений вторая вставка
+            # упадет на уникальности (item, storage) и превратится в UPDATE
+            with transaction.atomic():
+                Stock.objects.create(item_id=item_id, storage_id=storage_id, amount=amount)
+        except IntegrityError:
+            Stock.objects.filter(item_id=item_id, storage_id=storage_id).update(amount=F('amount') + amount)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from stores.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает индекс поиска товаров (после загрузки данных в обход сигналов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, dest='store_id', help="Только товары этого магазина")
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index(options['store_id'])
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {count} items"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from stores.models import Item, Stock
+
+
+class Command(BaseCommand):
+    help = "Сверяет Item.total_stock с суммой остатков по складам и при --fix исправляет расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Записать пересчитанные остатки в товары")
+        parser.add_argument('--store', type=int, dest='store_id', help="Проверить только товары магазина")
+
+    def handle(self, *args, **options):
+        stock_sum = Stock.objects.filter(item=OuterRef('pk')).values('item').annotate(
+            total=Sum('amount')
+        ).values('total')
+        actual = Coalesce(Subquery(stock_sum), 0)
+
+        items = Item.objects.all()
+        if options['store_id']:
+            items = items.filter(store_id=options['store_id'])
+
+        drifted = items.annotate(actual_stock=actual).exclude(total_stock=F('actual_stock'))
+        count = 0
+        for item in drifted.only('id', 'name', 'total_stock').order_by('id').iterator():
+            count += 1
+            self.stdout.write(f"{item.id} {item.name}: total_stock={item.total_stock}, stock={item.actual_stock}")
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS("No drift found"))
+            return
+
+        if options['fix']:
+            # Один UPDATE пересчитывает все расхождения
+            Item.objects.filter(pk__in=drifted.values('pk')).update(total_stock=actual)
+            self.stdout.write(self.style.SUCCESS(f"Fixed {count} items"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{count} items drifted, run with --fix to repair"))
@@ -0,0 +1,40 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from stores.models import MoyskladIntegration
+from stores.services import MoyskladSyncError, sync_store
+
+
+class Command(BaseCommand):
+    help = "Загружает группы и товары магазинов из МойСклад, измененные с прошлой синхронизации"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, dest='store_id', help="Синхронизировать только этот магазин")
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Перечитать весь каталог и снять с продажи товары, удаленные в МойСклад"
+        )
+
+    def handle(self, *args, **options):
+        integrations = MoyskladIntegration.objects.order_by('store_id')
+        if options['store_id']:
+            integrations = integrations.filter(store_id=options['store_id'])
+            if not integrations.exists():
+                raise CommandError(f"Store {options['store_id']} has no MoySklad integration")
+
+        failed = 0
+        for integration in integrations:
+            try:
+                result = sync_store(integration, full=options['full'])
+            except (MoyskladSyncError, requests.RequestException) as e:
+                failed += 1
+                self.stderr.write(f"Store {integration.store_id}: {e}")
+                continue
+            self.stdout.write(
+                f"Store {integration.store_id}: {result['groups']} groups, {result['items']} items, "
+                f"{result['images']} items with images"
+            )
+
+        if failed:
+            raise CommandError(f"{failed} stores failed to sync")
+        self.stdout.write(self.style.SUCCESS("MoySklad sync finished"))
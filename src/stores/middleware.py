@@ -0,0 +1,150 @@
+"""
+Определение магазина текущего пользователя один раз на запрос.
+
+JWT-аутентификация DRF выполняется уже во view, поэтому middleware кладет в
+request.user_store ленивый объект: магазин ищется при первом обращении, когда
+пользователь запроса уже известен. Найденные магазины кешируются в памяти
+процесса (LRU с TTL) и, если задан CURRENT_STORE_CACHE_ALIAS, в общем кеше
+Django. Кеш сбрасывается сигналами при сохранении и удалении Store.
+
+Владелец нескольких магазинов выбирает нужный заголовком X-Store-Id.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+
+from .models import Store
+
+STORE_HEADER = 'X-Store-Id'
+
+_MISSING = object()
+
+
+class _LRUCache:
+    """Потокобезопасный LRU-кеш с ограничением размера и временем жизни записей"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in [key for key in self._data if key[0] == user_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = _LRUCache(
+    max_size=getattr(settings, 'CURRENT_STORE_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'CURRENT_STORE_CACHE_TTL', 300)
+)
+
+
+def _shared_cache():
+    alias = getattr(settings, 'CURRENT_STORE_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _shared_key(user_id, store_id):
+    return f'current_store:{user_id}:{store_id or ""}'
+
+
+def get_user_store(user_id, store_id=None):
+    """
+    Магазин пользователя: указанный store_id, если он принадлежит пользователю,
+    иначе первый созданный магазин. None, если магазина нет.
+    """
+    key = (user_id, store_id)
+    store = _local_cache.get(key)
+
+    if store is _MISSING:
+        shared = _shared_cache()
+        if shared is not None:
+            store = shared.get(_shared_key(user_id, store_id), _MISSING)
+
+        if store is _MISSING:
+            stores = Store.objects.filter(owner_id=user_id)
+            if store_id is not None:
+                stores = stores.filter(pk=store_id)
+            store = stores.order_by('id').first()
+            if shared is not None:
+                shared.set(_shared_key(user_id, store_id), store, _local_cache.ttl)
+
+        _local_cache.set(key, store)
+
+    # Копия, чтобы изменения во view не попадали в общий кеш
+    return copy.copy(store)
+
+
+def invalidate_user_store(user_id, store_ids=()):
+    """Сбрасывает кеш магазинов пользователя (вызывается сигналами Store)"""
+    _local_cache.delete_user(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_shared_key(user_id, None)] + [_shared_key(user_id, store_id) for store_id in store_ids])
+
+
+def get_request_store(request):
+    """
+    Магазин текущего запроса (Django или DRF). Работает и без
+    CurrentStoreMiddleware, например при вызове view из тестов. Результат
+    запоминается на запросе, но только после аутентификации: до нее
+    JWT-пользователь еще неизвестен.
+    """
+    user = getattr(request, 'user', None)
+    request = getattr(request, '_request', request)
+    if hasattr(request, '_current_store'):
+        return request._current_store
+
+    if user is None or not user.is_authenticated:
+        return None
+
+    store_id = request.headers.get(STORE_HEADER)
+    if store_id is not None:
+        try:
+            store_id = int(store_id)
+        except ValueError:
+            request._current_store = None
+            return None
+
+    request._current_store = get_user_store(user.pk, store_id)
+    return request._current_store
+
+
+class CurrentStoreMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_store = SimpleLazyObject(lambda: get_request_store(request))
+        return self.get_response(request)
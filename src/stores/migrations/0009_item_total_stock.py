@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-18 05:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_stock(apps, schema_editor):
+    """Заполняет суммарный остаток товаров по текущим остаткам на складах"""
+    Item = apps.get_model('stores', 'Item')
+    Stock = apps.get_model('stores', 'Stock')
+
+    stock_sum = Stock.objects.filter(item=OuterRef('pk')).values('item').annotate(
+        total=Sum('amount')
+    ).values('total')
+    Item.objects.update(total_stock=Coalesce(Subquery(stock_sum), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0008_merge_20250802_1411'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='total_stock',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_total_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 05:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def normalize_stock(apps, schema_editor):
+    """
+    Готовит остатки к ограничениям: дубли (item, storage) сливаются в одну
+    строку, отрицательные остатки обнуляются, суммарные остатки товаров
+    пересчитываются.
+    """
+    Item = apps.get_model('stores', 'Item')
+    Stock = apps.get_model('stores', 'Stock')
+
+    duplicates = Stock.objects.values('item_id', 'storage_id').annotate(
+        rows=Count('id'), keep_id=Min('id'), total=Sum('amount')
+    ).filter(rows__gt=1)
+    for row in duplicates.iterator():
+        Stock.objects.filter(pk=row['keep_id']).update(amount=row['total'])
+        Stock.objects.filter(item_id=row['item_id'], storage_id=row['storage_id']).exclude(
+            pk=row['keep_id']
+        ).delete()
+
+    Stock.objects.filter(amount__lt=0).update(amount=0)
+
+    stock_sum = Stock.objects.filter(item=OuterRef('pk')).values('item').annotate(
+        total=Sum('amount')
+    ).values('total')
+    Item.objects.update(total_stock=Coalesce(Subquery(stock_sum), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0009_item_total_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.UniqueConstraint(fields=('item', 'storage'), name='unique_stock_item_storage'),
+        ),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.CheckConstraint(check=models.Q(('amount__gte', 0)), name='stock_amount_non_negative'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0010_stock_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['store', 'status', 'created_at'], name='item_store_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enter',
+            index=models.Index(fields=['storage', 'created_at', 'id'], name='enter_storage_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorycheck',
+            index=models.Index(fields=['storage', 'created_at', 'id'], name='invcheck_storage_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='writeoff',
+            index=models.Index(fields=['storage', 'created_at', 'id'], name='writeoff_storage_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0012_document_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='external_id',
+            field=models.CharField(default=None, max_length=64, null=True, unique=True),
+        ),
+    ]
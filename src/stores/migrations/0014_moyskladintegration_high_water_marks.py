@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0013_item_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyskladintegration',
+            name='high_water_marks',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0014_moyskladintegration_high_water_marks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemImageImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('images_href', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('done', 'Загружено'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('images_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='image_import', to='stores.item')),
+            ],
+            options={
+                'verbose_name': 'Загрузка изображений товара',
+                'verbose_name_plural': 'Загрузка изображений товаров',
+                'indexes': [models.Index(fields=['status', 'id'], name='itemimageimport_status_idx')],
+            },
+        ),
+    ]
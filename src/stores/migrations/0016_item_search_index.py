@@ -0,0 +1,71 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:40
+
+import django.contrib.postgres.search
+import stores.models
+from django.conf import settings
+from django.db import migrations
+
+
+# Индекс поиска товаров (stores.search): tsvector под GIN-индексом в PostgreSQL, теневая таблица FTS5 в SQLite
+POSTGRES_BACKFILL = """
+    UPDATE stores_item SET search_vector =
+        setweight(to_tsvector(%s::regconfig, translate(coalesce(name, ''), 'ёЁ', 'еЕ')), 'A')
+        || setweight(to_tsvector(%s::regconfig, translate(coalesce(
+            (SELECT grp.name FROM stores_group grp WHERE grp.id = stores_item.group_id), ''
+        ), 'ёЁ', 'еЕ')), 'B')
+        || setweight(to_tsvector(%s::regconfig, translate(coalesce(description, ''), 'ёЁ', 'еЕ')), 'C')
+"""
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE stores_item_search USING fts5(
+        name, group_name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    INSERT INTO stores_item_search (rowid, name, group_name, description)
+    SELECT item.id,
+        REPLACE(REPLACE(item.name, 'ё', 'е'), 'Ё', 'Е'),
+        REPLACE(REPLACE(COALESCE(grp.name, ''), 'ё', 'е'), 'Ё', 'Е'),
+        REPLACE(REPLACE(item.description, 'ё', 'е'), 'Ё', 'Е')
+    FROM stores_item item LEFT JOIN stores_group grp ON grp.id = item.group_id
+    """,
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS stores_item_search"]
+
+
+def fill_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # Та же конфигурация, что у stores.search.update_search_index
+        schema_editor.execute(POSTGRES_BACKFILL, [getattr(settings, 'SEARCH_CONFIG', 'simple')] * 3)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_BACKWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0015_itemimageimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_index, drop_search_index),
+        # Индекс создается после заполнения, чтобы не обновлять его на каждую строку
+        migrations.AddIndex(
+            model_name='item',
+            index=stores.models.SearchVectorIndex(fields=['search_vector'], name='item_search_vector_idx'),
+        ),
+    ]
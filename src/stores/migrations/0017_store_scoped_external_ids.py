@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0016_item_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='group',
+            name='external_id',
+            field=models.CharField(default=None, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='external_id',
+            field=models.CharField(default=None, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='group',
+            constraint=models.UniqueConstraint(fields=('store', 'external_id'), name='unique_group_store_external_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(fields=('store', 'external_id'), name='unique_item_store_external_id'),
+        ),
+    ]
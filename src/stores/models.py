@@ -1,7 +1,12 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F
 
 from users.models import CustomUser
 
+from .ledger import StockLedger
+
 
 class Store(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -62,7 +67,8 @@ class Group(models.Model):
     store = models.ForeignKey(to=Store, on_delete=models.CASCADE)
     name = models.CharField(max_length=220)
     description = models.CharField(max_length=220, null=True, default=None)
-    external_id = models.CharField(max_length=64, unique=True, null=True, default=None)
+    # id группы в МойСклад, уникален в пределах магазина (stores.services)
+    external_id = models.CharField(max_length=64, null=True, default=None)
     parent = models.ForeignKey(to='self', on_delete=models.CASCADE, null=True, default=None)
     is_root = models.BooleanField(null=True, default=None)
     parent_external_id = models.CharField(max_length=64, null=True, default=None)
@@ -73,6 +79,10 @@ class Group(models.Model):
     class Meta:
         verbose_name = "Податегория"
         verbose_name_plural = "Подкатегории"
+        constraints = [
+            # Несколько магазинов могут синхронизироваться с одним аккаунтом МойСклад
+            models.UniqueConstraint(fields=['store', 'external_id'], name='unique_group_store_external_id'),
+        ]
 
 
 class Uom(models.Model):
@@ -88,6 +98,32 @@ class Uom(models.Model):
         verbose_name_plural = "Единицы измерения"
 
 
+class SearchVectorIndex(GinIndex):
+    """
+    GIN-индекс Item.search_vector. Создается только в PostgreSQL: в SQLite
+    поиск идет по теневой таблице FTS5 (stores.search), и индекс - пустая операция
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+class ItemQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+        Товары с подгруженными группой, единицей измерения и магазином - для списков
+        без запроса на каждую строку. Суммарный остаток хранится в самом товаре (total_stock).
+        """
+        return self.select_related('group', 'uom', 'store')
+
+
 class Item(models.Model):
     store = models.ForeignKey(to=Store, on_delete=models.CASCADE)
     group = models.ForeignKey(to=Group, on_delete=models.CASCADE, null=True, default=None)
@@ -100,6 +136,19 @@ class Item(models.Model):
     default_price = models.DecimalField(max_digits=16, decimal_places=2, default=10)
     # Обязательное поле связи с основным складом товара
     default_storage = models.ForeignKey(to='Storage', on_delete=models.PROTECT, related_name='default_items')
+    # Сумма остатков по всем складам, ведется документами движения товара
+    total_stock = models.IntegerField(default=0)
+    # id товара в МойСклад, уникален в пределах магазина (stores.services)
+    external_id = models.CharField(max_length=64, null=True, default=None)
+    # tsvector названия, группы и описания для поиска в PostgreSQL (stores.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ItemQuerySet.as_manager()
+
+    @staticmethod
+    def add_total_stock(item_id, delta):
+        """Атомарно изменяет суммарный остаток товара на delta"""
+        Item.objects.filter(pk=item_id).update(total_stock=F('total_stock') + delta)
 
     def __str__(self):
         return self.name
@@ -107,6 +156,16 @@ class Item(models.Model):
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        indexes = [
+            # Каталог магазина: активные товары, новые первыми
+            models.Index(fields=['store', 'status', 'created_at'], name='item_store_status_created_idx'),
+            # Полнотекстовый поиск (stores.search)
+            SearchVectorIndex(fields=['search_vector'], name='item_search_vector_idx'),
+        ]
+        constraints = [
+            # Несколько магазинов могут синхронизироваться с одним аккаунтом МойСклад
+            models.UniqueConstraint(fields=['store', 'external_id'], name='unique_item_store_external_id'),
+        ]
 
 
 class ItemImage(models.Model):
@@ -122,6 +181,34 @@ class ItemImage(models.Model):
         verbose_name_plural = "Изображения Товаров"
 
 
+class ItemImageImport(models.Model):
+    """Очередь загрузки изображений товара из МойСклад (stores.image_import), по строке на товар"""
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('done', 'Загружено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    item = models.OneToOneField(to=Item, on_delete=models.CASCADE, related_name='image_import')
+    # Ссылка на коллекцию изображений товара: .../entity/product/<id>/images
+    images_href = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    images_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.item_id}: {self.status}"
+
+    class Meta:
+        verbose_name = "Загрузка изображений товара"
+        verbose_name_plural = "Загрузка изображений товаров"
+        indexes = [
+            models.Index(fields=['status', 'id'], name='itemimageimport_status_idx'),
+        ]
+
+
 class Currency(models.Model):
     name = models.CharField(max_length=40)
     full_name = models.CharField(max_length=40)
@@ -216,6 +303,10 @@ class Stock(models.Model):
     class Meta:
         verbose_name = "Остаток"
         verbose_name_plural = "Остатки"
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'storage'], name='unique_stock_item_storage'),
+            models.CheckConstraint(check=models.Q(amount__gte=0), name='stock_amount_non_negative'),
+        ]
 
 
 class Enter(models.Model):
@@ -229,13 +320,11 @@ class Enter(models.Model):
     notes = models.TextField(blank=True, null=True)
 
     def save(self, *args, **kwargs):
-        stock = Stock.objects.filter(item=self.item, storage=self.storage)
-        if stock:
-            stock[0].amount += self.amount
-            stock[0].save()
-        else:
-            Stock.objects.create(item=self.item, storage=self.storage, amount=self.amount)
-        super(Enter, self).save(*args, **kwargs)
+        with transaction.atomic():
+            # Остаток меняется только при проведении документа, не при его редактировании
+            if self._state.adding:
+                StockLedger.apply(self.item_id, self.storage_id, self.amount)
+            super(Enter, self).save(*args, **kwargs)
 
     def __str__(self):
         return f'Оприходование {self.item.name} - {self.amount} {self.item.uom.name}'
@@ -243,6 +332,10 @@ class Enter(models.Model):
     class Meta:
         verbose_name = "Оприходование"
         verbose_name_plural = "Оприходования"
+        indexes = [
+            # Журнал документов склада: keyset по (created_at, id)
+            models.Index(fields=['storage', 'created_at', 'id'], name='enter_storage_created_idx'),
+        ]
 
 
 class WriteOff(models.Model):
@@ -256,13 +349,10 @@ class WriteOff(models.Model):
     notes = models.TextField(blank=True, null=True)
 
     def save(self, *args, **kwargs):
-        stock = Stock.objects.filter(item=self.item, storage=self.storage)
-        if stock and stock[0].amount >= self.amount:
-            stock[0].amount -= self.amount
-            stock[0].save()
-        else:
-            raise ValueError("Недостаточно товара на складе для списания")
-        super(WriteOff, self).save(*args, **kwargs)
+        with transaction.atomic():
+            if self._state.adding:
+                StockLedger.apply(self.item_id, self.storage_id, -self.amount)
+            super(WriteOff, self).save(*args, **kwargs)
 
     def __str__(self):
         return f'Списание {self.item.name} - {self.amount} {self.item.uom.name}'
@@ -270,6 +360,14 @@ class WriteOff(models.Model):
     class Meta:
         verbose_name = "Списание"
         verbose_name_plural = "Списания"
+        indexes = [
+            # Журнал документов склада: keyset по (created_at, id)
+            models.Index(fields=['storage', 'created_at', 'id'], name='writeoff_storage_created_idx'),
+        ]
+
+
+class InventoryCheckNotReady(ValueError):
+    """Инвентаризация еще черновик: позиции создает фоновая задача"""
 
 
 class InventoryCheck(models.Model):
@@ -285,12 +383,79 @@ class InventoryCheck(models.Model):
         ('cancelled', 'Отменена')
     ], default='draft')
 
+    def complete(self):
+        """
+        Завершает инвентаризацию: расхождения (факт - учет) применяются
+        к остаткам склада и суммарным остаткам товаров в одной транзакции.
+        Завершить можно только инвентаризацию в работе: у черновика
+        позиции еще создаются (generate_items).
+        """
+        with transaction.atomic():
+            status = InventoryCheck.objects.select_for_update().values_list('status', flat=True).get(pk=self.pk)
+            if status == 'draft':
+                raise InventoryCheckNotReady("Позиции инвентаризации еще создаются")
+            if status != 'in_progress':
+                raise ValueError("Инвентаризация уже завершена или отменена")
+
+            deltas = {}
+            for item_id, difference in self.items.exclude(difference=0).values_list('item_id', 'difference'):
+                key = (item_id, self.storage_id)
+                deltas[key] = deltas.get(key, 0) + difference
+            StockLedger.apply_many(deltas)
+
+            self.status = 'completed'
+            self.save(update_fields=['status'])
+
+    def generate_items(self, batch_size=1000, progress=None) -> int:
+        """
+        Заполняет инвентаризацию позициями по остаткам склада (ожидаемое
+        количество - учетное) пачками bulk_create и переводит ее в работу.
+        Повторный вызов досоздает только недостающие позиции.
+        Все выполняется в одной транзакции под блокировкой инвентаризации,
+        поэтому complete() ждет ее окончания и не видит половины позиций.
+        Возвращает число созданных позиций.
+        """
+        with transaction.atomic():
+            self.status = InventoryCheck.objects.select_for_update().values_list('status', flat=True).get(pk=self.pk)
+            if self.status in ('completed', 'cancelled'):
+                return 0
+            existing = set(self.items.values_list('item_id', flat=True))
+            stocks = Stock.objects.filter(storage_id=self.storage_id).values_list(
+                'item_id', 'amount'
+            ).order_by('item_id')
+
+            created = 0
+            batch = []
+            for item_id, amount in stocks.iterator(chunk_size=batch_size):
+                if item_id in existing:
+                    continue
+                # bulk_create не вызывает save, поэтому разница задается сразу
+                batch.append(InventoryCheckItem(
+                    inventory_check=self, item_id=item_id, expected_amount=amount, actual_amount=0, difference=-amount
+                ))
+                if len(batch) >= batch_size:
+                    InventoryCheckItem.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+                    if progress:
+                        progress(None, f"Создано позиций: {created}")
+            InventoryCheckItem.objects.bulk_create(batch)
+            created += len(batch)
+
+            if self.status == 'draft':
+                self.status = 'in_progress'
+                self.save(update_fields=['status'])
+        return created
+
     def __str__(self):
         return f'Инвентаризация {self.storage.name} от {self.created_at.strftime("%d.%m.%Y")}'
 
     class Meta:
         verbose_name = "Инвентаризация"
         verbose_name_plural = "Инвентаризации"
+        indexes = [
+            models.Index(fields=['storage', 'created_at', 'id'], name='invcheck_storage_created_idx'),
+        ]
 
 
 class InventoryCheckItem(models.Model):
@@ -359,3 +524,6 @@ class MoyskladIntegration(models.Model):
     store = models.OneToOneField(to=Store, on_delete=models.CASCADE)
     token = models.CharField(max_length=64)
     sync_status = models.BooleanField(default=False)
+    # Наибольшее значение updated по каждой сущности на момент последней синхронизации:
+    # {"productfolder": "2024-01-01 12:00:00.000", "product": ...}
+    high_water_marks = models.JSONField(default=dict, blank=True)
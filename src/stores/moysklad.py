@@ -0,0 +1,122 @@
+"""
+HTTP-клиент API МойСклад.
+
+Один клиент - одна requests.Session: соединения с API переиспользуются между
+запросами (в том числе из потоков пула), ответы запрашиваются сжатыми (gzip).
+На 429 клиент ждет столько, сколько просит API в заголовке X-Lognex-Retry-After
+(миллисекунды), и повторяет запрос. Страницы сущности после первой
+запрашиваются параллельно, не более max_workers запросов одновременно -
+API ограничивает число параллельных запросов пользователя.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_AFTER_HEADER = 'X-Lognex-Retry-After'
+
+
+class MoyskladClient:
+
+    def __init__(self, token, api_url=None, timeout=None, max_workers=None, max_retries=None):
+        self.api_url = (api_url or getattr(settings, 'MOYSKLAD_API_URL', 'https://api.moysklad.ru/api/remap/1.2')).rstrip('/')
+        self.timeout = timeout or getattr(settings, 'MOYSKLAD_TIMEOUT_SECONDS', 30)
+        self.max_workers = max(1, max_workers or getattr(settings, 'MOYSKLAD_MAX_CONNECTIONS', 4))
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'MOYSKLAD_MAX_RETRIES', 5)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": "Bearer " + token,
+            "Accept-Encoding": "gzip"
+        })
+        # Пул на max_workers соединений, чтобы потоки не открывали новые
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        """Запрос с повтором на 429; прочие ошибки HTTP - requests.HTTPError"""
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                response.raise_for_status()
+                return response
+            attempt += 1
+            delay = self.retry_delay(response, attempt)
+            response.close()
+            time.sleep(delay)
+
+    @staticmethod
+    def retry_delay(response, attempt) -> float:
+        try:
+            return int(response.headers[RETRY_AFTER_HEADER]) / 1000
+        except (KeyError, ValueError):
+            return min(2 ** (attempt - 1), 30)
+
+    def get_entity(self, entity, params=None) -> dict:
+        return self.request('GET', f'{self.api_url}/entity/{entity}', params=params).json()
+
+    def iter_pages(self, entity, page_size=None, params=None):
+        """
+        Страницы строк сущности по limit/offset в порядке offset. Первая страница
+        сообщает общее число строк (meta.size), остальные запрашиваются пулом.
+        """
+        page_size = page_size or getattr(settings, 'MOYSKLAD_PAGE_SIZE', 1000)
+        params = dict(params or {})
+        data = self.get_entity(entity, {**params, 'limit': page_size, 'offset': 0})
+        rows = data.get('rows', [])
+        if rows:
+            yield rows
+        total = data.get('meta', {}).get('size')
+        if total is None:
+            # Без meta.size страницы запрашиваются по очереди до неполной
+            offset = len(rows)
+            while len(rows) == page_size:
+                rows = self.get_entity(entity, {**params, 'limit': page_size, 'offset': offset}).get('rows', [])
+                if rows:
+                    yield rows
+                offset += len(rows)
+            return
+
+        offsets = iter(range(page_size, total, page_size))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='moysklad') as pool:
+            # В работе не больше max_workers страниц, чтобы не держать в памяти всю сущность
+            pending = deque()
+            for offset in offsets:
+                pending.append(pool.submit(self.get_entity, entity, {**params, 'limit': page_size, 'offset': offset}))
+                if len(pending) >= self.max_workers:
+                    break
+            try:
+                while pending:
+                    rows = pending.popleft().result().get('rows', [])
+                    offset = next(offsets, None)
+                    if offset is not None:
+                        pending.append(pool.submit(self.get_entity, entity, {**params, 'limit': page_size, 'offset': offset}))
+                    if rows:
+                        yield rows
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def download(self, href, destination, chunk_size=64 * 1024) -> int:
+        """Скачивает файл (например, miniature/download изображения) потоком в destination. Возвращает размер"""
+        size = 0
+        with self.request('GET', href, stream=True) as response:
+            for chunk in response.iter_content(chunk_size):
+                destination.write(chunk)
+                size += len(chunk)
+        return size
@@ -0,0 +1,159 @@
+"""
+Полнотекстовый поиск товаров магазина по названию, описанию и названию группы.
+
+PostgreSQL: в Item.search_vector хранится tsvector (конфигурация SEARCH_CONFIG,
+веса A - название, B - группа, C - описание) под GIN-индексом
+item_search_vector_idx. SQLite: теневая таблица FTS5 stores_item_search
+(rowid = id товара, токенизатор unicode61 без диакритики, префиксные индексы
+на 2 и 3 символа). В индексе и в
+запросе "ё" заменяется на "е".
+Обе структуры создает миграция 0016_item_search_index.
+
+Индекс обновляется сигналами (Item, Group) и синхронизацией МойСклад; полная
+перестройка - команда rebuild_search_index. Каждое слово запроса от
+MIN_PREFIX_LENGTH символов ищется как префикс ("мол" находит "Молоко"), более
+короткое - как целое слово. Результаты сортируются по релевантности (аннотация
+rank, больше - лучше), а затем по id; ранжируются только SEARCH_MAX_CANDIDATES
+последних подходящих товаров.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Replace
+
+from .models import Group, Item
+
+FTS_TABLE = 'stores_item_search'
+# Веса столбцов FTS5 (name, group_name, description) для bm25
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+MAX_TERMS = 8
+# Префиксные индексы FTS5 есть только с 2 символов: однобуквенный префикс обходит весь словарь
+MIN_PREFIX_LENGTH = 2
+
+
+def search_config() -> str:
+    return getattr(settings, 'SEARCH_CONFIG', 'simple')
+
+
+def search_max_candidates() -> int:
+    return getattr(settings, 'SEARCH_MAX_CANDIDATES', 2000)
+
+
+def search_terms(query) -> list:
+    """Слова запроса в нижнем регистре; знаки препинания и операторы отбрасываются"""
+    return re.findall(r'\w+', (query or '').lower().replace('ё', 'е'))[:MAX_TERMS]
+
+
+# "ё" -> "е" в тексте индекса: SQL для SQLite и выражение Django для PostgreSQL
+def _fold_sql(column) -> str:
+    return f"REPLACE(REPLACE({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _fold(expression):
+    return Replace(Replace(expression, Value('ё'), Value('е')), Value('Ё'), Value('Е'))
+
+
+# Строки теневой таблицы FTS5: id товара и тексты столбцов name, group_name, description
+_FTS_ROWS_SQL = (
+    'SELECT item.id, '
+    + ', '.join(_fold_sql(column) for column in ('item.name', "COALESCE(grp.name, '')", 'item.description'))
+    + ' FROM stores_item item LEFT JOIN stores_group grp ON grp.id = item.group_id'
+)
+
+
+def _is_prefix(term) -> bool:
+    return len(term) >= MIN_PREFIX_LENGTH
+
+
+def search_items(queryset, query, store_id=None):
+    """
+    Товары queryset, подходящие под все слова query, с аннотацией rank.
+    None, если в запросе нет слов. store_id сужает выборку кандидатов
+    в SQLite до товаров магазина (queryset при этом фильтруется как обычно)
+    """
+    terms = search_terms(query)
+    if not terms:
+        return None
+    limit = search_max_candidates()
+
+    if connection.vendor == 'postgresql':
+        ts_query = SearchQuery(
+            ' & '.join(f'{term}:*' if _is_prefix(term) else term for term in terms),
+            search_type='raw', config=search_config()
+        )
+        matches = queryset.filter(search_vector=ts_query)
+        candidates = matches.order_by('-id').values('id')[:limit]
+        return matches.filter(id__in=candidates).annotate(rank=SearchRank(F('search_vector'), ts_query))
+
+    if connection.vendor == 'sqlite':
+        match = ' AND '.join(f'"{term}"*' if _is_prefix(term) else f'"{term}"' for term in terms)
+        candidates_sql = f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE}'
+        params = [match]
+        if store_id is not None:
+            candidates_sql += f' JOIN stores_item candidate ON candidate.id = {FTS_TABLE}.rowid'
+        candidates_sql += f' WHERE {FTS_TABLE} MATCH %s'
+        if store_id is not None:
+            candidates_sql += ' AND candidate.store_id = %s'
+            params.append(store_id)
+        candidates_sql += f' ORDER BY {FTS_TABLE}.rowid DESC LIMIT %s'
+        params.append(limit)
+        return queryset.filter(id__in=RawSQL(candidates_sql, params)).extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = stores_item.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match]
+        ).annotate(rank=RawSQL(
+            f'-bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))})', (), output_field=FloatField()
+        ))
+
+    # Без индекса - последовательный поиск подстрок, без ранжирования
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(description__icontains=term) | Q(group__name__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def update_search_index(items):
+    """Пересчитывает запись индекса для товаров queryset items"""
+    if connection.vendor == 'postgresql':
+        config = search_config()
+        group_name = Subquery(Group.objects.filter(pk=OuterRef('group_id')).values('name')[:1])
+        items.update(search_vector=(
+            SearchVector(_fold(F('name')), weight='A', config=config)
+            + SearchVector(_fold(Coalesce(group_name, Value(''))), weight='B', config=config)
+            + SearchVector(_fold(F('description')), weight='C', config=config)
+        ))
+    elif connection.vendor == 'sqlite':
+        ids_sql, params = items.values('id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({ids_sql})', params)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, group_name, description) '
+                f'{_FTS_ROWS_SQL} WHERE item.id IN ({ids_sql})',
+                params
+            )
+
+
+def remove_from_search_index(item_ids):
+    """Удаляет записи удаленных товаров (в PostgreSQL вектор удаляется вместе со строкой)"""
+    if connection.vendor == 'sqlite' and item_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(item_ids))})', list(item_ids)
+            )
+
+
+def rebuild_search_index(store_id=None) -> int:
+    """Перестраивает индекс всех товаров (или магазина). Возвращает число товаров"""
+    items = Item.objects.all()
+    if store_id is not None:
+        items = items.filter(store_id=store_id)
+    if connection.vendor == 'sqlite' and store_id is None:
+        with connection.cursor() as cursor:
+            # Заодно удаляются записи товаров, удаленных без сигналов
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    update_search_index(items)
+    return items.count()
@@ -4,7 +4,13 @@ from rest_framework import status
 from django.db import transaction
 from decimal import Decimal
 
-from .models import Store, Item, Storage, Stock, Group, Uom
+from jobs.api_views import job_data
+from jobs.models import Job
+from jobs.queue import enqueue
+from orders.idempotency import idempotent
+from .ledger import StockLedger
+from .middleware import get_request_store
+from .models import Store, Item, Storage, Stock, Group, Uom, MoyskladIntegration
 from users.models import CustomUser
 
 
@@ -129,11 +135,7 @@ class SellerProductsAPIView(APIView):
                 )
                 
                 # Always create stock record since warehouse is required
-                stock = Stock.objects.create(
-                    item=item,
-                    storage=warehouse,
-                    amount=quantity
-                )
+                StockLedger.apply(item.id, warehouse.id, int(quantity))
             
             return Response({
                 "id": item.id,
@@ -351,3 +353,42 @@ class WarehouseDetailAPIView(APIView):
                 {"detail": f"Error deleting warehouse: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class MoyskladSyncAPIView(APIView):
+    """
+    Start MoySklad catalog sync in the background (stores.jobs)
+    POST /api/v1/seller/moysklad/sync/
+    Body: {"full": false} - full=true re-reads the whole catalog
+    A sync already queued or running for the store is returned instead of a new one.
+    """
+
+    @idempotent
+    def post(self, request):
+        try:
+            user_store = get_request_store(request)
+            if not user_store:
+                return Response(
+                    {"detail": "У пользователя нет магазина"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if not MoyskladIntegration.objects.filter(store=user_store).exists():
+                return Response(
+                    {"detail": "Магазин не подключен к МойСклад"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            job = Job.objects.filter(
+                store=user_store, kind='moysklad.sync', status__in=('queued', 'running')
+            ).order_by('id').first()
+            if job is None:
+                job = enqueue(
+                    'moysklad.sync', payload={'full': bool(request.data.get('full', False))},
+                    store=user_store, user=request.user
+                )
+            return Response(job_data(job), status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response(
+                {"detail": f"Error: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
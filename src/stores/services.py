@@ -1,125 +1,253 @@
-# from io import BytesIO
-# import tempfile
-
-import requests
-# from PIL import Image
-# from django.core.files.base import ContentFile
-
-from .models import Item, Group, Uom
-
-
-def get_entity_from_moysklad(token: str, entity: str) -> dict:
-    headers = {
-        "Authorization": "Bearer " + token
-    }
-
-    response = requests.get(
-        url="https://api.moysklad.ru/api/remap/1.2/entity/" + entity,
-        headers=headers
+"""
+Синхронизация каталога магазина с МойСклад.
+
+Сущности выбираются постранично (limit/offset) через MoyskladClient
+(stores.moysklad) и записываются страница за страницей одним
+bulk_create(update_conflicts=True) по (store, external_id): повторная синхронизация
+обновляет уже загруженные группы и товары, а не дублирует их. Группы и
+единицы измерения товаров ищутся в словарях external_id -> id, собранных
+одним запросом, родители групп магазина проставляются одним проходом после
+загрузки всех страниц.
+
+Синхронизация инкрементальная: интеграция хранит для каждой сущности
+наибольшее полученное значение updated (high-water mark), и следующий запуск
+запрашивает только строки с updated >= этой отметки в порядке updated, id.
+Отметки сохраняются только после успешной загрузки всех сущностей. Если
+строка пришла дважды (ее изменили во время постраничной выборки, и
+следующие строки сдвинулись по offset), отметка сущности не сдвигается, и
+следующий запуск перечитывает то же окно. Архивные в МойСклад товары
+снимаются с продажи (status=False); обратно на продажу синхронизация товары
+не возвращает - это решает продавец. Полная синхронизация (full=True)
+перечитывает все строки и снимает с продажи товары, удаленные в МойСклад.
+Товары с изображениями ставятся в очередь загрузки (stores.image_import).
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+
+from .catalog_cache import bump_catalog_version_on_commit
+from .image_import import import_item_images, queue_item_images
+from .models import Item, Group, Storage, Uom
+from .moysklad import MoyskladClient
+from .search import update_search_index
+
+
+class MoyskladSyncError(Exception):
+    pass
+
+
+# count - число полученных строк, updated - новая отметка сущности
+SyncResult = namedtuple('SyncResult', ['count', 'updated'])
+
+
+def entity_filter(updated_since=None) -> str:
+    """
+    Значение параметра filter: архивные строки API по умолчанию не отдает,
+    поэтому они запрашиваются явно, чтобы снять товары с продажи
+    """
+    conditions = ['archived=true', 'archived=false']
+    if updated_since:
+        conditions.insert(0, f'updated>={updated_since}')
+    return ';'.join(conditions)
+
+
+def iter_entity_pages(client, entity: str, page_size=None, updated_since=None):
+    """
+    Страницы строк сущности, измененных с updated_since (или всех), в
+    постоянном порядке updated, id: без него offset-страницы не согласованы
+    """
+    return client.iter_pages(
+        entity, page_size, params={'filter': entity_filter(updated_since), 'order': 'updated,id'}
     )
 
-    return response.json()
 
-
-def sync_groups(token, store_id):
-    res = get_entity_from_moysklad(token, 'productfolder')
-    for group in res['rows']:
-
-        is_root = False if group.get('productFolder') else True
-        if not is_root:
-            parent_external_id = group['productFolder']['meta']['uuidHref'].split('?id=')[1]
-        else:
-            parent_external_id = None
-
-        Group.objects.create(
-            store_id=store_id,
-            name=group['name'],
-            description=group.get('description'),
-            external_id=group['id'],
-            is_root=is_root,
-            parent_external_id=parent_external_id
+def _meta_id(reference):
+    """id сущности из ссылки вида {"meta": {"href": ".../entity/productfolder/<id>"}}"""
+    try:
+        return reference['meta']['href'].split('?')[0].rstrip('/').rsplit('/', 1)[1]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def _sale_price(row) -> Decimal:
+    # Цены в API МойСклад передаются в копейках
+    try:
+        return Decimal(row['salePrices'][0]['value']) / 100
+    except (KeyError, IndexError, TypeError):
+        return Decimal('0')
+
+
+def _high_water_mark(mark, rows):
+    # Формат "YYYY-MM-DD HH:MM:SS.mmm" сравнивается как строка
+    return max([mark or '', *(row.get('updated') or '' for row in rows)]) or None
+
+
+class _PageTracker:
+    """
+    Число полученных строк и новая отметка сущности. Повтор строки означает,
+    что выборка сдвинулась, и отметка остается прежней
+    """
+
+    def __init__(self, updated_since):
+        self.updated_since = updated_since
+        self.mark = updated_since
+        self.count = 0
+        self.seen = set()
+        self.shifted = False
+
+    def add(self, rows):
+        ids = [row['id'] for row in rows]
+        self.shifted = self.shifted or len(set(ids)) < len(ids) or not self.seen.isdisjoint(ids)
+        self.seen.update(ids)
+        self.count += len(rows)
+        self.mark = _high_water_mark(self.mark, rows)
+
+    def result(self) -> SyncResult:
+        return SyncResult(self.count, self.updated_since if self.shifted else self.mark)
+
+
+def sync_groups(client, store_id, page_size=None, updated_since=None) -> SyncResult:
+    """Загружает группы товаров (productfolder) магазина, измененные с updated_since (или все)"""
+    pages = _PageTracker(updated_since)
+    for rows in iter_entity_pages(client, 'productfolder', page_size, updated_since):
+        groups = [
+            Group(
+                store_id=store_id,
+                name=row['name'],
+                description=row.get('description'),
+                external_id=row['id'],
+                is_root=not row.get('productFolder'),
+                parent_external_id=_meta_id(row.get('productFolder'))
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            Group.objects.bulk_create(
+                groups,
+                update_conflicts=True,
+                unique_fields=['store', 'external_id'],
+                update_fields=['name', 'description', 'is_root', 'parent_external_id']
+            )
+            # bulk_create не вызывает сигналы: товары переименованных групп переиндексируются здесь
+            update_search_index(Item.objects.filter(
+                store_id=store_id, group__external_id__in=[group.external_id for group in groups]
+            ))
+        pages.add(rows)
+
+    if pages.count:
+        link_group_parents(store_id)
+        bump_catalog_version_on_commit(store_id)
+    return pages.result()
+
+
+def link_group_parents(store_id) -> int:
+    """Проставляет parent группам магазина по parent_external_id. Возвращает число измененных групп"""
+    groups = list(Group.objects.filter(store_id=store_id).only('id', 'external_id', 'parent_external_id', 'parent_id'))
+    ids = {group.external_id: group.id for group in groups if group.external_id}
+
+    changed = []
+    for group in groups:
+        parent_id = ids.get(group.parent_external_id)
+        if group.parent_id != parent_id:
+            group.parent_id = parent_id
+            changed.append(group)
+    Group.objects.bulk_update(changed, ['parent'], batch_size=1000)
+    return len(changed)
+
+
+def sync_items(client, store_id, page_size=None, updated_since=None, full=False, progress=None) -> SyncResult:
+    """
+    Загружает товары (product) магазина, измененные с updated_since (или все).
+    Новые товары привязываются к первому складу магазина, архивные снимаются с
+    продажи; статус остальных загруженных ранее товаров не меняется, чтобы не
+    вернуть на продажу снятые продавцом. При full=True с продажи снимаются и загруженные ранее товары,
+    которых больше нет в МойСклад. progress(percent, message) вызывается после
+    каждой страницы.
+    """
+    default_storage_id = Storage.objects.filter(store_id=store_id).order_by('id').values_list('id', flat=True).first()
+    if default_storage_id is None:
+        raise MoyskladSyncError("У магазина нет склада для новых товаров")
+
+    group_ids = dict(Group.objects.filter(store_id=store_id, external_id__isnull=False).values_list('external_id', 'id'))
+    uom_ids = dict(Uom.objects.filter(external_id__isnull=False).values_list('external_id', 'id'))
+
+    pages = _PageTracker(updated_since)
+    for rows in iter_entity_pages(client, 'product', page_size, updated_since):
+        items = [
+            Item(
+                store_id=store_id,
+                external_id=row['id'],
+                name=row['name'],
+                description=row.get('description') or "Описание отсутствует",
+                default_price=_sale_price(row),
+                status=not row.get('archived', False),
+                group_id=group_ids.get(_meta_id(row.get('productFolder'))),
+                uom_id=uom_ids.get(_meta_id(row.get('uom'))),
+                default_storage_id=default_storage_id
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            Item.objects.bulk_create(
+                items,
+                update_conflicts=True,
+                unique_fields=['store', 'external_id'],
+                update_fields=['name', 'description', 'default_price', 'group', 'uom']
+            )
+            archived = [item.external_id for item in items if not item.status]
+            if archived:
+                Item.objects.filter(store_id=store_id, external_id__in=archived, status=True).update(status=False)
+            queue_item_images(store_id, rows)
+            update_search_index(Item.objects.filter(
+                store_id=store_id, external_id__in=[item.external_id for item in items]
+            ))
+        pages.add(rows)
+        if progress:
+            progress(None, f"Загружено товаров: {pages.count}")
+
+    removed = deactivate_missing_items(store_id, pages.seen) if full else 0
+    if pages.count or removed:
+        # bulk_create не вызывает сигналы, поэтому версия каталога увеличивается явно
+        bump_catalog_version_on_commit(store_id)
+    return pages.result()
+
+
+def deactivate_missing_items(store_id, seen_external_ids) -> int:
+    """Снимает с продажи загруженные из МойСклад товары магазина, которых нет среди seen_external_ids"""
+    missing = [
+        pk for pk, external_id in Item.objects.filter(
+            store_id=store_id, external_id__isnull=False, status=True
+        ).values_list('pk', 'external_id').iterator()
+        if external_id not in seen_external_ids
+    ]
+    for start in range(0, len(missing), 1000):
+        Item.objects.filter(pk__in=missing[start:start + 1000]).update(status=False)
+    return len(missing)
+
+
+def sync_store(integration, full=False, progress=None) -> dict:
+    """
+    Синхронизирует магазин по подключенной интеграции: без full - только
+    изменения с прошлого запуска. Отметки сохраняются, только если загрузка
+    всех сущностей и изображений завершилась без исключения. progress(percent, message) - отчет о ходе
+    работы (для фоновой задачи).
+    """
+    marks = {} if full else dict(integration.high_water_marks or {})
+    with MoyskladClient(integration.token) as client:
+        groups = sync_groups(client, integration.store_id, updated_since=marks.get('productfolder'))
+        if progress:
+            progress(10, f"Загружено групп: {groups.count}")
+        items = sync_items(
+            client, integration.store_id, updated_since=marks.get('product'), full=full, progress=progress
         )
+        # Изображения загружаются после каталога; незавершенная очередь продолжится при следующем запуске
+        images = import_item_images(client, integration.store_id, progress=progress)
 
-    orphans = Group.objects.filter(is_root=False)
-
-    for group in orphans:
-        parent = Group.objects.filter(external_id=group.parent_external_id)
-
-        if parent:
-            group.parent = parent[0]
-            group.save()
-
-
-def sync_items(token, store_id):
-    res = get_entity_from_moysklad(token, 'product')
-
-    for item in res['rows']:
-        group = None
-        preview = None
-        price = 0
-        uom = None
-
-        if item.get('productFolder'):
-            try:
-                group_external_id = item['productFolder']['meta']['href'].split('productfolder/')[1]
-            except (IndexError, KeyError):
-                group_external_id = None
-
-            if group_external_id:
-                group_set = Group.objects.filter(external_id=group_external_id)
-                if group_set:
-                    group = group_set[0]
-                    print('group found')
-                else:
-                    group = None
-                    print('group not found, no in db')
-
-        if item.get('salePrices'):
-            try:
-                price = int(item['salePrices'][0]['value'])
-            except IndexError:
-                price = 0
-
-        if item.get('uom'):
-            uom_external_id = item['uom']['meta']['href'].split('uom/')[-1]
-            uom = Uom.objects.filter(external_id=uom_external_id)
-            if uom:
-                uom = uom[0]
-
-        '''if item.get('images'):
-            try:
-                images_meta_prefix = item['images']['meta']['href'].split('entity/')[1]
-            except (IndexError, KeyError):
-                images_meta_prefix = None
-                print('image not found in item')
-
-            if images_meta_prefix:
-                try:
-                    img_url = get_entity_from_moysklad(
-                        token=token,
-                        entity=images_meta_prefix
-                    )['rows'][0]['meta']['downloadHref']
-                except (IndexError, KeyError):
-                    img_url = None
-                    print('download link not found')
-
-                if img_url:
-                    preview_response = requests.get(img_url, stream=True)
-                    if preview_response.status_code != requests.codes.ok:
-                        lf = tempfile.NamedTemporaryFile()
-                        for block in preview_response.iter_content(1024 * 8):
-                            if not block:
-                                break
-                            lf.write(block)
-
-                    else:
-                        print('q')'''
-
-        Item.objects.create(
-            store_id=store_id,
-            group=group,
-            name=item['name'],
-            preview=preview,
-            default_price=price,
-            uom=uom
-        )
+    integration.high_water_marks = {
+        **marks,
+        **{entity: result.updated for entity, result in (('productfolder', groups), ('product', items)) if result.updated},
+    }
+    integration.sync_status = True
+    integration.save(update_fields=['high_water_marks', 'sync_status'])
+    return {'groups': groups.count, 'items': items.count, 'images': images}
@@ -0,0 +1,108 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .catalog_cache import bump_catalog_version_on_commit
+from .middleware import invalidate_user_store
+from .models import Group, Item, ItemImage, Price, Stock, Store, StorePaymentMethod, Uom
+from .search import remove_from_search_index, update_search_index
+from .thumbnails import ensure_thumbnails
+
+
+@receiver(pre_save, sender=Store)
+def remember_store_owner(sender, instance, **kwargs):
+    """Запоминает прежнего владельца, чтобы при передаче магазина сбросить и его кеш"""
+    if instance.pk is not None and not instance._state.adding:
+        instance._previous_owner_id = (
+            Store.objects.filter(pk=instance.pk).values_list('owner_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_current_store(sender, instance, **kwargs):
+    """
+    Сбрасывает закешированный магазин владельца (и прежнего владельца при
+    передаче магазина) при изменении или удалении магазина
+    """
+    invalidate_user_store(instance.owner_id, [instance.pk])
+    previous_owner_id = instance.__dict__.pop('_previous_owner_id', None)
+    if previous_owner_id is not None and previous_owner_id != instance.owner_id:
+        invalidate_user_store(previous_owner_id, [instance.pk])
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_store_catalog(sender, instance, **kwargs):
+    """Новая версия каталога магазина при изменении товара или группы"""
+    bump_catalog_version_on_commit(instance.store_id)
+
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Price)
+@receiver(post_save, sender=ItemImage)
+@receiver(post_delete, sender=ItemImage)
+def bump_item_catalog(sender, instance, **kwargs):
+    """Новая версия каталога магазина при изменении остатка, цены или изображения товара"""
+    store_id = Item.objects.filter(pk=instance.item_id).values_list('store_id', flat=True).first()
+    bump_catalog_version_on_commit(store_id)
+
+
+@receiver(post_save, sender=StorePaymentMethod)
+@receiver(post_delete, sender=StorePaymentMethod)
+def bump_payment_method_catalog(sender, instance, **kwargs):
+    """Новая версия каталога магазина при изменении его способов оплаты"""
+    bump_catalog_version_on_commit(instance.store_id)
+
+
+@receiver(post_save, sender=Uom)
+@receiver(pre_delete, sender=Uom)
+def bump_uom_catalog(sender, instance, **kwargs):
+    """
+    Единицы измерения общие для магазинов: новая версия каталога у всех
+    магазинов, товары которых используют единицу (до удаления, пока товары есть)
+    """
+    store_ids = Item.objects.filter(uom=instance).values_list('store_id', flat=True).distinct()
+    bump_catalog_version_on_commit(*store_ids)
+
+
+@receiver(pre_save, sender=Item)
+@receiver(pre_save, sender=ItemImage)
+def remember_uploaded_image(sender, instance, **kwargs):
+    """Файл, загружаемый этим сохранением, еще не записан в хранилище"""
+    image = instance.preview if sender is Item else instance.image
+    instance._image_uploaded = bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=ItemImage)
+def create_thumbnails(sender, instance, **kwargs):
+    """
+    Варианты загруженного изображения товара создаются сразу, а не при первом
+    запросе каталога. Имя файла могло принадлежать удаленному изображению,
+    поэтому варианты пересоздаются
+    """
+    image = instance.preview if sender is Item else instance.image
+    if image and instance.__dict__.pop('_image_uploaded', False):
+        transaction.on_commit(lambda: ensure_thumbnails(image.name, refresh=True))
+
+
+@receiver(post_save, sender=Item)
+def index_item(sender, instance, **kwargs):
+    update_search_index(Item.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Group)
+def index_group_items(sender, instance, created, **kwargs):
+    """Название группы входит в индекс поиска ее товаров"""
+    if not created:
+        update_search_index(Item.objects.filter(group=instance))
+
+
+@receiver(post_delete, sender=Item)
+def unindex_item(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
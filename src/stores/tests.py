@@ -1,3 +1,1027 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import requests
+from PIL import Image
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from core.pagination import KeysetPagination
+from jobs.queue import run_pending
+from users.models import CustomUser
+from . import middleware
+from .api_views import StoreItemsAPIView
+from .image_import import import_item_images
+from .ledger import InsufficientStock, StockLedger
+from .models import (
+    City, Country, Enter, Group, InventoryCheck, InventoryCheckItem, Item, ItemImage, ItemImageImport,
+    MoyskladIntegration, PaymentMethod, Stock, Store, StorePaymentMethod, Storage, Uom, WriteOff
+)
+from .moysklad import MoyskladClient
+from .services import MoyskladSyncError, sync_groups, sync_items, sync_store
+from .thumbnails import thumbnail_fields, thumbnail_name
+
+
+class StoreFixtureMixin:
+    """Магазин с владельцем, складом и товаром для тестов API продавца"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(username='seller', password='pass', email='seller@example.com')
+        # Магазин создается сигналом при регистрации пользователя
+        cls.store = Store.objects.get(owner=cls.owner)
+        cls.customer = CustomUser.objects.create_user(username='buyer', password='pass', email='buyer@example.com')
+        country = Country.objects.create(name='Республика Казахстан')
+        cls.city = City.objects.create(name='Астана', country=country)
+        cls.storage = Storage.objects.create(name='Основной склад', city=cls.city, store=cls.store)
+        cls.item = cls.create_item('Товар')
+
+    @classmethod
+    def create_item(cls, name, price=Decimal('100.00'), **kwargs):
+        return Item.objects.create(
+            store=cls.store, name=name, default_price=price, default_storage=cls.storage, **kwargs
+        )
+
+    def seller_client(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        # Магазин владельца сразу попадает в кеш CurrentStoreMiddleware,
+        # чтобы счетчики запросов в тестах не зависели от порядка вызовов
+        middleware.get_user_store(self.owner.id)
+        return client
+
+
+class ItemStockQuerySetTests(StoreFixtureMixin, TestCase):
+
+    def add_catalog(self, count):
+        group = Group.objects.create(store=self.store, name='Группа')
+        uom = Uom.objects.create(name='шт')
+        second = Storage.objects.create(name='Второй склад', city=self.city, store=self.store)
+        for index in range(count):
+            item = self.create_item(f'Товар {index}', group=group, uom=uom)
+            Enter.objects.create(item=item, storage=self.storage, amount=2)
+            Enter.objects.create(item=item, storage=second, amount=3)
+
+    def test_with_stock_sums_all_storages(self):
+        self.add_catalog(2)
+        items = Item.objects.with_stock().filter(store=self.store).order_by('id')
+        self.assertEqual([item.total_stock for item in items], [0, 5, 5])
+
+    def assertConstantQueries(self, fetch):
+        self.add_catalog(1)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(fetch().status_code, 200)
+        self.add_catalog(10)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(fetch().status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+    def test_store_items_constant_queries(self):
+        view = StoreItemsAPIView.as_view()
+
+        def fetch():
+            caches['catalog'].clear()
+            request = APIRequestFactory().get('/')
+            force_authenticate(request, self.customer)
+            return view(request, store_id=self.store.id)
+
+        self.assertConstantQueries(fetch)
+
+    def test_warehouse_stock_constant_queries(self):
+        client = self.seller_client()
+        self.assertConstantQueries(lambda: client.get('/api/v1/warehouse/stock/'))
+
+
+class DocumentListPaginationTests(StoreFixtureMixin, TestCase):
+
+    def test_cursor_walks_registrations_once(self):
+        created = [Enter.objects.create(item=self.item, storage=self.storage, amount=1) for _ in range(5)]
+        client = self.seller_client()
+
+        seen = []
+        url = '/api/v1/seller/inventory/registration/?limit=2'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(document['id'] for document in response.data['results'])
+            cursor = response.data['next_cursor']
+            url = cursor and f'/api/v1/seller/inventory/registration/?limit=2&cursor={cursor}'
+
+        self.assertEqual(seen, [document.id for document in reversed(created)])
+
+    def test_legacy_mode_returns_bare_list(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=3)
+        created = [WriteOff.objects.create(item=self.item, storage=self.storage, amount=1) for _ in range(3)]
+        client = self.seller_client()
+
+        response = client.get('/api/v1/seller/inventory/write-offs/?legacy=1&limit=2')
+        self.assertEqual([document['id'] for document in response.data], [created[2].id, created[1].id])
+        cursor = response['X-Next-Cursor']
+        self.assertIn(f'cursor={cursor}', response['Link'])
+
+        response = client.get(f'/api/v1/seller/inventory/write-offs/?legacy=1&cursor={cursor}')
+        self.assertEqual([document['id'] for document in response.data], [created[0].id])
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+    def test_inventory_checks_count_items_in_page_query(self):
+        check = InventoryCheck.objects.create(storage=self.storage)
+        InventoryCheckItem.objects.create(inventory_check=check, item=self.item)
+        client = self.seller_client()
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/seller/inventory/checks/')
+        self.assertEqual(response.data['results'][0]['items_count'], 1)
+
+    def test_cached_catalog_page_keeps_next_cursor(self):
+        caches['catalog'].clear()
+        self.create_item('Второй товар')
+
+        def fetch():
+            request = APIRequestFactory().get('/', {'legacy': '1', 'limit': '1'})
+            force_authenticate(request, self.customer)
+            return StoreItemsAPIView.as_view()(request, store_id=self.store.id)
+
+        first = fetch()
+        with self.assertNumQueries(0):
+            cached = fetch()
+        self.assertEqual(len(cached.data), 1)
+        self.assertEqual(cached['X-Next-Cursor'], first['X-Next-Cursor'])
+
+
+class ItemTotalStockTests(StoreFixtureMixin, TestCase):
+
+    def total_stock(self):
+        return Item.objects.values_list('total_stock', flat=True).get(pk=self.item.pk)
+
+    def test_documents_maintain_total_stock(self):
+        second = Storage.objects.create(name='Второй склад', city=self.city, store=self.store)
+        Enter.objects.create(item=self.item, storage=self.storage, amount=10)
+        Enter.objects.create(item=self.item, storage=second, amount=5)
+        WriteOff.objects.create(item=self.item, storage=self.storage, amount=4)
+        self.assertEqual(self.total_stock(), 11)
+
+        with self.assertRaises(ValueError):
+            WriteOff.objects.create(item=self.item, storage=second, amount=6)
+        self.assertEqual(self.total_stock(), 11)
+
+    def test_inventory_completion_applies_difference(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=10)
+        check = InventoryCheck.objects.create(storage=self.storage, status='in_progress')
+        InventoryCheckItem.objects.create(inventory_check=check, item=self.item, expected_amount=10)
+
+        response = self.seller_client().post(
+            f'/api/v1/seller/inventory/checks/{check.id}/complete/',
+            {'items': [{'item_id': self.item.id, 'actual_amount': 7}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Stock.objects.get(item=self.item, storage=self.storage).amount, 7)
+        self.assertEqual(self.total_stock(), 7)
+
+        with self.assertRaises(ValueError):
+            check.complete()
+
+    def test_inventory_completion_rejects_malformed_counts(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=10)
+        check = InventoryCheck.objects.create(storage=self.storage, status='in_progress')
+        InventoryCheckItem.objects.create(inventory_check=check, item=self.item, expected_amount=10)
+
+        client = self.seller_client()
+        url = f'/api/v1/seller/inventory/checks/{check.id}/complete/'
+        for items in (
+            'not-a-list', [{'item_id': self.item.id}], [{'item_id': 'x', 'actual_amount': 1}],
+            [{'item_id': self.item.id, 'actual_amount': None}], [{'item_id': self.item.id, 'actual_amount': -1}],
+            [{'item_id': self.item.id, 'actual_amount': 3}, {'item_id': 999999, 'actual_amount': 1}], [5],
+        ):
+            response = client.post(url, {'items': items}, format='json')
+            self.assertEqual(response.status_code, 400, items)
+
+        # Ни одна позиция не сохранена, инвентаризация не завершена
+        line = check.items.get()
+        self.assertEqual(line.actual_amount, 0)
+        check.refresh_from_db()
+        self.assertNotEqual(check.status, 'completed')
+        self.assertEqual(self.total_stock(), 10)
+
+    def test_reconcile_repairs_drift(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=3)
+        Item.objects.filter(pk=self.item.pk).update(total_stock=100)
+
+        out = StringIO()
+        call_command('reconcile_item_stock', stdout=out)
+        self.assertIn('1 items drifted', out.getvalue())
+        self.assertEqual(self.total_stock(), 100)
+
+        call_command('reconcile_item_stock', fix=True, stdout=out)
+        self.assertEqual(self.total_stock(), 3)
+
+
+class StockLedgerTests(StoreFixtureMixin, TestCase):
+
+    def stock(self, storage=None):
+        return Stock.objects.get(item=self.item, storage=storage or self.storage).amount
+
+    def test_stale_instances_do_not_lose_updates(self):
+        item_a = Item.objects.get(pk=self.item.pk)
+        item_b = Item.objects.get(pk=self.item.pk)
+        Enter.objects.create(item=item_a, storage=self.storage, amount=4)
+        Enter.objects.create(item=item_b, storage=self.storage, amount=6)
+        self.assertEqual(self.stock(), 10)
+
+    def test_resaving_document_does_not_move_stock(self):
+        enter = Enter.objects.create(item=self.item, storage=self.storage, amount=5)
+        enter.notes = 'Исправлено'
+        enter.save()
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(Item.objects.get(pk=self.item.pk).total_stock, 5)
+
+    def test_write_off_cannot_go_negative(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=3)
+        with self.assertRaises(InsufficientStock):
+            WriteOff.objects.create(item=self.item, storage=self.storage, amount=4)
+        self.assertEqual(self.stock(), 3)
+        self.assertFalse(WriteOff.objects.exists())
+
+    def test_database_rejects_negative_stock(self):
+        Enter.objects.create(item=self.item, storage=self.storage, amount=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Stock.objects.filter(item=self.item).update(amount=-1)
+
+    def test_apply_many_is_all_or_nothing(self):
+        second = Storage.objects.create(name='Второй склад', city=self.city, store=self.store)
+        other = self.create_item('Другой товар')
+        StockLedger.apply_many({(self.item.id, self.storage.id): 5, (other.id, second.id): 2})
+
+        with self.assertRaises(InsufficientStock):
+            StockLedger.apply_many({(self.item.id, self.storage.id): -1, (other.id, second.id): -3})
+        self.assertEqual(self.stock(), 5)
+
+        # Точка сохранения, вставка недостающих строк, блокировка, два UPDATE, магазины для кеша каталога
+        with self.assertNumQueries(7):
+            StockLedger.apply_many({(self.item.id, self.storage.id): -5, (other.id, self.storage.id): 7})
+        self.assertEqual(self.stock(), 0)
+        self.assertEqual(
+            dict(Item.objects.filter(pk__in=[self.item.id, other.id]).values_list('id', 'total_stock')),
+            {self.item.id: 0, other.id: 9}
+        )
+
+
+class CurrentStoreMiddlewareTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        middleware._local_cache.clear()
+
+    def test_store_resolved_once_and_cached(self):
+        client = self.seller_client()
+        middleware._local_cache.clear()
+        with CaptureQueriesContext(connection) as first:
+            client.get('/api/v1/seller/items/')
+        with CaptureQueriesContext(connection) as second:
+            response = client.get('/api/v1/seller/items/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_store_header_selects_owned_store(self):
+        other_store = Store.objects.create(
+            name='Второй магазин', description='', email='second@example.com', phone='', owner=self.owner
+        )
+        Storage.objects.create(name='Склад второго магазина', city=self.city, store=other_store)
+        client = self.seller_client()
+
+        response = client.get('/api/v1/seller/storages/', HTTP_X_STORE_ID=str(other_store.id))
+        self.assertEqual([storage['name'] for storage in response.json()], ['Склад второго магазина'])
+
+        response = client.get('/api/v1/seller/storages/')
+        self.assertEqual([storage['name'] for storage in response.json()], ['Основной склад'])
+
+        foreign = Store.objects.get(owner=self.customer)
+        response = client.get('/api/v1/seller/storages/', HTTP_X_STORE_ID=str(foreign.id))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_invalidated_on_store_save(self):
+        self.assertEqual(middleware.get_user_store(self.owner.id).name, self.store.name)
+        Store.objects.filter(pk=self.store.pk).update(name='Без сигнала')
+        with self.assertNumQueries(0):
+            self.assertEqual(middleware.get_user_store(self.owner.id).name, self.store.name)
+
+        store = Store.objects.get(pk=self.store.pk)
+        store.name = 'Переименован'
+        store.save()
+        self.assertEqual(middleware.get_user_store(self.owner.id).name, 'Переименован')
+
+    def test_cache_invalidated_for_previous_owner(self):
+        self.assertEqual(middleware.get_user_store(self.owner.id, self.store.id).pk, self.store.pk)
+        self.assertEqual(middleware.get_user_store(self.owner.id).pk, self.store.pk)
+
+        store = Store.objects.get(pk=self.store.pk)
+        store.owner = self.customer
+        store.save()
+        self.assertIsNone(middleware.get_user_store(self.owner.id, self.store.id))
+        self.assertIsNone(middleware.get_user_store(self.owner.id))
+
+
+class CatalogCacheTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def fetch(self, **headers):
+        request = APIRequestFactory().get('/', **headers)
+        force_authenticate(request, self.customer)
+        return StoreItemsAPIView.as_view()(request, store_id=self.store.id)
+
+    def test_repeat_requests_skip_database(self):
+        first = self.fetch()
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.fetch()
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(cached['ETag'], etag)
+
+        with self.assertNumQueries(0):
+            not_modified = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_catalog_writes_change_etag(self):
+        etag = self.fetch()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enter.objects.create(item=self.item, storage=self.storage, amount=7)
+        response = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['stock'], 7)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.name = 'Новое имя'
+            self.item.save()
+        response = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['results'][0]['name'], 'Новое имя')
+
+    def test_other_store_writes_keep_etag(self):
+        etag = self.fetch()['ETag']
+        other_store = Store.objects.get(owner=self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.create(store=other_store, name='Чужая группа')
+        self.assertEqual(self.fetch(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_uom_and_payment_method_writes_change_etag(self):
+        uom = Uom.objects.create(name='шт')
+        Item.objects.filter(pk=self.item.pk).update(uom=uom)
+        caches['catalog'].clear()
+        etag = self.fetch()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            uom.name = 'кг'
+            uom.save()
+        response = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['uom']['name'], 'кг')
+
+        etag = response['ETag']
+        method = PaymentMethod.objects.create(name='Kaspi')
+        with self.captureOnCommitCallbacks(execute=True):
+            StorePaymentMethod.objects.create(store=self.store, payment_method=method)
+        self.assertEqual(self.fetch(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_routed_items_endpoint_supports_etag(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get(f'/api/v1/stores/{self.store.id}/items/')
+        self.assertEqual(response.status_code, 200)
+
+        response = client.get(f'/api/v1/stores/{self.store.id}/items/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class ItemSearchTests(StoreFixtureMixin, TestCase):
+
+    def search(self, query, **params):
+        caches['catalog'].clear()
+        return self.seller_client().get(f'/api/v1/stores/{self.store.id}/items/search/', {'q': query, **params})
+
+    def found(self, query):
+        return [row['name'] for row in self.search(query).data['results']]
+
+    def test_prefix_search_ranks_name_matches_first(self):
+        dairy = Group.objects.create(store=self.store, name='Молочные продукты')
+        self.create_item('Хлеб', description='Замешан на молоке')
+        self.create_item('Молоко Простоквашино', group=dairy)
+        self.create_item('МОЛОТОК')
+        self.create_item('Молоко снято', status=False)
+        self.create_item('Ёжик в тумане')
+        Item.objects.create(
+            store=Store.objects.get(owner=self.customer), name='Молоко чужое',
+            default_storage=self.storage
+        )
+
+        # Совпадения в названии выше совпадения только в описании
+        found = self.found('мол')
+        self.assertEqual(sorted(found[:2]), ['МОЛОТОК', 'Молоко Простоквашино'])
+        self.assertEqual(found[2:], ['Хлеб'])
+        self.assertEqual(self.found('молоко прост!'), ['Молоко Простоквашино'])
+        self.assertEqual(self.found('еж'), ['Ёжик в тумане'])
+        self.assertEqual(self.found('молочн'), ['Молоко Простоквашино'])
+        self.assertEqual(self.search(' ,. ').status_code, 400)
+        self.assertEqual(self.search('мол', cursor='bad').status_code, 400)
+        self.assertEqual(self.search('мол', cursor=KeysetPagination.encode_cursor(['high', 1])).status_code, 400)
+
+    def test_results_are_paged_by_rank(self):
+        for index in range(5):
+            self.create_item(f'Сыр {index}', description='сыр ' * index)
+
+        names, cursor = [], None
+        while True:
+            data = self.search('сыр', limit=2, **({'cursor': cursor} if cursor else {})).data
+            names += [row['name'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(sorted(names), [f'Сыр {index}' for index in range(5)])
+        self.assertEqual(len(names), 5)
+
+    def test_index_follows_catalog_changes(self):
+        group = Group.objects.create(store=self.store, name='Напитки')
+        item = self.create_item('Квас', group=group)
+        self.assertEqual(self.found('напит'), ['Квас'])
+
+        group.name = 'Бакалея'
+        group.save()
+        item.name = 'Мука'
+        item.save()
+        self.assertEqual(self.found('напит'), [])
+        self.assertEqual(self.found('бакал мук'), ['Мука'])
+
+        item.delete()
+        self.assertEqual(self.found('мука'), [])
+
+        with MoyskladStub(product=[MoyskladStub.product('a', name='Гречка ядрица')]):
+            sync_items(MoyskladClient('token'), self.store.id)
+        self.assertEqual(self.found('ядр'), ['Гречка ядрица'])
+
+    def test_rebuild_command_indexes_rows_written_without_signals(self):
+        Item.objects.filter(pk=self.item.pk).update(name='Печенье овсяное')
+        self.assertEqual(self.found('овсян'), [])
+        stdout = StringIO()
+        call_command('rebuild_search_index', stdout=stdout)
+        self.assertIn('Search index rebuilt', stdout.getvalue())
+        self.assertEqual(self.found('овсян'), ['Печенье овсяное'])
+
+    def test_single_letter_terms_match_whole_words(self):
+        self.create_item('Витамин C')
+        self.create_item('Витамин Д3')
+        self.create_item('Сок')
+        self.assertEqual(self.found('c'), ['Витамин C'])
+        self.assertEqual(self.found('витамин с'), [])
+        self.assertEqual(self.found('со'), ['Сок'])
+
+    @override_settings(SEARCH_MAX_CANDIDATES=2)
+    def test_only_newest_candidates_are_ranked(self):
+        for index in range(3):
+            self.create_item(f'Чай {index}')
+        # Товары другого магазина не занимают места кандидатов
+        Item.objects.create(
+            store=Store.objects.get(owner=self.customer), name='Чай чужой', default_storage=self.storage
+        )
+        self.assertEqual(sorted(self.found('чай')), ['Чай 1', 'Чай 2'])
+
+
+def image_bytes(width, height, mode='RGB', image_format='PNG'):
+    buffer = BytesIO()
+    Image.new(mode, (width, height)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ThumbnailTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, THUMBNAIL_WIDTHS=[160, 640])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        caches['catalog'].clear()
+
+    def test_variants_are_created_on_upload(self):
+        item = self.create_item('С фото')
+        item.preview = SimpleUploadedFile('photo.png', image_bytes(1000, 500))
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+
+        with default_storage.open(f'thumbs/160/{item.preview.name}.webp') as thumb, Image.open(thumb) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (160, 80)))
+        # Узкое изображение не увеличивается
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ItemImage.objects.create(
+                item=item, description='Мелкое', image=SimpleUploadedFile('small.png', image_bytes(100, 50))
+            )
+        with default_storage.open(thumbnail_name(image.image.name, 640)) as thumb, Image.open(thumb) as small:
+            self.assertEqual(small.size, (100, 50))
+
+    @override_settings(THUMBNAIL_FORMAT='JPEG')
+    def test_catalog_creates_missing_variants_on_first_request(self):
+        item = self.create_item('Загружено раньше')
+        name = default_storage.save('images/old.png', ContentFile(image_bytes(800, 800, 'RGBA')))
+        Item.objects.filter(pk=item.pk).update(preview=name)
+
+        caches['catalog'].clear()
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, self.customer)
+        response = StoreItemsAPIView.as_view()(request, store_id=self.store.id)
+        data = next(row for row in response.data['results'] if row['id'] == item.id)
+        self.assertEqual(data['preview'], '/media/images/old.png')
+        self.assertEqual(data['preview_thumb'], '/media/thumbs/160/images/old.png.jpg')
+        self.assertEqual(
+            data['preview_srcset'],
+            '/media/thumbs/160/images/old.png.jpg 160w, /media/thumbs/640/images/old.png.jpg 640w'
+        )
+        with default_storage.open('thumbs/640/images/old.png.jpg') as thumb, Image.open(thumb) as image:
+            self.assertEqual((image.format, image.mode), ('JPEG', 'RGB'))
+
+        # ItemSerializer (маршрут stores/<id>/items/) отдает абсолютные URL, как у preview
+        routed = self.seller_client().get(f'/api/v1/stores/{self.store.id}/items/')
+        data = next(row for row in routed.data if row['id'] == item.id)
+        self.assertEqual(data['preview_thumb'], 'http://testserver/media/thumbs/160/images/old.png.jpg')
+
+    def test_ready_variants_are_not_checked_again(self):
+        name = default_storage.save('images/ready.png', ContentFile(image_bytes(400, 200)))
+        first = thumbnail_fields(ItemImage(image=name).image)
+        for width in (160, 640):
+            default_storage.delete(thumbnail_name(name, width))
+        # Готовность взята из кеша, хранилище не проверяется
+        self.assertEqual(thumbnail_fields(ItemImage(image=name).image), first)
+        self.assertFalse(default_storage.exists(thumbnail_name(name, 160)))
+
+        caches['catalog'].clear()
+        thumbnail_fields(ItemImage(image=name).image)
+        self.assertTrue(default_storage.exists(thumbnail_name(name, 160)))
+
+    def test_same_stem_with_other_extension_gets_own_variants(self):
+        jpeg = default_storage.save('images/same.jpg', ContentFile(image_bytes(300, 300)))
+        png = default_storage.save('images/same.png', ContentFile(image_bytes(300, 150)))
+        self.assertNotEqual(thumbnail_name(jpeg, 160), thumbnail_name(png, 160))
+
+    def test_reused_name_refreshes_variants_on_upload(self):
+        item = self.create_item('С фото')
+        item.preview = SimpleUploadedFile('reused.png', image_bytes(1000, 500))
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        name = item.preview.name
+        default_storage.delete(name)
+
+        item.preview = SimpleUploadedFile('reused.png', image_bytes(1000, 1000))
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertEqual(item.preview.name, name)
+        with default_storage.open(thumbnail_name(name, 160)) as thumb, Image.open(thumb) as image:
+            self.assertEqual(image.size, (160, 160))
+
+    def test_unreadable_image_falls_back_to_original(self):
+        name = default_storage.save('images/broken.jpg', ContentFile(b'not an image'))
+        with self.assertLogs('stores.thumbnails', 'WARNING'):
+            fields = thumbnail_fields(ItemImage(image=name).image)
+        self.assertEqual(fields, {'preview_thumb': '/media/images/broken.jpg', 'preview_srcset': None})
+
+
+class MoyskladStub:
+    """
+    Локальный HTTP-сервер, отдающий сущности постранично, как API МойСклад.
+    throttle - сколько первых запросов получат 429 с X-Lognex-Retry-After,
+    delay - пауза ответа в секундах, files - содержимое по пути /download/<name>
+    """
+
+    def __init__(self, throttle=0, delay=0, files=None, **entities):
+        self.entities = entities
+        self.files = files or {}
+        self.throttle = throttle
+        self.delay = delay
+        self.requests = []
+        self.ports = set()
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive: клиент может переиспользовать соединение
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.ports.add(self.client_address[1])
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    throttled = stub.throttle > 0
+                    stub.throttle -= throttled
+                try:
+                    time.sleep(stub.delay)
+                    if throttled:
+                        self.send(429, b'{}', {'X-Lognex-Retry-After': '10'})
+                    else:
+                        body = stub.respond(self.path)
+                        self.send(404, b'{}') if body is None else self.send(200, body)
+                finally:
+                    with stub.lock:
+                        stub.active -= 1
+
+            def send(self, code, body, headers=()):
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers = {**dict(headers), 'Content-Encoding': 'gzip'}
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in dict(headers).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                # Клиент закрывает keep-alive соединения, когда сессия закрыта
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def respond(self, path):
+        url = urlsplit(path)
+        if url.path.startswith('/download/'):
+            return self.files.get(url.path[len('/download/'):])
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        entity = url.path.split('/entity/', 1)[1].strip('/')
+        with self.lock:
+            self.requests.append((entity, query))
+        if entity.endswith('/images'):
+            return json.dumps({'rows': self.images(entity.split('/')[1])}).encode()
+
+        rows = self.filter(self.entities.get(entity, []), query.get('filter', ''))
+        if query.get('order') == 'updated,id':
+            rows = sorted(rows, key=lambda row: (row.get('updated', ''), row['id']))
+        limit, offset = int(query.get('limit', 1000)), int(query.get('offset', 0))
+        return json.dumps({
+            'meta': {'size': len(rows), 'limit': limit, 'offset': offset},
+            'rows': rows[offset:offset + limit],
+        }).encode()
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.settings = override_settings(MOYSKLAD_API_URL=self.url)
+        self.settings.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def filter(rows, expression):
+        """Поддерживаемое подмножество filter: updated>=...; archived=true;archived=false"""
+        conditions = [condition for condition in expression.split(';') if condition]
+        if 'archived=true' not in conditions:
+            rows = [row for row in rows if not row.get('archived')]
+        for condition in conditions:
+            if condition.startswith('updated>='):
+                rows = [row for row in rows if row['updated'] >= condition[len('updated>='):]]
+        return rows
+
+    def images(self, product_id):
+        """Изображения товара со ссылками на скачивание с этого сервера"""
+        product = next(row for row in self.entities.get('product', []) if row['id'] == product_id)
+        return [
+            {'filename': filename, 'meta': {'downloadHref': f'{self.url}/download/{filename}'}}
+            for filename in product.get('images', {}).get('files', [])
+        ]
+
+    @staticmethod
+    def ref(entity, external_id):
+        return {'meta': {'href': f'https://api.moysklad.ru/api/remap/1.2/entity/{entity}/{external_id}'}}
+
+    @classmethod
+    def folder(cls, external_id, parent=None, updated='2024-01-01 00:00:00.000'):
+        row = {'id': external_id, 'name': f'Группа {external_id}', 'updated': updated}
+        if parent:
+            row['productFolder'] = cls.ref('productfolder', parent)
+        return row
+
+    @classmethod
+    def product(cls, external_id, name=None, price=10000, folder=None, uom=None,
+                updated='2024-01-01 00:00:00.000', archived=False, images=()):
+        row = {
+            'id': external_id, 'name': name or f'Товар {external_id}', 'salePrices': [{'value': price}],
+            'updated': updated, 'archived': archived,
+        }
+        if folder:
+            row['productFolder'] = cls.ref('productfolder', folder)
+        if uom:
+            row['uom'] = cls.ref('uom', uom)
+        if images:
+            # files - имена файлов для ответа на запрос коллекции изображений
+            row['images'] = {
+                'meta': {'href': cls.ref('product', external_id)['meta']['href'] + '/images', 'size': len(images)},
+                'files': list(images),
+            }
+        return row
+
+
+class MoyskladClientTests(SimpleTestCase):
+
+    def test_pages_are_fetched_concurrently_over_pooled_connections(self):
+        products = [MoyskladStub.product(f'p{index}') for index in range(20)]
+        with MoyskladStub(product=products, delay=0.05) as stub, MoyskladClient('token', max_workers=3) as client:
+            pages = list(client.iter_pages('product', page_size=2))
+
+        # Порядок страниц сохраняется, хотя ответы приходят параллельно
+        self.assertEqual([row['id'] for page in pages for row in page], [row['id'] for row in products])
+        self.assertEqual(len(stub.requests), 10)
+        self.assertGreater(stub.max_active, 1)
+        self.assertLessEqual(stub.max_active, 3)
+        # Соединения переиспользуются: не больше одного на поток пула и первый запрос
+        self.assertLessEqual(len(stub.ports), 4)
+
+    def test_responses_are_gzipped(self):
+        with MoyskladStub(product=[MoyskladStub.product('a')]), MoyskladClient('token') as client:
+            response = client.request('GET', f'{client.api_url}/entity/product')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.json()['rows'][0]['id'], 'a')
+
+    def test_rate_limited_requests_are_retried_after_delay(self):
+        with MoyskladStub(product=[MoyskladStub.product('a')], throttle=2) as stub:
+            with MoyskladClient('token') as client:
+                started = time.monotonic()
+                self.assertEqual(client.get_entity('product')['meta']['size'], 1)
+                # X-Lognex-Retry-After: 10 мс на каждый из двух отказов
+                self.assertGreaterEqual(time.monotonic() - started, 0.02)
+            self.assertEqual(len(stub.requests), 1)
+
+            stub.throttle = 3
+            with MoyskladClient('token', max_retries=2) as client, self.assertRaises(requests.HTTPError):
+                client.get_entity('product')
+
+    def test_download_streams_file(self):
+        content = b'\x89PNG' + bytes(200 * 1024)
+        with MoyskladStub(files={'image.png': content}) as stub, MoyskladClient('token') as client:
+            destination = BytesIO()
+            self.assertEqual(client.download(f'{stub.url}/download/image.png', destination), len(content))
+        self.assertEqual(destination.getvalue(), content)
+
+
+class ItemImageImportTests(StoreFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        caches['catalog'].clear()
+        self.integration = MoyskladIntegration.objects.create(store=self.store, token='token')
+
+    def stored_files(self, folder):
+        return sorted(name for _, _, files in os.walk(os.path.join(self.media_root, folder)) for name in files)
+
+    def test_images_are_stored_once_and_attached(self):
+        photo = image_bytes(400, 300, image_format='JPEG')
+        files = {'front.jpg': photo, 'back.png': image_bytes(10, 10), 'copy.jpg': photo}
+        products = [MoyskladStub.product('a', images=['front.jpg', 'back.png']),
+                    MoyskladStub.product('b', images=['copy.jpg']), MoyskladStub.product('c')]
+
+        with MoyskladStub(product=products, files=files):
+            self.assertEqual(sync_store(self.integration)['images'], 2)
+            # Повторная синхронизация тех же строк не дублирует файлы и изображения
+            self.assertEqual(sync_store(self.integration)['images'], 2)
+
+        items = {item.external_id: item for item in Item.objects.filter(store=self.store, external_id__isnull=False)}
+        digest = hashlib.sha256(photo).hexdigest()
+        self.assertEqual(items['a'].preview.name, f'images/moysklad/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(items['b'].preview.name, items['a'].preview.name)
+        self.assertEqual(items['a'].preview.read(), photo)
+        self.assertFalse(items['c'].preview)
+        self.assertEqual(list(ItemImage.objects.filter(item=items['a']).values_list('description', flat=True)),
+                         ['back.png'])
+        self.assertEqual(len(self.stored_files('images')), 2)
+        self.assertEqual(len(self.stored_files('thumbs')), 2 * 3)
+
+    @override_settings(MOYSKLAD_IMAGE_MAX_ATTEMPTS=2)
+    def test_failed_items_stay_queued_until_attempts_run_out(self):
+        products = [MoyskladStub.product('a', images=['a.jpg']), MoyskladStub.product('b', images=['b.jpg'])]
+        with MoyskladStub(product=products, files={'a.jpg': image_bytes(10, 10)}) as stub, MoyskladClient('token') as client:
+            sync_items(client, self.store.id)
+            self.assertEqual(import_item_images(client, self.store.id), 1)
+            queued = ItemImageImport.objects.get(item__external_id='b')
+            self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+            self.assertIn('404', queued.error)
+
+            # Следующий проход берет только оставшиеся в очереди товары
+            stub.files['b.jpg'] = image_bytes(20, 20)
+            stub.requests.clear()
+            self.assertEqual(import_item_images(client, self.store.id), 1)
+            self.assertEqual([entity for entity, _ in stub.requests], ['product/b/images'])
+
+            del stub.files['b.jpg']
+            ItemImageImport.objects.filter(item__external_id='b').update(status='pending', attempts=1)
+            import_item_images(client, self.store.id)
+
+        self.assertEqual(ItemImageImport.objects.get(item__external_id='b').status, 'failed')
+        self.assertEqual(ItemImageImport.objects.get(item__external_id='a').images_count, 1)
+
+
+class MoyskladSyncTests(StoreFixtureMixin, TestCase):
+
+    def test_groups_are_paged_and_linked_to_parents(self):
+        # Дочерняя группа приходит раньше родителя, на другой странице
+        folders = [MoyskladStub.folder('c1', parent='p'), MoyskladStub.folder('c2', parent='p'),
+                   MoyskladStub.folder('x'), MoyskladStub.folder('p'), MoyskladStub.folder('c3', parent='c1')]
+        other_store = Store.objects.get(owner=self.customer)
+        foreign = Group.objects.create(store=other_store, name='Чужая', parent_external_id='p')
+
+        with MoyskladStub(productfolder=folders) as stub:
+            self.assertEqual(sync_groups(MoyskladClient('token'), self.store.id, page_size=2).count, 5)
+        self.assertEqual(sorted(query['offset'] for _, query in stub.requests), ['0', '2', '4'])
+
+        parents = dict(Group.objects.filter(store=self.store).values_list('external_id', 'parent__external_id'))
+        self.assertEqual(parents, {'c1': 'p', 'c2': 'p', 'x': None, 'p': None, 'c3': 'c1'})
+        foreign.refresh_from_db()
+        self.assertIsNone(foreign.parent_id)
+
+    def test_items_are_upserted_by_external_id(self):
+        Group.objects.create(store=self.store, name='Группа', external_id='g')
+        uom = Uom.objects.create(name='кг', external_id='kg')
+        existing = self.create_item('Старое имя', external_id='a')
+        products = [MoyskladStub.product('a', name='Новое имя', price=12345, folder='g', uom='kg'),
+                    MoyskladStub.product('b'), MoyskladStub.product('c', folder='missing')]
+
+        with MoyskladStub(product=products):
+            self.assertEqual(sync_items(MoyskladClient('token'), self.store.id, page_size=2).count, 3)
+            products[1]['name'] = 'Переименован'
+            sync_items(MoyskladClient('token'), self.store.id, page_size=2)
+
+        items = {item.external_id: item for item in Item.objects.filter(store=self.store, external_id__isnull=False)}
+        self.assertEqual(sorted(items), ['a', 'b', 'c'])
+        self.assertEqual(items['a'].pk, existing.pk)
+        self.assertEqual((items['a'].name, items['a'].default_price), ('Новое имя', Decimal('123.45')))
+        self.assertEqual((items['a'].group.external_id, items['a'].uom_id), ('g', uom.id))
+        self.assertEqual(items['b'].name, 'Переименован')
+        self.assertIsNone(items['c'].group_id)
+        self.assertEqual(items['b'].default_storage_id, self.storage.id)
+
+    def test_stores_on_one_account_keep_separate_items(self):
+        other_store = Store.objects.get(owner=self.customer)
+        Storage.objects.create(name='Склад покупателя', city=self.city, store=other_store)
+
+        with MoyskladStub(productfolder=[MoyskladStub.folder('g')],
+                          product=[MoyskladStub.product('a', name='Общий товар', folder='g')]):
+            for store in (self.store, other_store):
+                sync_groups(MoyskladClient('token'), store.id)
+                sync_items(MoyskladClient('token'), store.id)
+
+        for store in (self.store, other_store):
+            item = Item.objects.get(store=store, external_id='a')
+            self.assertEqual((item.name, item.group.store_id), ('Общий товар', store.id))
+        self.assertEqual(Group.objects.filter(external_id='g').count(), 2)
+
+    def test_item_sync_queries_grow_with_pages_not_rows(self):
+        def sync(count):
+            with MoyskladStub(product=[MoyskladStub.product(f'p{index}') for index in range(count)]):
+                with CaptureQueriesContext(connection) as queries:
+                    sync_items(MoyskladClient('token'), self.store.id, page_size=100)
+            return len(queries)
+
+        self.assertEqual(sync(2), sync(50))
+
+    def test_store_without_storage_is_rejected(self):
+        other_store = Store.objects.get(owner=self.customer)
+        with self.assertRaises(MoyskladSyncError):
+            sync_items(MoyskladClient('token'), other_store.id)
+
+    def test_command_syncs_integrations(self):
+        integration = MoyskladIntegration.objects.create(store=self.store, token='token')
+        stdout = StringIO()
+        with MoyskladStub(productfolder=[MoyskladStub.folder('g')], product=[MoyskladStub.product('a', folder='g')]):
+            call_command('sync_moysklad', stdout=stdout)
+        self.assertIn('1 groups, 1 items, 0 items with images', stdout.getvalue())
+        integration.refresh_from_db()
+        self.assertTrue(integration.sync_status)
+        self.assertEqual(Item.objects.get(external_id='a').group.external_id, 'g')
+
+        with self.assertRaises(CommandError):
+            call_command('sync_moysklad', store_id=Store.objects.get(owner=self.customer).id)
+
+    def test_delta_sync_fetches_changes_since_high_water_mark(self):
+        integration = MoyskladIntegration.objects.create(store=self.store, token='token')
+        products = [MoyskladStub.product('a', updated='2024-01-01 10:00:00.000'),
+                    MoyskladStub.product('b', updated='2024-01-02 10:00:00.000')]
+
+        with MoyskladStub(productfolder=[MoyskladStub.folder('g')], product=products) as stub:
+            self.assertEqual(sync_store(integration), {'groups': 1, 'items': 2, 'images': 0})
+            self.assertEqual(integration.high_water_marks, {
+                'productfolder': '2024-01-01 00:00:00.000', 'product': '2024-01-02 10:00:00.000'
+            })
+
+            products[0].update(name='Изменен', updated='2024-01-03 09:00:00.000')
+            products.append(MoyskladStub.product('c', updated='2024-01-03 10:00:00.000', archived=True))
+            stub.requests.clear()
+            # Строка b с updated, равным отметке, приходит повторно и не меняется
+            self.assertEqual(sync_store(integration), {'groups': 1, 'items': 3, 'images': 0})
+
+        product_query = dict(stub.requests)['product']
+        self.assertEqual(product_query['filter'], 'updated>=2024-01-02 10:00:00.000;archived=true;archived=false')
+        self.assertEqual(product_query['order'], 'updated,id')
+        integration.refresh_from_db()
+        self.assertEqual(integration.high_water_marks['product'], '2024-01-03 10:00:00.000')
+        statuses = dict(Item.objects.filter(external_id__isnull=False).values_list('external_id', 'status'))
+        self.assertEqual(statuses, {'a': True, 'b': True, 'c': False})
+        self.assertEqual(Item.objects.get(external_id='a').name, 'Изменен')
+
+    def test_sync_keeps_local_deactivation(self):
+        hidden = self.create_item('Снят продавцом', external_id='hidden', status=False)
+        on_sale = self.create_item('В продаже', external_id='archived')
+        products = [MoyskladStub.product('hidden', name='Переименован'),
+                    MoyskladStub.product('archived', archived=True), MoyskladStub.product('new')]
+        with MoyskladStub(product=products):
+            sync_items(MoyskladClient('token'), self.store.id)
+
+        hidden.refresh_from_db()
+        on_sale.refresh_from_db()
+        self.assertEqual((hidden.name, hidden.status), ('Переименован', False))
+        self.assertFalse(on_sale.status)
+        self.assertTrue(Item.objects.get(external_id='new').status)
+
+    def test_shifted_or_failed_sync_keeps_high_water_mark(self):
+        marks = {'productfolder': '2024-01-01 00:00:00.000', 'product': '2024-01-01 00:00:00.000'}
+        integration = MoyskladIntegration.objects.create(store=self.store, token='token', high_water_marks=marks)
+        # Строка a изменена во время выборки и пришла второй раз в конце
+        products = [MoyskladStub.product('a', updated='2024-01-02 00:00:00.000'),
+                    MoyskladStub.product('b', updated='2024-01-03 00:00:00.000')]
+        with MoyskladStub(product=products) as stub:
+            stub.entities['product'] = [*products, {**products[0], 'updated': '2024-01-04 00:00:00.000'}]
+            with override_settings(MOYSKLAD_PAGE_SIZE=1):
+                sync_store(integration)
+        integration.refresh_from_db()
+        self.assertEqual(integration.high_water_marks, marks)
+
+        broken = MoyskladStub.product('c', updated='2024-01-05 00:00:00.000')
+        del broken['name']
+        with MoyskladStub(product=[products[1], broken]):
+            with override_settings(MOYSKLAD_PAGE_SIZE=1), self.assertRaises(KeyError):
+                sync_store(integration)
+        integration.refresh_from_db()
+        self.assertEqual(integration.high_water_marks, marks)
+        self.assertTrue(Item.objects.filter(external_id='b').exists())
+
+    def test_full_sync_deactivates_deleted_items(self):
+        integration = MoyskladIntegration.objects.create(
+            store=self.store, token='token', high_water_marks={'product': '2030-01-01 00:00:00.000'}
+        )
+        self.create_item('Удален в МойСклад', external_id='gone')
+        with MoyskladStub(product=[MoyskladStub.product('a')]) as stub:
+            self.assertEqual(sync_store(integration, full=True)['items'], 1)
+
+        self.assertEqual(dict(stub.requests)['product']['filter'], 'archived=true;archived=false')
+        self.assertFalse(Item.objects.get(external_id='gone').status)
+        self.assertTrue(Item.objects.get(external_id='a').status)
+        self.assertEqual(integration.high_water_marks['product'], '2024-01-01 00:00:00.000')
+
+    def test_sync_endpoint_runs_in_background_job(self):
+        client = self.seller_client()
+        self.assertEqual(client.post('/api/v1/seller/moysklad/sync/', {}, format='json').status_code, 400)
+
+        MoyskladIntegration.objects.create(store=self.store, token='token')
+        response = client.post('/api/v1/seller/moysklad/sync/', {'full': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        # Пока синхронизация в очереди, новая не ставится
+        repeated = client.post('/api/v1/seller/moysklad/sync/', {}, format='json')
+        self.assertEqual(repeated.data['id'], response.data['id'])
+
+        with MoyskladStub(product=[MoyskladStub.product('a')]):
+            self.assertEqual(run_pending('worker'), 1)
+        job = client.get(response.data['status_url']).data
+        self.assertEqual((job['status'], job['result']), ('succeeded', {'groups': 0, 'items': 1, 'images': 0}))
+        self.assertEqual(job['progress_message'], "Загружено товаров: 1")
@@ -0,0 +1,131 @@
+"""
+Уменьшенные копии изображений товаров для каталога.
+
+Для изображения images/x.jpg создаются варианты фиксированной ширины
+thumbs/<ширина>/images/x.jpg.webp (формат - THUMBNAIL_FORMAT, WEBP или JPEG);
+расширение оригинала остается в имени, поэтому x.jpg и x.png не делят варианты.
+Варианты создаются при загрузке изображения (signals, stores.image_import), а
+для загруженных раньше - при первом запросе каталога. То, что варианты
+изображения готовы, запоминается в кеше THUMBNAIL_CACHE_ALIAS, и ответы
+каталога не проверяют хранилище для каждого товара.
+
+Хранилище не выдает занятое имя новому файлу, но после удаления оригинала его
+имя может достаться другому изображению. Поэтому при загрузке файла (сигналы
+pre_save/post_save) варианты пересоздаются, а не берутся готовыми.
+Изображения МойСклад названы по sha256 содержимого и не меняются.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def thumbnail_widths() -> list:
+    return sorted(getattr(settings, 'THUMBNAIL_WIDTHS', [160, 320, 640]))
+
+
+def thumbnail_format() -> str:
+    return getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP').upper()
+
+
+def thumbnail_name(name, width) -> str:
+    return f'thumbs/{width}/{name}.{_EXTENSIONS[thumbnail_format()]}'
+
+
+def _ready_key(name) -> str:
+    widths = ','.join(map(str, thumbnail_widths()))
+    digest = hashlib.sha256(name.encode()).hexdigest()
+    return f'thumbnails:{thumbnail_format()}:{widths}:{digest}'
+
+
+def _ready_cache():
+    return caches[getattr(settings, 'THUMBNAIL_CACHE_ALIAS', 'default')]
+
+
+def render_thumbnail(source, width) -> bytes:
+    """Уменьшает изображение до ширины width (без увеличения) с учетом поворота из EXIF"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        image_format = thumbnail_format()
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        buffer = BytesIO()
+        image.save(buffer, image_format, quality=getattr(settings, 'THUMBNAIL_QUALITY', 80))
+    return buffer.getvalue()
+
+
+def ensure_thumbnails(name, refresh=False) -> dict:
+    """
+    Варианты изображения name по ширинам: {ширина: имя в хранилище}. Недостающие
+    (при refresh=True - все) создаются из оригинала одним чтением файла; если
+    оригинал не читается, {}. Готовность запоминается в кеше, и повторный вызов
+    не обращается к хранилищу
+    """
+    if not name:
+        return {}
+    names = {width: thumbnail_name(name, width) for width in thumbnail_widths()}
+    ready_key = _ready_key(name)
+    if not refresh and _ready_cache().get(ready_key):
+        return names
+    if refresh:
+        missing = list(names)
+    else:
+        missing = [width for width, thumb in names.items() if not default_storage.exists(thumb)]
+    if not missing:
+        _ready_cache().set(ready_key, True, None)
+        return names
+    try:
+        with default_storage.open(name) as original:
+            source = BytesIO(original.read())
+        for width in missing:
+            source.seek(0)
+            content = ContentFile(render_thumbnail(source, width))
+            if refresh:
+                # Вариант прежнего файла с тем же именем
+                default_storage.delete(names[width])
+            saved = default_storage.save(names[width], content)
+            if saved != names[width]:
+                # Тот же вариант успел создать параллельный запрос
+                default_storage.delete(saved)
+    except FileNotFoundError:
+        # Оригинал удален из хранилища: отдается прежняя ссылка
+        return {}
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("Cannot create thumbnails for %s: %s", name, e)
+        return {}
+    _ready_cache().set(ready_key, True, None)
+    return names
+
+
+def thumbnail_fields(field, prefix='preview', build_url=None) -> dict:
+    """
+    Поля ответа API для изображения товара: <prefix>_thumb - самый узкий
+    вариант, <prefix>_srcset - все варианты в формате атрибута srcset.
+    Без вариантов _thumb - оригинал, _srcset - None. build_url(url) делает
+    URL абсолютным (request.build_absolute_uri)
+    """
+    def url(name):
+        return build_url(default_storage.url(name)) if build_url else default_storage.url(name)
+
+    if not field:
+        return {f'{prefix}_thumb': None, f'{prefix}_srcset': None}
+    names = ensure_thumbnails(field.name)
+    if not names:
+        return {f'{prefix}_thumb': url(field.name), f'{prefix}_srcset': None}
+    return {
+        f'{prefix}_thumb': url(names[min(names)]),
+        f'{prefix}_srcset': ', '.join(f'{url(thumb)} {width}w' for width, thumb in names.items()),
+    }
@@ -2,6 +2,7 @@ from decimal import Decimal
 from base64 import b64encode
 
 import requests
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
@@ -155,9 +156,12 @@ def get_moysklad_token(request, store_id):
         "Authorization": "Basic " + credentials,
         "Accept-Encoding": "gzip"
     }
+    # Один короткий запрос с ограниченным временем ожидания; логин и пароль
+    # не сохраняются, поэтому в очередь фоновых задач он не выносится
     response = requests.post(
-        url='https://api.moysklad.ru/api/remap/1.2/security/token',
-        headers=headers
+        url=f"{settings.MOYSKLAD_API_URL.rstrip('/')}/security/token",
+        headers=headers,
+        timeout=settings.MOYSKLAD_TIMEOUT_SECONDS
     )
     token = response.json().get("access_token")
     context = {}
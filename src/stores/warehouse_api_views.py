@@ -1,8 +1,11 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum, Count
+from django.db.models import Count, Prefetch, Sum
+
+from core.pagination import KeysetPagination
 from .models import Store, Item, Stock, Storage
 
 class WarehouseStockAPIView(APIView):
@@ -18,16 +21,19 @@ class WarehouseStockAPIView(APIView):
             # Get all items with their stock information
             items_with_stock = []
             
-            items = Item.objects.filter(status=True).select_related('group', 'uom')
+            # Totals are denormalized and per-storage stock is prefetched for the page only
+            items = Item.objects.with_stock().filter(status=True).prefetch_related(
+                Prefetch('stock_set', queryset=Stock.objects.select_related('storage'))
+            )
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(items, request, view=self)
             
-            for item in items:
-                # Calculate total stock across all storages for this item
-                stocks = Stock.objects.filter(item=item).select_related('storage')
-                total_amount = stocks.aggregate(total=Sum('amount'))['total'] or 0
+            for item in page:
+                total_amount = item.total_stock
                 
                 # Get stock by storage
                 storages_data = []
-                for stock in stocks:
+                for stock in item.stock_set.all():
                     storages_data.append({
                         'storage_name': stock.storage.name,
                         'amount': stock.amount
@@ -45,8 +51,10 @@ class WarehouseStockAPIView(APIView):
                 }
                 items_with_stock.append(item_data)
             
-            return Response(items_with_stock)
+            return paginator.get_paginated_response(items_with_stock)
             
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detail": f"Error: {str(e)}"}, 
@@ -68,12 +76,7 @@ class WarehouseStatsAPIView(APIView):
             total_stock = Stock.objects.aggregate(total=Sum('amount'))['total'] or 0
             
             # Low stock items (less than or equal to 5)
-            low_stock_items = 0
-            items = Item.objects.filter(status=True)
-            for item in items:
-                item_total = Stock.objects.filter(item=item).aggregate(total=Sum('amount'))['total'] or 0
-                if item_total <= 5:
-                    low_stock_items += 1
+            low_stock_items = Item.objects.with_stock().filter(status=True, total_stock__lte=5).count()
             
             # Recent movements (placeholder - would need movement tracking)
             recent_movements = 0  # This would be calculated from Enter/WriteOff models